@@ -0,0 +1,3 @@
+from announcement.announcement import classify_title, classify_titles, parse_listing_times, parse_announcement
+
+__all__ = ["classify_title", "classify_titles", "parse_listing_times", "parse_announcement"]
@@ -0,0 +1,75 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+# Binance makes several annoucements, irrevelant ones will be ignored
+#EXCLUSIONS = ['Futures', 'Margin', 'adds', 'Subscription']
+EXCLUSIONS = ['Futures', 'Margin', 'adds']
+
+SYMBOL = r'[A-Z0-9]{2,12}'
+
+# one scan of a title finds both the exclusion keywords and every "(SYMBOL)"
+TITLE_RE = re.compile(
+    r'(?P<exclude>(?i:{}))|\((?P<symbol>{})\)'.format('|'.join(re.escape(e) for e in EXCLUSIONS), SYMBOL)
+)
+
+# "will list X (X) ... at 2021-10-11 06:00 (UTC)", "will then list X at 2021-10-12 06:00 AM (UTC)"
+LISTING_TIME_RE = re.compile(
+    r'will (?:then )?list\b(?P<what>[^.]*?)\bat\s+'
+    r'(?P<date>\d{4}-\d{2}-\d{2})\s+(?P<hour>\d{1,2}):(?P<minute>\d{2})(?:\s*(?P<ampm>[AP]M))?\s*\(UTC\)'
+)
+PAREN_SYMBOL_RE = re.compile(r'\(({})\)'.format(SYMBOL))
+BARE_SYMBOL_RE = re.compile(r'\b([A-Z][A-Z0-9]{1,11})\b(?!/)')
+
+
+def classify_title(title: str) -> List[str]:
+    """
+    Returns every symbol announced in a title, or an empty list if the announcement is irrelevant
+    """
+    symbols = []
+    for match in TITLE_RE.finditer(title):
+        if match.group('exclude') is not None:
+            return []
+        if match.group('symbol') not in symbols:
+            symbols.append(match.group('symbol'))
+    return symbols
+
+
+def classify_titles(titles: Iterable[str]) -> List[List[str]]:
+    return [classify_title(title) for title in titles]
+
+
+def _format_time(match) -> str:
+    hour = int(match.group('hour'))
+    if match.group('ampm') == 'PM' and hour < 12:
+        hour += 12
+    elif match.group('ampm') == 'AM' and hour == 12:
+        hour = 0
+    return "{} {:02d}:{}".format(match.group('date'), hour, match.group('minute'))
+
+
+def parse_listing_times(text: str, symbols: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """
+    Returns (coin, list_time) for every listing sentence of an announcement text, list_time in "%Y-%m-%d %H:%M".
+    Symbols named in a sentence are used, otherwise the given (title) symbols.
+    """
+    listings = []
+    for match in LISTING_TIME_RE.finditer(text):
+        what = match.group('what')
+        coins = PAREN_SYMBOL_RE.findall(what) or BARE_SYMBOL_RE.findall(what) or symbols or []
+        if symbols:
+            coins = [c for c in coins if c in symbols] or coins
+        list_time = _format_time(match)
+        for coin in coins:
+            if (coin, list_time) not in listings:
+                listings.append((coin, list_time))
+    return listings
+
+
+def parse_announcement(title: str, text: str) -> List[Tuple[str, str]]:
+    """
+    Returns (coin, list_time) for every listing of an announcement, empty if it is not a listing
+    """
+    symbols = classify_title(title)
+    if not symbols:
+        return []
+    return parse_listing_times(text, symbols)
@@ -0,0 +1,82 @@
+"""
+Announcement parsing throughput and accuracy over a corpus of saved pages.
+
+The corpus directory holds saved list/article pages and an expected.json with the labels:
+    {"<file>": {"titles": [[symbols of each list page title]]}}
+    {"<file>": {"title": "<article title>", "listings": [[coin, list_time]]}}
+source.txt is looked up in the repository root.
+
+Run from the repository root:
+    python -m benchmarks.bench_announcement --repeat 200 --history bench_announcement.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import scraper
+from announcement import classify_titles, parse_announcement
+from util import Config
+
+
+def load_corpus(corpus_dir):
+    expected = json.loads(corpus_dir.joinpath("expected.json").read_text())
+    pages = []
+    for name, labels in expected.items():
+        path = Config.ROOT_DIR.joinpath(name) if name == "source.txt" else corpus_dir.joinpath(name)
+        pages.append((name, path.read_text(), labels))
+    return pages
+
+
+def parse_page(html, labels):
+    if "titles" in labels:
+        return classify_titles(a["title"] for a in scraper.parse_announcements(html))
+    return [list(l) for l in parse_announcement(labels["title"], scraper.parse_article_text(html))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=str(Config.TEST_DIR.joinpath("pages")))
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--history", help="append the results as a json line to this file")
+    parser.add_argument("--min-accuracy", type=float, default=1.0)
+    args = parser.parse_args()
+
+    pages = load_corpus(Config.ROOT_DIR.joinpath(args.corpus))
+    total_bytes = sum(len(html) for _, html, _ in pages)
+
+    correct = 0
+    for name, html, labels in pages:
+        result = parse_page(html, labels)
+        if result == labels.get("titles", labels.get("listings")):
+            correct += 1
+        else:
+            print("MISMATCH {}: {}".format(name, result))
+    accuracy = correct / len(pages)
+
+    t = time.perf_counter()
+    for _ in range(args.repeat):
+        for _, html, labels in pages:
+            parse_page(html, labels)
+    elapsed = time.perf_counter() - t
+
+    result = {
+        "date": datetime.now().isoformat(),
+        "pages": len(pages),
+        "accuracy": accuracy,
+        "pages_per_second": len(pages) * args.repeat / elapsed,
+        "mb_per_second": total_bytes * args.repeat / elapsed / 1e6,
+    }
+    print("pages={pages} accuracy={accuracy:.2%} throughput={pages_per_second:.0f} pages/s "
+          "({mb_per_second:.1f} MB/s)".format(**result))
+
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    if accuracy < args.min_accuracy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Loop time of two bots whose brokers answer with different latencies, run one after the other
+against run concurrently on their own threads as main.py does.
+
+Run from the repository root:
+    python -m benchmarks.bench_concurrency --latency BINANCE=0.2 FTX=0.02 --rounds 10
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+import yaml
+
+import scraper
+from bot import Bot
+from util import Config
+from util.listings import ListingCalendar, LISTING_TIME_FORMAT
+from util.metrics import LatencyStats
+from util.types import Ticker
+
+
+class SlowBroker:
+    """
+    Answers get_tickers after a fixed latency, never lists anything new
+    """
+
+    def __init__(self, broker_type, latency):
+        self.brokerType = broker_type
+        self.latency = latency
+
+    def get_tickers(self, quote_ticker, **kwargs):
+        time.sleep(self.latency)
+        return [Ticker(ticker="BTC" + quote_ticker, base_ticker="BTC", quote_ticker=quote_ticker)]
+
+
+def make_bots(latencies, root):
+    root.joinpath("config.yml").write_text(yaml.dump({"TRADE_OPTIONS": {"BROKERS": {
+        broker: {"ENABLED": True, "LIMIT_SELL_SECONDS": 6, "MARKET_SELL_SECONDS": 10} for broker in latencies
+    }}}))
+    with mock.patch("bot.bot.Broker.factory", side_effect=lambda broker: SlowBroker(broker, latencies[broker])):
+        return [Bot(broker) for broker in latencies]
+
+
+def run_rounds(name, round_, rounds):
+    stats = LatencyStats(name)
+    for _ in range(rounds):
+        with stats.time():
+            round_()
+    print(stats)
+
+
+async def concurrent_round(bots):
+    # main.main
+    await asyncio.gather(*(b.run_async() for b in bots))
+
+
+async def free_running(bots, seconds):
+    # main.forever: every bot loops on its own
+    async def loop(bot):
+        stats = LatencyStats("[{}] own loop".format(bot.broker.brokerType))
+        end = time.time() + seconds
+        while time.time() < end:
+            with stats.time():
+                await bot.run_async()
+        print(stats)
+    await asyncio.gather(*(loop(b) for b in bots))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", nargs="+", default=["BINANCE=0.2", "FTX=0.02"], help="BROKER=seconds")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    latencies = {l.split("=")[0]: float(l.split("=")[1]) for l in args.latency}
+
+    with tempfile.TemporaryDirectory() as d, \
+            mock.patch.multiple(Config, create=True, ROOT_DIR=Path(d), CHECK_LISTING_START_TIME=1.5,
+                                FREQUENCY_SECONDS=0.01, SELL_RETRY_SECONDS=0.25, FIRST_WARNING_TIME_MINUTES=60,
+                                SECOND_WARNING_TIME_MINUTES=10, THIRD_WARNING_TIME_SECONDS=120), \
+            mock.patch.object(Config, "load_version", return_value=(0, 0, False)), \
+            mock.patch.object(scraper, "calendar", ListingCalendar()):
+        # listed at the start of the current minute: the bots are inside the listing window
+        scraper.calendar.add("BTC", datetime.utcnow().strftime(LISTING_TIME_FORMAT))
+        bots = make_bots(latencies, Path(d))
+
+        print("sum of latencies {:.0f}ms, slowest {:.0f}ms".format(
+            sum(latencies.values()) * 1000, max(latencies.values()) * 1000))
+        run_rounds("sequential", lambda: [b.run() for b in bots], args.rounds)
+        run_rounds("concurrent", lambda: asyncio.run(concurrent_round(bots)), args.rounds)
+        asyncio.run(free_running(bots, args.rounds * max(latencies.values())))
+        for b in bots:
+            b.close()
+
+
+if __name__ == "__main__":
+    main()
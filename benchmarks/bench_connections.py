@@ -0,0 +1,69 @@
+"""
+Latency of the first request of a listing window over HTTPS, on a cold session against a session whose
+connections were warmed up beforehand. A local HTTPS server stands in for the API, --rtt adds a delay to the
+handshake to model the distance to the exchange.
+
+Run from the repository root:
+    python -m benchmarks.bench_connections --runs 50 --rtt 0.02
+"""
+import argparse
+import tempfile
+import time
+
+from tests.test_connections import Ping, https_server
+from tests.test_prepared import binance_offline
+from util.metrics import LatencyStats
+
+
+class SlowHandshake(Ping):
+    rtt = 0.0
+
+    def setup(self):
+        # TCP and TLS take about two round trips
+        time.sleep(2 * self.rtt)
+        super().setup()
+
+    def do_GET(self):
+        time.sleep(self.rtt)
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def client_for(server, cert):
+    client = binance_offline()
+    client.API_URL = "https://127.0.0.1:{}/api".format(server.server_address[1])
+    client._requests_params = {"verify": cert}
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--rtt", type=float, default=0.02)
+    args = parser.parse_args()
+    SlowHandshake.rtt = args.rtt
+
+    with tempfile.TemporaryDirectory() as d:
+        server, cert = https_server(SlowHandshake, d)
+        cold, warm = LatencyStats("cold first request"), LatencyStats("warm first request")
+        for _ in range(args.runs):
+            client = client_for(server, cert)
+            with cold.time():
+                client.ping()
+
+            client = client_for(server, cert)
+            client.connections.warm()
+            with warm.time():
+                client.ping()
+        print(cold)
+        print(warm)
+        print(client.connections.report())
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
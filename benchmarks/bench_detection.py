@@ -0,0 +1,132 @@
+"""
+Bytes, request weight and detection latency per poll: downloading the exchange info every poll against
+probing the expected symbol, with a full scan every FULL_SCAN_SECONDS.
+A local server stands in for the API, its exchange info has --symbols symbols and the target is listed
+--list-after seconds into every run.
+
+Run from the repository root:
+    python -m benchmarks.bench_detection --symbols 2000 --seconds 3
+"""
+import argparse
+import json
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import scraper
+from bot import Bot
+from tests.test_exits import offline_bot_patches
+from tests.test_prepared import binance_offline
+from util import Config
+from util.listings import LISTING_TIME_FORMAT
+from util.metrics import LatencyStats
+
+TARGET = "RARE"
+
+
+def exchange_info(symbols, listed):
+    def symbol(name):
+        return {
+            "symbol": name, "status": "TRADING", "baseAsset": name[:-4], "quoteAsset": "USDT",
+            "isSpotTradingAllowed": True, "orderTypes": ["LIMIT", "LIMIT_MAKER", "MARKET", "STOP_LOSS_LIMIT"],
+            "filters": [
+                {"filterType": "PRICE_FILTER", "minPrice": "0.00000100", "maxPrice": "1000.00000000", "tickSize": "0.00000100"},
+                {"filterType": "LOT_SIZE", "minQty": "0.10000000", "maxQty": "9000000.00000000", "stepSize": "0.10000000"},
+            ],
+        }
+    names = ["C{}USDT".format(i) for i in range(symbols)] + ([TARGET + "USDT"] if listed else [])
+    return json.dumps({"timezone": "UTC", "symbols": [symbol(n) for n in names]}).encode()
+
+
+class Api(BaseHTTPRequestHandler):
+    list_at = float("inf")
+    infos = {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        listed = time.time() >= self.list_at
+        if url.path.endswith("/exchangeInfo"):
+            self.reply(200, self.infos[listed])
+        elif url.path.endswith("/ticker/price"):
+            symbol = parse_qs(url.query)["symbol"][0]
+            if symbol == TARGET + "USDT" and listed:
+                self.reply(200, json.dumps({"symbol": symbol, "price": "1.5"}).encode())
+            else:
+                self.reply(400, b'{"code": -1121, "msg": "Invalid symbol."}')
+        else:
+            self.reply(404, b"{}")
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(name, bot, seconds, list_after, frequency):
+    Api.list_at = time.time() + list_after
+    bot.ticker_seen_dict.pop(TARGET + "USDT", None)
+    stats = bot.broker.detection_stats
+    for kind in stats:
+        stats[kind] = {"requests": 0, "bytes": 0, "weight": 0}
+    poll = LatencyStats("{} poll".format(name))
+    detection = None
+    polls = 0
+    end = time.time() + seconds
+    while time.time() < end:
+        with poll.time():
+            new_tickers = bot.get_new_tickers()
+        polls += 1
+        if detection is None and any(t.ticker == TARGET + "USDT" for t in new_tickers):
+            detection = time.time() - Api.list_at
+        time.sleep(frequency)
+    print(poll)
+    print("{}: {:.0f} bytes/poll, {:.1f} weight/poll, detected {:.1f}ms after the listing".format(
+        name, sum(s["bytes"] for s in stats.values()) / polls, sum(s["weight"] for s in stats.values()) / polls,
+        detection * 1000 if detection is not None else float("nan")))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--list-after", type=float, default=1.0)
+    parser.add_argument("--frequency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    Api.infos = {listed: exchange_info(args.symbols, listed) for listed in [False, True]}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Api)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = binance_offline()
+    client.API_URL = "http://127.0.0.1:{}/api".format(server.server_address[1])
+    with tempfile.TemporaryDirectory() as d:
+        patches = offline_bot_patches(Path(d), client)
+        for patcher in patches:
+            patcher.start()
+        scraper.calendar.add(TARGET, datetime.utcnow().strftime(LISTING_TIME_FORMAT))
+        bot = Bot("BINANCE")
+        bot.scrape_the_fucking_shit_m8()
+
+        with mock.patch.object(Config, "FULL_SCAN_SECONDS", 0):
+            run("exchange info every poll", bot, args.seconds, args.list_after, args.frequency)
+        with mock.patch.object(Config, "FULL_SCAN_SECONDS", 1):
+            run("probe, full scan every 1s", bot, args.seconds, args.list_after, args.frequency)
+
+        bot.close()
+        for patcher in patches:
+            patcher.stop()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Listing-to-sale latency of the whole bot, stage by stage, over synthetic listings on the simulated exchange.
+Every listing runs a fresh Bot in the loop of main.py against its own SimulatedBroker, whose clock starts
+--lead seconds before the minute of the listing. The symbol trades --at seconds into that minute and its price
+rises through the limit sell. The stages, in exchange time:
+    visible   the symbol trades on the exchange
+    detected  get_new_tickers returned it
+    sent      the buy went to the broker
+    ack       the broker answered the buy
+    sell      the first sell was placed
+    fill      the sale was recorded
+With --baseline, exits with 1 if the p90 of a stage is more than --tolerance slower than in the last result
+of the baseline file, so that changes to the loop, the broker or the persistence can be compared.
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e --listings 300 --latency 0.01 --history bench_e2e.jsonl
+    python -m benchmarks.bench_e2e --listings 300 --latency 0.01 --baseline bench_e2e.jsonl
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+import yaml
+
+import scraper
+from bot import Bot
+from broker.simulated import Scenario, SimulatedBroker, SimulatedListing
+from util import Config
+from util.listings import LISTING_TIME_FORMAT, ListingCalendar
+from util.metrics import LatencyStats
+
+SYMBOL = "RARE"
+STAGES = ["visible", "detected", "sent", "ack", "sell", "fill"]
+LIMIT_SELL_PERCENT = 26
+
+
+class TimedBroker(SimulatedBroker):
+    """
+    Marks when the buy and the first sell go out and come back, in exchange time
+    """
+
+    def __init__(self, scenario):
+        super().__init__(scenario)
+        self.marks = {"visible": self.start + scenario.listings[0].at}
+
+    def mark(self, stage):
+        self.marks.setdefault(stage, self.exchange_time())
+
+    def place_order(self, config, *args, **kwargs):
+        buy = kwargs.get("side", "").upper() == "BUY"
+        if buy:
+            self.mark("sent")
+        order = super().place_order(config, *args, **kwargs)
+        self.mark("ack" if buy else "sell")
+        return order
+
+
+def instrument(bot, done):
+    """
+    Marks the detection and the recorded sale of the bot on its broker, done is called after the sale
+    """
+    get_new_tickers, record_sale = bot.get_new_tickers, bot.record_sale
+
+    def detect(**kwargs):
+        tickers = get_new_tickers(**kwargs)
+        if any(t.base_ticker == SYMBOL for t in tickers):
+            bot.broker.mark("detected")
+        return tickers
+
+    def sold(*args, **kwargs):
+        record_sale(*args, **kwargs)
+        bot.broker.mark("fill")
+        done()
+
+    bot.get_new_tickers, bot.record_sale = detect, sold
+
+
+async def run_listing(runner, seed, listing_ts, args, root):
+    scenario = Scenario(
+        seed=seed, latency=args.latency, jitter=args.jitter,
+        clock_offset=listing_ts - args.lead - time.time(),
+        listings=[SimulatedListing(
+            base_ticker=SYMBOL, at=args.lead + args.at,
+            prices=[(0, 1.0), (args.rise, 1 + 2 * LIMIT_SELL_PERCENT / 100)],
+        )],
+    )
+    broker = TimedBroker(scenario)
+    scraper.calendar = ListingCalendar()
+    scraper.calendar.add(SYMBOL, datetime.utcfromtimestamp(listing_ts).strftime(LISTING_TIME_FORMAT))
+    # the scheduler of the previous bot runs on its clock
+    runner.schedulers.clear()
+    with mock.patch("bot.bot.Broker.factory", return_value=broker):
+        bot = Bot(broker.brokerType)
+    # errors from the first loop on, the start of the bot is not timed
+    broker.scenario.error_rate = args.error_rate
+
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+    instrument(bot, lambda: loop.call_soon_threadsafe(done.set))
+    task = asyncio.create_task(runner.forever_bot(bot))
+    try:
+        await asyncio.wait_for(done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        bot.close()
+        for file in root.glob(broker.brokerType + "_*"):
+            file.unlink()
+    return broker.marks
+
+
+def summarize(marks):
+    stats = {
+        "{}->{}".format(a, b): LatencyStats("{} -> {}".format(a, b)) for a, b in zip(STAGES, STAGES[1:])
+    }
+    stats["total"] = LatencyStats("visible -> fill")
+    incomplete = 0
+    for m in marks:
+        if any(stage not in m for stage in STAGES):
+            incomplete += 1
+            continue
+        for a, b in zip(STAGES, STAGES[1:]):
+            stats["{}->{}".format(a, b)].add(m[b] - m[a])
+        stats["total"].add(m["fill"] - m["visible"])
+    return stats, incomplete
+
+
+def regressions(result, baseline, tolerance, slack):
+    found = []
+    for name, summary in result["stages"].items():
+        before = baseline["stages"].get(name, {}).get("p90")
+        if before is None or summary["p90"] is None:
+            continue
+        if summary["p90"] > before * (1 + tolerance) + slack:
+            found.append("{}: p90 {:.2f}ms, was {:.2f}ms".format(name, summary["p90"] * 1000, before * 1000))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds every request takes")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--lead", type=float, default=0.3, help="seconds the bot starts before the listing")
+    parser.add_argument("--at", type=float, default=0.05, help="seconds after the listing time the symbol trades")
+    parser.add_argument("--rise", type=float, default=0.2, help="seconds the price takes past the limit sell")
+    parser.add_argument("--frequency", type=float, default=0.01)
+    parser.add_argument("--sell-retry", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=10, help="seconds a listing may take")
+    parser.add_argument("--history", help="append the results as a json line to this file")
+    parser.add_argument("--baseline", help="compare against the last result of this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown of a p90 that fails the run")
+    parser.add_argument("--slack", type=float, default=0.002, help="seconds a p90 may always grow by")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d, \
+            mock.patch.multiple(Config, create=True, ROOT_DIR=Path(d), TEST=False, SHARE_DATA=False,
+                                ENABLED_BROKERS=[], PROGRAM_OPTIONS=dict(Config.PROGRAM_OPTIONS),
+                                CHECK_LISTING_START_TIME=1.5, FREQUENCY_SECONDS=args.frequency,
+                                SELL_RETRY_SECONDS=args.sell_retry, FIRST_WARNING_TIME_MINUTES=60,
+                                SECOND_WARNING_TIME_MINUTES=10, THIRD_WARNING_TIME_SECONDS=120), \
+            mock.patch.object(Config, "load_version", return_value=(0, 0, False)), \
+            mock.patch.object(scraper, "calendar", ListingCalendar()):
+        root = Path(d)
+        root.joinpath("config.yml").write_text(yaml.dump({"TRADE_OPTIONS": {"BROKERS": {"SIMULATED": {
+            "ENABLED": True, "QUANTITY": 30, "LIMIT_SELL_PERCENT": LIMIT_SELL_PERCENT,
+        }}}}))
+        # main.py loads the config.yml of the root on import
+        import main as runner
+
+        async def run_all():
+            # one listing a minute, in the exchange time of its own broker
+            first = math.ceil(time.time() / 60) * 60 + 60
+            return [await run_listing(runner, i, first + 60 * i, args, root) for i in range(args.listings)]
+
+        start = time.perf_counter()
+        marks = asyncio.run(run_all())
+        elapsed = time.perf_counter() - start
+
+    stats, incomplete = summarize(marks)
+    print("{} listings in {:.1f}s, {} incomplete, latency {:.0f}ms +{:.0f}ms, error rate {:.1%}".format(
+        len(marks), elapsed, incomplete, args.latency * 1000, args.jitter * 1000, args.error_rate))
+    for s in stats.values():
+        print(s)
+
+    result = {
+        "date": datetime.now().isoformat(),
+        "listings": len(marks),
+        "incomplete": incomplete,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "error_rate": args.error_rate,
+        "stages": {name: s.summary() for name, s in stats.items()},
+    }
+    failed = incomplete > 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.loads(f.read().splitlines()[-1])
+        for regression in regressions(result, baseline, args.tolerance, args.slack):
+            print("REGRESSION " + regression)
+            failed = True
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
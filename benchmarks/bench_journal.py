@@ -0,0 +1,58 @@
+"""
+Restart-to-ready time: replaying a large trade journal, before and after compaction.
+
+Run from the repository root:
+    python -m benchmarks.bench_journal --events 100000 --orders 20
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from tests.test_persistence import make_order
+from util.journal import Journal
+from util.metrics import LatencyStats
+from util.types import Order
+
+
+def restart(name, file, repeat, compact_every):
+    stats = LatencyStats(name)
+    for _ in range(repeat):
+        with stats.time():
+            # compact_every above the events, so that a replay does not compact the journal of the next repeat
+            journal = Journal(file, compact_every=compact_every).replay()
+            # what Bot.recover does with it
+            orders = {key: Order.parse_obj(order) for key, order in journal.orders.items()}
+    print(stats)
+    return journal, orders
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as d:
+        file = Path(d).joinpath("journal.jsonl")
+        journal = Journal(file, compact_every=args.events + 1)
+        t = time.perf_counter()
+        for i in range(args.events):
+            if i % 10 == 0:
+                key = "T{}USDT".format(i // 10 % args.orders)
+                journal.record_order(key, make_order(key))
+            else:
+                journal.record_state(coin="RARE", listing_time="2021-10-11 06:00", stage=i % 4)
+        journal.close()
+        print("append: {:.1f}us/event, {:.1f} MB".format(
+            (time.perf_counter() - t) / args.events * 1e6, file.stat().st_size / 1e6))
+
+        journal, orders = restart("replay {} events".format(args.events), file, args.repeat, args.events + 1)
+        journal.compact()
+        _, compacted = restart("replay compacted", file, args.repeat, args.events + 1)
+        assert orders == compacted
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Disk writes and time per loop iteration, saving the orders every iteration against the write-behind store.
+
+Run from the repository root:
+    python -m benchmarks.bench_persistence --seconds 5 --orders 20
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from tests.test_persistence import make_order
+from util import Util
+from util.metrics import LatencyStats
+from util.persistence import JsonStore
+from util.types import Order
+
+
+def run(name, save, orders, seconds, frequency, change_every):
+    stats = LatencyStats(name)
+    end = time.time() + seconds
+    i = 0
+    while time.time() < end:
+        with stats.time():
+            if i % change_every == 0:
+                # re-assigned like Bot.update does with the trailing stop loss
+                orders["RAREUSDT"] = orders["RAREUSDT"].copy(update={"trailing_stop_loss": 0.95 + i * 1e-6})
+            save()
+        i += 1
+        time.sleep(frequency)
+    print(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--frequency", type=float, default=0.01)
+    parser.add_argument("--change-every", type=int, default=100, help="iterations between order changes")
+    args = parser.parse_args()
+
+    tickers = ["RAREUSDT"] + ["T{}USDT".format(i) for i in range(args.orders - 1)]
+    with tempfile.TemporaryDirectory() as d:
+        file = Path(d).joinpath("orders.json")
+
+        orders = {t: make_order(t) for t in tickers}
+        writes = [0]
+
+        def save():
+            Util.dump_json(file, orders)
+            writes[0] += 1
+        run("save every iteration", save, orders, args.seconds, args.frequency, args.change_every)
+        print("disk writes/s: {:.1f}".format(writes[0] / args.seconds))
+
+        store = JsonStore(file, Order)
+        store.replace({t: make_order(t) for t in tickers})
+        run("write-behind", lambda: None, store.data, args.seconds, args.frequency, args.change_every)
+        store.close()
+        print("disk writes/s: {:.1f}".format(store.writes / args.seconds))
+
+
+if __name__ == "__main__":
+    main()
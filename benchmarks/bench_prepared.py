@@ -0,0 +1,51 @@
+"""
+Detection-to-wire latency of the buy: place_order, which builds and signs the request through python-binance,
+against firing the order pre-armed by prepare_order. The clock stops when the request reaches session.post.
+
+Run from the repository root:
+    python -m benchmarks.bench_prepared --orders 2000
+"""
+import argparse
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from tests.test_prepared import binance_offline, filled_response
+from util import Config
+from util.metrics import LatencyStats
+from util.types import Ticker
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000)
+    args = parser.parse_args()
+
+    client = binance_offline()
+    config = SimpleNamespace(QUANTITY=30, TAKE_PROFIT_PERCENT=30, STOP_LOSS_PERCENT=9, TRAILING_STOP_LOSS_PERCENT=8)
+    ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+    on_wire = []
+
+    def post(*args, **kwargs):
+        on_wire.append(time.perf_counter())
+        return filled_response()
+
+    with mock.patch.object(Config, "TEST", False), mock.patch.object(client.session, "post", side_effect=post):
+        before = LatencyStats("place_order")
+        for _ in range(args.orders):
+            t = time.perf_counter()
+            client.place_order(config, ticker=ticker, size=float(config.QUANTITY), side="BUY")
+            before.add(on_wire[-1] - t)
+        print(before)
+
+        prepared = client.prepare_order(config, ticker)
+        after = LatencyStats("prepared")
+        for _ in range(args.orders):
+            t = time.perf_counter()
+            client.fire_order(config, prepared, ticker)
+            after.add(on_wire[-1] - t)
+        print(after)
+
+
+if __name__ == "__main__":
+    main()
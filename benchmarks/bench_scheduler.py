@@ -0,0 +1,59 @@
+"""
+Idle CPU of the fixed FREQUENCY_SECONDS polling against the scheduler, and wake-up jitter at T-0.
+
+Run from the repository root:
+    python -m benchmarks.bench_scheduler --seconds 5 --wakeups 50
+"""
+import argparse
+import asyncio
+import time
+
+from util.metrics import LatencyStats
+from util.scheduler import Scheduler
+
+
+async def fixed_polling(seconds, frequency):
+    end = time.time() + seconds
+    while time.time() < end:
+        await asyncio.sleep(frequency)
+
+
+async def scheduled(scheduler, seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        await scheduler.sleep_until(end)
+
+
+async def jitter(scheduler, wakeups, precise):
+    stats = LatencyStats("T-0 jitter ({})".format("call_at + spin" if precise else "asyncio.sleep"))
+    for _ in range(wakeups):
+        target = time.time() + 0.05
+        if precise:
+            await scheduler.sleep_until(target, precise=True)
+        else:
+            await asyncio.sleep(target - time.time())
+        stats.add(time.time() - target)
+    print(stats)
+
+
+def cpu(name, coroutine):
+    t = time.process_time()
+    asyncio.run(coroutine)
+    print("{}: {:.1f}ms CPU".format(name, (time.process_time() - t) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--frequency", type=float, default=0.01)
+    parser.add_argument("--wakeups", type=int, default=50)
+    args = parser.parse_args()
+
+    cpu("idle, fixed {}s polling".format(args.frequency), fixed_polling(args.seconds, args.frequency))
+    cpu("idle, scheduler", scheduled(Scheduler(), args.seconds))
+    asyncio.run(jitter(Scheduler(), args.wakeups, precise=False))
+    asyncio.run(jitter(Scheduler(), args.wakeups, precise=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Per-cycle scrape latency, HTTP mode against the Selenium mode.
+
+Run from the repository root:
+    python -m benchmarks.bench_scraper --cycles 5
+    python -m benchmarks.bench_scraper --offline --cycles 200
+"""
+import argparse
+import resource
+from unittest import mock
+
+import scraper
+from util.metrics import LatencyStats
+from tests.test_scraper import read_page
+
+
+def run(name, fn, cycles):
+    stats = LatencyStats(name)
+    for _ in range(cycles):
+        with stats.time():
+            fn()
+    print(stats)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--offline", action="store_true", help="parse the saved pages in tests/pages, no network")
+    parser.add_argument("--skip-selenium", action="store_true")
+    args = parser.parse_args()
+
+    if args.offline:
+        with mock.patch.object(scraper, "fetch_page", side_effect=read_page):
+            run("http (offline parse)", scraper.get_candidates_http, args.cycles)
+        return
+
+    run("http", scraper.get_candidates_http, args.cycles)
+    print("max RSS after http: {} MB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024))
+
+    if not args.skip_selenium:
+        run("selenium", scraper.get_candidates_selenium, args.cycles)
+        print("max RSS incl. chrome children: {} MB".format(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024))
+        scraper.resources.close_driver()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Detection latency of a new listing, from the moment the exchange lists it to the moment the bot knows:
+REST polls of the exchange info or of the expected symbol every --frequency seconds, against the first frame
+of the market streams. Local servers stand in for the REST API and the streams, every one of the --listings
+listings happens at a random instant.
+
+Run from the repository root:
+    python -m benchmarks.bench_stream --listings 100 --frequency 0.01
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import websockets
+
+from benchmarks.bench_detection import Api, TARGET, exchange_info
+from broker.stream import ListingStream
+from tests.test_prepared import binance_offline
+from util.metrics import LatencyStats
+from util.types import Ticker
+
+
+class Broadcast:
+    """
+    Market streams stand-in, publish() sends a frame to every connection
+    """
+
+    def __init__(self):
+        self.clients = set()
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        threading.Thread(target=self.loop.run_until_complete, args=(self.serve(ready),), daemon=True).start()
+        ready.wait()
+
+    async def serve(self, ready):
+        server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        self.url = "ws://127.0.0.1:{}/stream".format(server.sockets[0].getsockname()[1])
+        ready.set()
+        await asyncio.Future()
+
+    async def handler(self, ws, *args):
+        self.clients.add(ws)
+        try:
+            await ws.wait_closed()
+        finally:
+            self.clients.discard(ws)
+
+    def publish(self, frame):
+        message = json.dumps(frame)
+
+        async def send():
+            for ws in list(self.clients):
+                await ws.send(message)
+        asyncio.run_coroutine_threadsafe(send(), self.loop).result()
+
+
+def rest(name, poll, listings, frequency):
+    stats = LatencyStats(name)
+    for _ in range(listings):
+        Api.list_at = time.time() + random.uniform(0, 0.1)
+        while not poll():
+            time.sleep(frequency)
+        stats.add(time.time() - Api.list_at)
+    return stats
+
+
+def stream(listings):
+    stats = LatencyStats("market stream")
+    listed = {}
+    detected = threading.Semaphore(0)
+
+    def on_new(ticker):
+        stats.add(time.time() - listed[ticker.ticker])
+        detected.release()
+
+    server = Broadcast()
+    listener = ListingStream(server.url, "USDT", lambda symbol: False, on_new).start()
+    listener.connected.wait()
+    while not server.clients:
+        time.sleep(0.01)
+    for i in range(listings):
+        time.sleep(random.uniform(0, 0.1))
+        symbol = "NEW{}USDT".format(i)
+        listed[symbol] = time.time()
+        server.publish({"stream": symbol.lower() + "@trade", "data": {
+            "e": "trade", "E": int(time.time() * 1000), "s": symbol, "p": "1.0", "q": "10"
+        }})
+        detected.acquire()
+    listener.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=100)
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--frequency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    Api.infos = {listed: exchange_info(args.symbols, listed) for listed in [False, True]}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Api)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = binance_offline()
+    client.API_URL = "http://127.0.0.1:{}/api".format(server.server_address[1])
+    target = Ticker(ticker=TARGET + "USDT", base_ticker=TARGET, quote_ticker="USDT")
+
+    print(rest("REST exchange info", lambda: any(t.ticker == target.ticker for t in client.get_tickers("USDT")),
+               args.listings, args.frequency))
+    print(rest("REST probe", lambda: client.probe_tickers([target]), args.listings, args.frequency))
+    print(stream(args.listings))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
+import asyncio
+import heapq
 import traceback
 import time
 import datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, NoReturn, Tuple
 
 from broker import Broker
+from broker.fills import FillWatcher
 from notification.notification import pretty_entry, pretty_close
 from util import Config
 from util import Util
+from util.clock import ExchangeClock
+from util.exceptions import OrderStatusUnknownException
+from util.journal import Journal
+from util.metrics import LatencyStats
+from util.persistence import JsonStore
 from util.types import BrokerType, Ticker, Order, Sold
 
 import scraper
@@ -21,7 +31,10 @@ class Bot:
         self.__target_coin = None
         self.__scraped_listing_time = None
         self.__listing_time_ts = 0
-        self.__stage = 0
+        # buy of the target coin, built and signed up to the timestamp before the listing
+        self.__prepared_buy = None
+        # listing_time_ts the connections of the broker were opened for
+        self.__warmed_for = None
 
         self.__new_tickers_detected_time = 0
         self.__time_to_buy_seconds = 0
@@ -30,68 +43,194 @@ class Bot:
 
         self.broker = Broker.factory(broker)
         self.config = Config(self.broker.brokerType)
+        # every timestamp of the bot is exchange time, the listing times are
+        self.clock = getattr(self.broker, "clock", None) or ExchangeClock()
+        self.sync_clock()
+        # a single thread keeps the calls of this bot ordered
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"bot-{self.broker.brokerType}")
+        self.fills = FillWatcher(self.broker, Config.SELL_RETRY_SECONDS, self.clock.now)
+        if Config.USER_DATA_STREAM and hasattr(self.broker, "start_user_stream"):
+            # fills pushed by the exchange wake the fill watcher up, its checks no longer cost a request
+            self.broker.start_user_stream(self.fills.wake)
 
         self._pending_remove = []
+        # ticker -> (sell, future resolved by the fill watcher, current_price, stored_price)
+        self._pending_sells: Dict[str, Tuple[Order, Future, float, float]] = {}
+        # positions to step, so that a loop pass only looks at the positions with something to do:
+        # a heap of (timestamp, ticker) and the tickers whose sell resolved, filled by the fill watcher thread
+        self._exits_due: List[Tuple[float, str]] = []
+        self._sells_resolved = deque()
 
         self.ticker_seen_dict = []
         self.all_tickers, self.ticker_seen_dict = self.get_starting_tickers()
 
-        # create / load files
-        self.orders: Dict[str, Order] = {}
-        self.orders_file = None
+        # new tickers pushed by the market streams, next to the polls of get_new_tickers
+        self.stream = None
+        if Config.STREAM_DETECTION and hasattr(self.broker, "listing_stream"):
+            self.stream = self.broker.listing_stream(
+                self.config.QUOTE_TICKER, lambda symbol: symbol in self.ticker_seen_dict, self.on_stream_ticker
+            ).start()
 
-        self.sold: Dict[str, Sold] = {}
-        self.sold_file = None
+        # create / load files, written behind the loop when they change
+        self.orders_file = Config.ROOT_DIR.joinpath(f"{self.broker.brokerType}_orders.json")
+        self.orders_store = JsonStore(self.orders_file, Order)
 
-        for f in ["orders", "sold"]:
-            file = Config.ROOT_DIR.joinpath(f"{self.broker.brokerType}_{f}.json")
-            self.__setattr__(f"{f}_file", file)
-            if file.exists():
-                self.__setattr__(
-                    f, Util.load_json(file, Order if f == "orders" else Sold)
-                )
+        self.sold_file = Config.ROOT_DIR.joinpath(f"{self.broker.brokerType}_sold.json")
+        self.sold_store = JsonStore(self.sold_file, Sold)
+
+        # the journal wins over the files, it also knows the stage of the listing being sold
+        self.journal = Journal(Config.ROOT_DIR.joinpath(f"{self.broker.brokerType}_journal.jsonl")).replay()
+        self.recover()
 
         # Meta info
         self.interval = 0
+        self.connection_time = LatencyStats(f"[{self.broker.brokerType}] connection warm-up")
+        self.last_periodic_update = 0
+        self.last_full_scan = 0
+
+    @property
+    def orders(self) -> Dict[str, Order]:
+        return self.orders_store.data
 
+    @orders.setter
+    def orders(self, orders: Dict[str, Order]) -> NoReturn:
+        self.orders_store.replace(orders)
+
+    @property
+    def sold(self) -> Dict[str, Sold]:
+        return self.sold_store.data
+
+    @sold.setter
+    def sold(self, sold: Dict[str, Sold]) -> NoReturn:
+        self.sold_store.replace(sold)
 
     def check_warnings(self):
+        sent = (self.__sent_first_warning, self.__sent_second_warning, self.__sent_third_warning)
         if not self.__sent_first_warning:
-            if (self.__target_coin is not None) and (self.__listing_time_ts - time.time() < Config.FIRST_WARNING_TIME_MINUTES*60):
+            if (self.__target_coin is not None) and (self.__listing_time_ts - self.clock.now() < Config.FIRST_WARNING_TIME_MINUTES*60):
                 Config.NOTIFICATION_SERVICE.info(
                     f"[{self.broker.brokerType}] will list {self.__target_coin} in {Config.FIRST_WARNING_TIME_MINUTES} minutes!"
                 )
                 self.__sent_first_warning = True
         if not self.__sent_second_warning:
-            if (self.__target_coin is not None) and (self.__listing_time_ts - time.time() < Config.SECOND_WARNING_TIME_MINUTES*60):
+            if (self.__target_coin is not None) and (self.__listing_time_ts - self.clock.now() < Config.SECOND_WARNING_TIME_MINUTES*60):
                 Config.NOTIFICATION_SERVICE.info(
                     f"[{self.broker.brokerType}] will list {self.__target_coin} in {Config.SECOND_WARNING_TIME_MINUTES} minutes!"
                 )
                 self.__sent_second_warning = True
         if not self.__sent_third_warning:
-            if (self.__target_coin is not None) and (self.__listing_time_ts - time.time() < Config.THIRD_WARNING_TIME_SECONDS):
+            if (self.__target_coin is not None) and (self.__listing_time_ts - self.clock.now() < Config.THIRD_WARNING_TIME_SECONDS):
                 Config.NOTIFICATION_SERVICE.info(
                     f"[{self.broker.brokerType}] will list {self.__target_coin} in {Config.THIRD_WARNING_TIME_SECONDS} seconds!"
                 )
                 self.__sent_third_warning = True
+        if sent != (self.__sent_first_warning, self.__sent_second_warning, self.__sent_third_warning):
+            self.record_state()
 
     def scrape_the_fucking_shit_m8(self) -> NoReturn:
-        Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(
-            f"[{self.broker.brokerType}]\tScraping..."
-        )
-        coin, listing_time = scraper.search_and_update()
-        if coin is not None:
+        """
+        Arms the bot for the next listing of the calendar filled by the scrape worker, never waits for a scrape
+        """
+        now = self.clock.now()
+        if self.in_listing_window(now):
+            # never switch target inside a listing window
+            return
+        scraper.calendar.expire(now - 100*Config.CHECK_LISTING_START_TIME)
+        listing = scraper.calendar.peek()
+        if listing is None:
+            if self.__target_coin is not None and self.__listing_time_ts < now:
+                self.disarm()
+            return
+        coin, listing_time, listing_time_ts = listing
+        if (coin, listing_time) != (self.__target_coin, self.__scraped_listing_time):
             self.__target_coin = coin
             self.__scraped_listing_time = listing_time
-            self.__listing_time_ts = time.mktime(time.strptime(listing_time, "%Y-%m-%d %H:%M"))
+            self.__listing_time_ts = listing_time_ts
             self.__sent_first_warning = False
             self.__sent_second_warning = False
             self.__sent_third_warning = False
+            self.record_state()
+            self.prepare_buy()
             print("self.__target_coin", self.__target_coin)
             print("self.__scraped_listing_time", self.__scraped_listing_time)
             print("self.__listing_time_ts", self.__listing_time_ts)
 
+    def disarm(self) -> NoReturn:
+        """
+        Done with the current listing, removes it from the calendar
+        """
+        if self.__target_coin is not None:
+            scraper.calendar.pop(self.__target_coin)
+        self.__target_coin = None
+        self.__prepared_buy = None
+        self.__scraped_listing_time = None
+        self.__listing_time_ts = 0
+        self.record_state()
+
+    def prepare_buy(self) -> NoReturn:
+        """
+        Pre-arms the buy of the target coin, so that only the timestamp and signature are left on detection,
+        and subscribes to its trades
+        """
+        self.__prepared_buy = None
+        if self.__target_coin is None:
+            return
+        symbol = self.__target_coin + self.config.QUOTE_TICKER
+        if self.stream is not None:
+            self.stream.watch(symbol)
+        if not hasattr(self.broker, "prepare_order"):
+            return
+        ticker = Ticker(ticker=symbol, base_ticker=self.__target_coin, quote_ticker=self.config.QUOTE_TICKER)
+        self.__prepared_buy = self.broker.prepare_order(self.config, ticker)
+
+    def record_state(self) -> NoReturn:
+        self.journal.record_state(
+            coin=self.__target_coin,
+            listing_time=self.__scraped_listing_time,
+            listing_time_ts=self.__listing_time_ts,
+            warnings=[self.__sent_first_warning, self.__sent_second_warning, self.__sent_third_warning],
+        )
+
+    def recover(self) -> NoReturn:
+        """
+        Restores the orders, sold trades and listing state of the journal, so that a restart
+        inside a listing window resumes selling every position at its stage
+        """
+        if self.journal.entries == 0:
+            # first start with a journal, it starts from the files
+            for key, order in self.orders.items():
+                self.journal.record_order(key, order)
+            for key, sold in self.sold.items():
+                self.journal.record_sold(key, sold)
+        else:
+            self.orders = {key: Order.parse_obj(order) for key, order in self.journal.orders.items()}
+            self.sold = {key: Sold.parse_obj(sold) for key, sold in self.journal.sold.items()}
+            state = self.journal.state
+            if state.get("coin") is not None:
+                self.__target_coin = state["coin"]
+                self.__scraped_listing_time = state["listing_time"]
+                self.__listing_time_ts = state["listing_time_ts"]
+                self.__sent_first_warning, self.__sent_second_warning, self.__sent_third_warning = state["warnings"]
+                self.prepare_buy()
+
+        for key, order in self.orders.items():
+            if key in self.sold:
+                continue
+            if order.sell_order_id is not None:
+                # the sell placed before the restart is watched again
+                sell = order.copy(update={"orderId": order.sell_order_id})
+                self.watch_sell(key, sell, 1 if order.exit_stage == 0 else 0, order.price, order.exit_deadline)
+            else:
+                self.schedule_exit(key, self.clock.now())
+
     async def run_async(self) -> NoReturn:
+        """
+        Runs the blocking broker calls on the thread of this bot, so that the event loop
+        and the other bots keep running meanwhile
+        """
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.run)
+
+    def run(self) -> NoReturn:
         """
         Sells, adjusts TP and SL according to trailing values
         and buys new tickers
@@ -99,32 +238,29 @@ class Bot:
         try:
             self.periodic_update()
 
-            if (self.__target_coin is not None) and (-100*Config.CHECK_LISTING_START_TIME < self.__listing_time_ts - time.time() < Config.CHECK_LISTING_START_TIME):
-                # basically the sell block and update TP and SL logic
-                if len(self.orders) > 0:
-                    Config.NOTIFICATION_SERVICE.debug(
-                        f"[{self.broker.brokerType}]\tActive Order Tickers: [{self.orders}]"
-                    )
+            # basically the sell block, every position runs its own exit, also once the listing window is over
+            self.drive_exits()
 
-                    for key, stored_order in self.orders.items():
-                        if key not in self.sold:
-                            #self.update(key, stored_order)
-                            self.do_the_selling(key, stored_order)
+            # remove pending removals
+            done_with_listing = False
+            for o in self._pending_remove:
+                order = self.orders.pop(o)
+                self.journal.record_remove(o)
+                # positions of an earlier listing do not end the current one
+                done_with_listing |= order.listing_time_ts == self.__listing_time_ts
+            if done_with_listing and self.in_listing_window():
+                self.disarm()
+            self._pending_remove = []
 
-                # remove pending removals
-                [self.orders.pop(o) for o in self._pending_remove]
-                if len(self._pending_remove) > 0:
-                    self.__target_coin = None
-                    self.__stage = 0
-                    self.__scraped_listing_time = None
-                    self.__listing_time_ts = 0
-                self._pending_remove = []
+            if self.warm_up_due():
+                self.warm_up()
 
+            if self.in_listing_window():
                 # check if new tickers are listed
                 new_tickers = self.get_new_tickers()
 
                 if len(new_tickers) > 0:
-                    self.__new_tickers_detected_time = time.time()
+                    self.__new_tickers_detected_time = self.clock.now()
                     self.__should_send_detection_notification = True
                     #Config.NOTIFICATION_SERVICE.debug(
                     #    f"[{self.broker.brokerType}]\tNew tickers detected: {new_tickers}"
@@ -143,27 +279,156 @@ class Bot:
             self.save()
             Config.NOTIFICATION_SERVICE.error(traceback.format_exc())
 
-        finally:
-            self.save()
 
+    def warm_up_due(self, now: float = None) -> bool:
+        now = self.clock.now() if now is None else now
+        return (
+                self.__target_coin is not None
+                and self.__warmed_for != self.__listing_time_ts
+                and Config.CHECK_LISTING_START_TIME < self.__listing_time_ts - now <= Config.WARMUP_SECONDS
+        )
+
+    def warm_up(self) -> NoReturn:
+        """
+        Shortly before the listing window, syncs the clock with the exchange and reports its error,
+        and opens the connections of the broker, so that its requests reuse them
+        """
+        self.__warmed_for = self.__listing_time_ts
+        self.sync_clock(8)
+        Config.NOTIFICATION_SERVICE.debug(
+            f"[{self.broker.brokerType}]\t{self.clock.report()}, {self.__target_coin} lists in "
+            f"{self.__listing_time_ts - self.clock.now():.3f}s"
+        )
+        if not hasattr(self.broker, "connections"):
+            return
+        with self.connection_time.time():
+            self.broker.connections.warm()
+        Config.NOTIFICATION_SERVICE.debug(
+            f"[{self.broker.brokerType}]\tConnections warmed up in {self.connection_time.samples[-1] * 1000:.1f}ms: "
+            f"{self.broker.connections.report()}"
+        )
+
+    def sync_clock(self, samples: int = 4) -> NoReturn:
+        if not self.clock.sync(samples):
+            return
+        if hasattr(self.broker, "timestamp_offset"):
+            # signed requests carry the exchange time as well
+            self.broker.timestamp_offset = int((self.clock.now() - time.time()) * 1000)
+
+    def in_listing_window(self, now: float = None) -> bool:
+        now = self.clock.now() if now is None else now
+        return (self.__target_coin is not None) and (-100*Config.CHECK_LISTING_START_TIME < self.__listing_time_ts - now < Config.CHECK_LISTING_START_TIME)
+
+    def next_wakeup(self) -> Tuple[float, bool]:
+        """
+        Returns when run_async needs to run next and whether that instant must be hit precisely.
+        Polls every FREQUENCY_SECONDS, or as often as the request weight left allows, only inside the
+        listing window, otherwise sleeps until the next
+        warning, the listing window, the periodic update or the next step of an open position.
+        """
+        now = self.clock.now()
+        if self.in_listing_window(now):
+            interval = Config.FREQUENCY_SECONDS
+            budget = getattr(self.broker, "budget", None)
+            if budget is not None:
+                # as often as the weight left in the minute allows. A probe goes to every hedged host, and the
+                # full scan every FULL_SCAN_SECONDS takes its share of each poll
+                hedge = getattr(self.broker, "hedge", None)
+                cost = self.broker.PRICE_TICKER_WEIGHT * (1 if hedge is None else hedge.fan_out) \
+                    + self.broker.EXCHANGE_INFO_WEIGHT * interval / Config.FULL_SCAN_SECONDS
+                interval = max(interval, budget.poll_interval(cost, now))
+            if now < self.__listing_time_ts < now + interval:
+                return self.__listing_time_ts, True
+            return now + interval, False
+
+        wakeups = [(self.last_periodic_update + Config.PROGRAM_OPTIONS["LOG_INFO_UPDATE_INTERVAL"] * 60, False)]
+        if self.__target_coin is not None:
+            wakeups.append((self.__listing_time_ts - Config.CHECK_LISTING_START_TIME, True))
+            if self.__warmed_for != self.__listing_time_ts:
+                wakeups.append((self.__listing_time_ts - Config.WARMUP_SECONDS, False))
+            if not self.__sent_first_warning:
+                wakeups.append((self.__listing_time_ts - Config.FIRST_WARNING_TIME_MINUTES*60, False))
+            if not self.__sent_second_warning:
+                wakeups.append((self.__listing_time_ts - Config.SECOND_WARNING_TIME_MINUTES*60, False))
+            if not self.__sent_third_warning:
+                wakeups.append((self.__listing_time_ts - Config.THIRD_WARNING_TIME_SECONDS, False))
+        wakeups = [w for w in wakeups if w[0] > now]
+        if self._exits_due:
+            wakeups.append((self._exits_due[0][0], False))
+        if self._pending_sells:
+            wakeups.append((now + Config.SELL_RETRY_SECONDS, False))
+        return min(wakeups, default=(now + Config.FREQUENCY_SECONDS, False))
+
+    def schedule_exit(self, key: str, when: float) -> NoReturn:
+        heapq.heappush(self._exits_due, (when, key))
+
+    def drive_exits(self, now: float = None) -> NoReturn:
+        """
+        Steps the exit of the positions whose sell resolved or whose timer is due,
+        the other open positions cost nothing
+        """
+        now = self.clock.now() if now is None else now
+        due = set()
+        while self._sells_resolved:
+            due.add(self._sells_resolved.popleft())
+        while self._exits_due and self._exits_due[0][0] <= now:
+            due.add(heapq.heappop(self._exits_due)[1])
+        for key in due:
+            if key in self.orders and key not in self.sold:
+                Config.NOTIFICATION_SERVICE.debug(
+                    f"[{self.broker.brokerType}]\tActive Order Ticker: [{key}] stage {self.orders[key].exit_stage}"
+                )
+                #self.update(key, self.orders[key])
+                self.do_the_selling(key, self.orders[key], now=now)
 
     def do_the_selling(self, key, order, **kwargs) -> NoReturn:
-        time_now = time.time() - self.__listing_time_ts
-        if (self.__stage == 0) and (time_now < self.config.LIMIT_SELL_SECONDS):
-            res = self.close_trade(order, 1, order.price)
-            if res:
-                self.__stage = 3
+        """
+        Exit of one position: limit sell at LIMIT_SELL_PERCENT until LIMIT_SELL_SECONDS after its listing,
+        then at the buy price until MARKET_SELL_SECONDS, then market sell. Limit sells are waited for by the
+        fill watcher, which cancels them at their deadline.
+        """
+        now = kwargs.get("now", self.clock.now())
+        if key in self._pending_sells:
+            sell, filled, current_price, stored_price = self._pending_sells[key]
+            if not filled.done():
                 return
-            self.__stage = 1
-        elif (self.__stage == 1) and (self.config.LIMIT_SELL_SECONDS < time_now < self.config.MARKET_SELL_SECONDS):
-            res = self.close_trade(order, 0, order.price)
-            if res:
-                self.__stage = 3
+            del self._pending_sells[key]
+            order.sell_order_id = None
+            if filled.result():
+                self.record_sale(order, sell, current_price, stored_price)
+                order.exit_stage = 3
+                self.update_order(key, order)
                 return
-            self.__stage = 2
-        elif (self.__stage == 2) and (self.config.MARKET_SELL_SECONDS < time_now):
-            self.close_trade(order, -1, order.price)
-            self.__stage = 3
+            order.exit_stage += 1
+
+        time_now = now - order.listing_time_ts
+        if (order.exit_stage == 0) and (time_now >= self.config.LIMIT_SELL_SECONDS):
+            order.exit_stage = 1
+        if (order.exit_stage == 1) and (time_now >= self.config.MARKET_SELL_SECONDS):
+            order.exit_stage = 2
+
+        try:
+            if order.exit_stage == 0:
+                self.close_trade(order, 1, order.price)
+            elif order.exit_stage == 1:
+                self.close_trade(order, 0, order.price)
+            elif order.exit_stage == 2:
+                self.close_trade(order, -1, order.price)
+                order.exit_stage = 3
+        except Exception:
+            Config.NOTIFICATION_SERVICE.error(traceback.format_exc())
+            self.schedule_exit(key, now + Config.SELL_RETRY_SECONDS)
+        self.update_order(key, order)
+
+    def update_order(self, key: str, order: Order) -> NoReturn:
+        # re-assigned so that the store sees the change
+        self.orders[key] = order
+        self.journal.record_order(key, order)
+
+    def watch_sell(self, key: str, sell: Order, current_price: float, stored_price: float, deadline: float) -> NoReturn:
+        filled = self.fills.watch(sell, deadline)
+        self._pending_sells[key] = (sell, filled, current_price, stored_price)
+        filled.add_done_callback(lambda _: self._sells_resolved.append(key))
 
 
     def update(self, key, order, **kwargs) -> NoReturn:
@@ -172,7 +437,7 @@ class Bot:
             "current_price", self.broker.get_current_price(order.ticker)
         )
 
-        if self.__listing_time_ts + 10 < time.time():
+        if self.__listing_time_ts + 10 < self.clock.now():
             self.close_trade(order, current_price, order.price)
             return
 
@@ -207,25 +472,36 @@ class Bot:
         log an update about every LOG_INFO_UPDATE_INTERVAL minutes
         also re-saves files
         """
-        if (
-                self.interval >= 0
-                and self.interval
-                % int(
-                (Config.PROGRAM_OPTIONS["LOG_INFO_UPDATE_INTERVAL"] * 60)
-                / Config.FREQUENCY_SECONDS
-        )
-                == 0
-        ):
+        if self.clock.now() - self.last_periodic_update >= Config.PROGRAM_OPTIONS["LOG_INFO_UPDATE_INTERVAL"] * 60:
+            self.last_periodic_update = self.clock.now()
             Config.NOTIFICATION_SERVICE.debug(
                 f"[{self.broker.brokerType}] ORDERS UPDATE:\n\t{self.orders}"
             )
-            self.scrape_the_fucking_shit_m8()
             self.config = Config(self.broker.brokerType)
+            self.prepare_buy()
             Config.NOTIFICATION_SERVICE.debug(
                 f"[{self.broker.brokerType}]\tSaving..."
             )
             self.save()
             self.upgrade_update()
+            self.sync_clock(1)
+            Config.NOTIFICATION_SERVICE.debug(f"[{self.broker.brokerType}]\t{self.clock.report()}")
+            if hasattr(self.broker, "detection_report"):
+                Config.NOTIFICATION_SERVICE.debug(self.broker.detection_report())
+            if hasattr(self.broker, "budget"):
+                Config.NOTIFICATION_SERVICE.debug(f"[{self.broker.brokerType}]\t{self.broker.budget.report()}")
+            if hasattr(self.broker, "connections"):
+                Config.NOTIFICATION_SERVICE.debug(f"[{self.broker.brokerType}]\t{self.broker.connections.report()}")
+            if getattr(self.broker, "hedge", None) is not None:
+                Config.NOTIFICATION_SERVICE.debug(f"[{self.broker.brokerType}]\t{self.broker.hedge.report()}")
+            if hasattr(self.broker, "retry_report"):
+                Config.NOTIFICATION_SERVICE.debug(f"[{self.broker.brokerType}]\t{self.broker.retry_report()}")
+            if self.stream is not None:
+                Config.NOTIFICATION_SERVICE.debug(
+                    f"[{self.broker.brokerType}]\t{self.stream.latency}, {self.stream.frames} frames, "
+                    f"{self.stream.reconnects} reconnects"
+                )
+        self.scrape_the_fucking_shit_m8()
         self.check_warnings()
 
     def get_starting_tickers(self) -> Tuple[List[Ticker], Dict[str, bool]]:
@@ -249,10 +525,29 @@ class Bot:
         The value of the new tickers in ticker_seen_dict will be set to True to make them not get detected again.
         """
         new_tickers = []
-        Config.NOTIFICATION_SERVICE.debug(
-            f"[{self.broker.brokerType}]\tGetting all tickers.."
-        )
-        all_tickers_recheck = self.broker.get_tickers(self.config.QUOTE_TICKER)
+        now = self.clock.now()
+        can_probe = self.__target_coin is not None and hasattr(self.broker, "probe_tickers")
+        full_scan = not can_probe or now - self.last_full_scan >= Config.FULL_SCAN_SECONDS
+        budget = getattr(self.broker, "budget", None)
+        if budget is not None:
+            # a full scan waits for weight to be left, probes cost a tenth of it
+            if full_scan and not budget.can_afford(self.broker.EXCHANGE_INFO_WEIGHT, now):
+                full_scan = False
+            if not full_scan and not (can_probe and budget.can_afford(self.broker.PRICE_TICKER_WEIGHT, now)):
+                return new_tickers
+        if not full_scan:
+            # only the expected symbol, all tickers every FULL_SCAN_SECONDS for unexpected listings
+            all_tickers_recheck = self.broker.probe_tickers([Ticker(
+                ticker=self.__target_coin + self.config.QUOTE_TICKER,
+                base_ticker=self.__target_coin,
+                quote_ticker=self.config.QUOTE_TICKER,
+            )])
+        else:
+            Config.NOTIFICATION_SERVICE.debug(
+                f"[{self.broker.brokerType}]\tGetting all tickers.."
+            )
+            all_tickers_recheck = self.broker.get_tickers(self.config.QUOTE_TICKER)
+            self.last_full_scan = now
 
         if (
                 all_tickers_recheck is not None
@@ -277,6 +572,25 @@ class Bot:
                         return []
         return new_tickers# + get_specific_ticker(all_tickers_recheck, "ANKRUSDT")
 
+    def on_stream_ticker(self, new_ticker: Ticker) -> NoReturn:
+        """
+        Called on the stream thread, the ticker is processed on the thread of this bot right after
+        the running iteration, if any
+        """
+        self.executor.submit(self.process_stream_ticker, new_ticker)
+
+    def process_stream_ticker(self, new_ticker: Ticker) -> NoReturn:
+        # as for polls, only inside the listing window, and only if a poll did not find it first
+        if not self.in_listing_window() or new_ticker.ticker in self.ticker_seen_dict:
+            return
+        self.ticker_seen_dict[new_ticker.ticker] = True
+        self.__new_tickers_detected_time = self.clock.now()
+        self.__should_send_detection_notification = True
+        try:
+            self.process_new_ticker(new_ticker)
+        except Exception:
+            Config.NOTIFICATION_SERVICE.error(traceback.format_exc())
+
     def update_trailing_stop_loss(self, order: Order, current_price: float) -> Order:
 
         # increase as absolute value for TP
@@ -296,7 +610,11 @@ class Bot:
 
     def close_trade(
             self, order: Order, current_price: float, stored_price: float
-    ) -> NoReturn:
+    ) -> bool:
+        """
+        Places the sell. A market sell is closed right away, a limit sell is handed to the fill watcher
+        and closed by do_the_selling once filled. Returns whether the trade is closed
+        """
         Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(
             "CLOSING Order:\n{}".format(order.json())
         )
@@ -307,6 +625,12 @@ class Bot:
             "Stored Price:\t{}".format(stored_price)
         )
 
+        # a limit sell is not retried past the end of its stage, a market sell until the broker gives up
+        deadline = None
+        if current_price != -1:
+            time_limit = self.config.LIMIT_SELL_SECONDS if order.exit_stage == 0 else self.config.MARKET_SELL_SECONDS
+            deadline = order.listing_time_ts + time_limit
+
         sell: Order = self.broker.place_order(
             self.config,
             ticker=order.ticker,
@@ -314,27 +638,19 @@ class Bot:
             size=float(order.size),
             current_price=current_price,
             buy_price=stored_price,
+            deadline=deadline,
         )
 
-        success = False
-        if current_price == -1:
-            success = True
-        else:
-            time_limit = self.config.LIMIT_SELL_SECONDS if self.__stage==0 else self.config.MARKET_SELL_SECONDS
-            time_now = time.time() - self.__listing_time_ts
-            while time_now < time_limit:
-                time_now = time.time() - self.__listing_time_ts
-                # check order filled
-                order_status = self.broker.check_order(sell)
-                if order_status["executedQty"] == order_status["origQty"]:
-                    success = True
-                    break
-                else:
-                    time.sleep(Config.SELL_RETRY_SECONDS)
-            if not success:
-                self.broker.cancel(sell)
-                return False
+        if current_price != -1:
+            order.exit_deadline = deadline
+            order.sell_order_id = sell.orderId
+            self.watch_sell(order.ticker.ticker, sell, current_price, stored_price, order.exit_deadline)
+            return False
 
+        self.record_sale(order, sell, current_price, stored_price)
+        return True
+
+    def record_sale(self, order: Order, sell: Order, current_price: float, stored_price: float) -> NoReturn:
         Config.NOTIFICATION_SERVICE.message('CLOSE', pretty_close, (sell,order))
         # pending remove order from json file
         self._pending_remove.append(order.ticker.ticker)
@@ -362,11 +678,11 @@ class Bot:
         Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("SOLD:\n{}".format(sold.json()))
 
         self.sold[order.ticker.ticker] = sold
+        self.journal.record_sold(order.ticker.ticker, sold)
         if not Config.TEST and Config.SHARE_DATA:
             Util.post_pipedream(sold)
 
         self.save()
-        return success
 
 
     def process_new_ticker(self, new_ticker: Ticker, **kwargs) -> NoReturn:
@@ -386,6 +702,10 @@ class Bot:
                 f"[{self.broker.brokerType}]\tPreparing to buy {new_ticker.ticker}"
             )
 
+            if hasattr(self.broker, "rules"):
+                # filters of the symbol ready by the time it is sold, fetched while the buy is in flight
+                self.broker.rules.prefetch(new_ticker.ticker)
+
             #price = self.broker.get_current_price(new_ticker)
             #size = self.broker.convert_size(
             #    config=self.config, ticker=new_ticker, price=price
@@ -401,13 +721,30 @@ class Bot:
                     f"[{self.broker.brokerType}]\tPlacing [{'TEST' if self.config.TEST else 'LIVE'}] Order with " + str((new_ticker, size, "BUY", kwargs))
                 )
 
-                order = self.broker.place_order(
-                    self.config, ticker=new_ticker, size=size, side="BUY", **kwargs
-                )
+                # a buy that takes longer than the first exit stage is too late
+                deadline = self.clock.now() + self.config.LIMIT_SELL_SECONDS
+                prepared = self.__prepared_buy
+                if prepared is not None and prepared.symbol == new_ticker.ticker and not kwargs:
+                    try:
+                        order = self.broker.fire_order(self.config, prepared, new_ticker)
+                    except OrderStatusUnknownException:
+                        # the buy may have gone through, sending it again could buy twice
+                        raise
+                    except Exception:
+                        Config.NOTIFICATION_SERVICE.error(traceback.format_exc())
+                        # the prepared buy was rejected or does not exist, place_order retries until the order
+                        # goes through
+                        order = self.broker.place_order(
+                            self.config, ticker=new_ticker, size=size, side="BUY", deadline=deadline,
+                            client_order_id=prepared.params["newClientOrderId"],
+                        )
+                else:
+                    order = self.broker.place_order(
+                        self.config, ticker=new_ticker, size=size, side="BUY", deadline=deadline, **kwargs
+                    )
 
-                self.__time_to_buy_seconds = time.time() - self.__new_tickers_detected_time
+                self.__time_to_buy_seconds = self.clock.now() - self.__new_tickers_detected_time
                 notif_msg = "TIME TO BUY %.4f seconds"%self.__time_to_buy_seconds
-                notif_msg = "TIME TO BUY %.4f seconds"%float(str(order.purchase_datetime).split(':')[-1])
                 if self.__should_send_detection_notification:
                     self.__should_send_detection_notification = False
                     notif_msg = f"[{self.broker.brokerType}]\tNew ticker detected: {new_ticker}\n\n" + notif_msg
@@ -417,7 +754,11 @@ class Bot:
                 Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(
                     "ORDER RESPONSE:\n{}".format(order.json())
                 )
+                # the exit timers run from the listing time, or from the purchase if it was not scraped
+                order.listing_time_ts = self.__listing_time_ts or self.clock.now()
                 self.orders[new_ticker.ticker] = order
+                self.journal.record_order(new_ticker.ticker, order)
+                self.schedule_exit(new_ticker.ticker, self.clock.now())
                 if not Config.TEST and Config.SHARE_DATA:
                     Util.post_pipedream(order)
 
@@ -438,5 +779,22 @@ class Bot:
             )
 
     def save(self) -> NoReturn:
-        Util.dump_json(self.orders_file, self.orders)
-        Util.dump_json(self.sold_file, self.sold)
+        """
+        Writes the changed files now instead of waiting for the write-behind, after fills
+        """
+        self.orders_store.flush()
+        self.sold_store.flush()
+
+    def close(self) -> NoReturn:
+        if self.stream is not None:
+            self.stream.close()
+        if hasattr(self.broker, "stop_user_stream"):
+            self.broker.stop_user_stream()
+        if getattr(self.broker, "hedge", None) is not None:
+            self.broker.hedge.close()
+        # lets a running iteration finish before the last flush
+        self.executor.shutdown()
+        self.fills.close()
+        self.orders_store.close()
+        self.sold_store.close()
+        self.journal.close()
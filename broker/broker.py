@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, NoReturn, List
+from typing import Dict, Any, NoReturn, List, Optional
 
 import binance.exceptions
 from ftx.api import FtxClient
@@ -10,17 +10,55 @@ from util.types import BrokerType, Ticker, Order
 from util.exceptions import *
 from util import Config, Util
 from dateutil.parser import parse
-from util.decorators import retry
+from util.clock import ExchangeClock
+from util.decorators import CircuitBreaker, RetryPolicy, is_retryable
+from broker.budget import RequestBudget
+from broker.connections import BOT_THREADS, ConnectionManager
+from broker.hedge import HedgedRequests
+from broker.prepared import PreparedOrder
+from broker.rules import SymbolRulesCache
+from broker.stream import ListingStream
+from broker.userdata import FINAL_STATUSES, UserDataStream
 import yaml
 import requests
 import logging
-import math
 import traceback
 import time
+import uuid
 
 
 logger = logging.getLogger(__name__)
 
+# Binance errors worth another attempt: disconnected, too many requests, unexpected response, timeout,
+# too many new orders, timestamp outside of the recvWindow
+BINANCE_RETRYABLE_CODES = {-1001, -1003, -1006, -1007, -1015, -1021}
+
+
+def binance_retryable(error: BaseException) -> bool:
+    if isinstance(error, binance.exceptions.BinanceAPIException) and error.code in BINANCE_RETRYABLE_CODES:
+        return True
+    return isinstance(error, binance.exceptions.BinanceRequestException) or is_retryable(error)
+
+
+def send_status_unknown(error: BaseException) -> bool:
+    # the order may have been placed: the response was lost, or the exchange does not know either
+    if isinstance(error, requests.exceptions.RequestException):
+        return True
+    return isinstance(error, binance.exceptions.BinanceAPIException) and (
+        error.code in (-1006, -1007) or error.status_code >= 500
+    )
+
+
+def not_trading_yet(error: BaseException) -> bool:
+    # right at the listing the symbol can be visible before it takes orders
+    return isinstance(error, binance.exceptions.BinanceAPIException) and (
+        error.code == -1121 or "Market is closed" in error.message
+    )
+
+
+def binance_buy_retryable(error: BaseException) -> bool:
+    return not_trading_yet(error) or binance_retryable(error)
+
 
 class Broker(ABC):
     def __init__(self) -> NoReturn:
@@ -28,6 +66,11 @@ class Broker(ABC):
 
     @staticmethod
     def factory(broker: BrokerType, subaccount: Union[str, None] = None) -> any:
+        if broker == "SIMULATED":
+            # no auth, the scenario is a setting of the broker
+            from broker.simulated import Scenario, SimulatedBroker
+            return SimulatedBroker(Scenario.load(Config(broker).SCENARIO))
+
         with open(Config.AUTH_DIR.joinpath("auth.yml")) as file:
             auth = yaml.load(file, Loader=yaml.FullLoader)
 
@@ -77,21 +120,12 @@ class FTX(FtxClient, Broker):
             api_secret=secret,
             subaccount_name=subaccount,
         )
+        # FTX has no ping, the head of the api is as cheap
+        self.connections = ConnectionManager(
+            self._session, lambda: self._session.head(self._base_url, timeout=10), pool_size=BOT_THREADS
+        )
 
-    @retry(
-        (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.HTTPError,
-            NoBrokerResponseException,
-            Exception,
-        ),
-        2,
-        0,
-        None,
-        1,
-        0,
-        logger,
-    )
+    @RetryPolicy("FTX markets", tries=2, timeout=10, breaker=CircuitBreaker("FTX markets"), logger=logger)
     def get_tickers(self, quote_ticker: str, **kwargs) -> List[Ticker]:
         try:
             api_resp = super(FTX, self).get_markets()
@@ -122,17 +156,7 @@ class FTX(FtxClient, Broker):
             else:
                 raise
 
-    @retry(
-        (
-                Exception,
-        ),
-        2,
-        3,
-        None,
-        1,
-        0,
-        logger,
-    )
+    @RetryPolicy("FTX price", tries=2, delay=3, timeout=10, breaker=CircuitBreaker("FTX price"), logger=logger)
     @FtxClient.authentication_required
     def get_current_price(self, ticker: Ticker):
         Config.NOTIFICATION_SERVICE.debug(
@@ -150,17 +174,10 @@ class FTX(FtxClient, Broker):
         except LookupError as e:
             pass
 
-    # @retry(
-    #     (
-    #             Exception,
-    #     ),
-    #     2,
-    #     3,
-    #     None,
-    #     1,
-    #     0,
-    #     logger,
-    # )
+    @RetryPolicy("FTX order", tries=2, delay=3, timeout=10, breaker=CircuitBreaker("FTX order"), logger=logger)
+    def send_order(self, **params) -> dict:
+        return super(FTX, self).place_order(**params)
+
     @FtxClient.authentication_required
     def place_order(self, config: Config, *args, **kwargs) -> Order:
         if Config.TEST:
@@ -185,9 +202,11 @@ class FTX(FtxClient, Broker):
             )
 
         else:
-            kwargs["market"] = kwargs["ticker"]
-            del kwargs["ticker"]
-            api_resp = super(FTX, self).place_order(*args, *kwargs)
+            # the same client id on every attempt, FTX rejects the resend of an order whose response was lost
+            api_resp = self.send_order(
+                market=kwargs["ticker"].ticker, side=kwargs["side"].lower(), price=None, size=kwargs["size"],
+                type="market", client_id=uuid.uuid4().hex, deadline=kwargs.get("deadline"),
+            )
             return Order(
                 broker="FTX",
                 ticker=kwargs["ticker"],
@@ -215,97 +234,228 @@ class FTX(FtxClient, Broker):
 
 
 class Binance(BinanceClient, Broker):
+    # request weights of the detection endpoints
+    EXCHANGE_INFO_WEIGHT = 20
+    PRICE_TICKER_WEIGHT = 2
+
     def __init__(self, subaccount: str, key: str, secret: str) -> NoReturn:
         self.brokerType = "BINANCE"
+        self.detection_stats = {
+            kind: {"requests": 0, "bytes": 0, "weight": 0} for kind in ["probe", "full"]
+        }
 
         super().__init__(api_key=key, api_secret=secret)
+        self.rules = SymbolRulesCache(self.fetch_symbol_info)
+        # detection calls raced over the API hosts
+        self.hedge = None
+        if Config.HEDGE_HOSTS > 1:
+            hosts = [f"https://{host}.binance.{self.tld}/api" for host in ("api", "api1", "api2", "api3")]
+            self.hedge = HedgedRequests(
+                self.session, hosts, fan_out=Config.HEDGE_HOSTS, percentile=Config.HEDGE_PERCENTILE or None
+            )
+        # a warm connection for every thread that can send at once, on every host the hedge uses
+        if self.hedge is None:
+            self.connections = ConnectionManager(self.session, self.warm_up, pool_size=BOT_THREADS)
+        else:
+            self.connections = ConnectionManager(
+                self.session, self.warm_up, pool_size=BOT_THREADS + self.hedge.workers, hosts=len(self.hedge.hosts)
+            )
+        # exchange time, for the listing window and the timestamps of signed requests
+        self.clock = ExchangeClock(self.server_time)
+        # request weight left, read from the headers of every response of the session
+        self.budget = RequestBudget(clock=self.clock.now)
+        # bounded retries on transient errors, an endpoint that keeps failing is not called for a while
+        self.retries = {
+            "exchange info": self.retry_policy("exchange info", tries=2, timeout=10),
+            "symbol info": self.retry_policy("symbol info", tries=3, timeout=10),
+            "price": self.retry_policy("price", tries=5, delay=0.3, timeout=10),
+            # the listing buy polls at a flat pace until the symbol trades, which is not an outage
+            "buy": self.retry_policy(
+                "buy", binance_buy_retryable, tries=-1, delay=0.1, backoff=1, jitter=0, timeout=30, threshold=10,
+                down=binance_retryable,
+            ),
+            "sell": self.retry_policy("sell", tries=-1, delay=0.1, max_delay=2, timeout=30, threshold=10),
+            "order status": self.retry_policy("order status", tries=2, timeout=5),
+            "cancel": self.retry_policy("cancel", tries=3, delay=0.2, timeout=5),
+            "order lookup": self.retry_policy("order lookup", tries=5, timeout=5),
+        }
+        self.session.hooks["response"].append(self.budget.observe)
+        # order and fill state pushed by the exchange, see start_user_stream
+        self.user_stream = None
+
+    def retry_policy(
+            self, name: str, retryable=binance_retryable, threshold: int = 5, **kwargs
+    ) -> RetryPolicy:
+        return RetryPolicy(
+            name, retryable, breaker=CircuitBreaker(name, threshold), clock=self.clock.now, logger=logger, **kwargs
+        )
+
+    def retry_report(self) -> str:
+        return "\n".join(policy.report() for policy in self.retries.values())
+
+    def server_time(self) -> float:
+        return self.get_server_time()["serverTime"] / 1000
+
+    def warm_up(self) -> NoReturn:
+        if self.hedge is None:
+            self.ping()
+            return
+        for host in self.hedge.hosts:
+            self.session.get(f"{host}/{self.PRIVATE_API_VERSION}/ping", timeout=self.hedge.timeout)
+
+    def detection_get(self, path: str, **params) -> dict:
+        """
+        GET of a public endpoint for detection, hedged over the API hosts when HEDGE_HOSTS > 1
+        """
+        if self.hedge is None:
+            return self._get(path, version=self.PRIVATE_API_VERSION, data=params)
+        self.response = self.hedge.get(f"{self.PRIVATE_API_VERSION}/{path}", params)
+        return self._handle_response(self.response)
+
+    @staticmethod
+    def new_client_order_id() -> str:
+        return "ncb" + uuid.uuid4().hex[:29]
+
+    def find_order(self, symbol: str, client_order_id: str) -> Optional[dict]:
+        """
+        The order placed with client_order_id as an order response, None if it was never placed
+        """
+        try:
+            status = super(Binance, self).get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except binance.exceptions.BinanceAPIException as e:
+            # Order does not exist
+            if e.code == -2013:
+                return None
+            raise
+        executed = float(status["executedQty"])
+        status["fills"] = [{
+            "price": str(float(status["cummulativeQuoteQty"]) / executed), "qty": status["executedQty"],
+            "commission": "0",
+        }] if executed else []
+        return status
+
+    def lookup_order(self, symbol: str, client_order_id: str) -> Optional[dict]:
+        """
+        find_order, retried, for an order whose send status is unknown. None only if the exchange answered that
+        it does not exist, otherwise raises OrderStatusUnknownException: the order must not be sent again
+        """
+        try:
+            return self.retries["order lookup"].run(self.find_order, symbol, client_order_id)
+        except Exception as e:
+            raise OrderStatusUnknownException(
+                f"{symbol} order {client_order_id} may have been placed, its lookup failed: {e!r}"
+            ) from e
+
+    def fetch_symbol_info(self, symbol: str) -> dict:
+        # exchange info of this symbol only, get_symbol_info downloads all of it
+        return self.retries["symbol info"].run(
+            self._get, "exchangeInfo", version=self.PRIVATE_API_VERSION, data={"symbol": symbol}
+        )["symbols"][0]
+
+    def count_detection_request(self, kind: str, weight: int) -> NoReturn:
+        stats = self.detection_stats[kind]
+        stats["requests"] += 1
+        stats["weight"] += weight
+        if self.response is not None:
+            stats["bytes"] += len(self.response.content)
+
+    def detection_report(self) -> str:
+        return "\n".join(
+            "[BINANCE] {} detection: {} requests, {:.0f} bytes/poll, {:.0f} weight/poll".format(
+                kind, stats["requests"], stats["bytes"] / max(stats["requests"], 1),
+                stats["weight"] / max(stats["requests"], 1),
+            )
+            for kind, stats in self.detection_stats.items()
+        )
+
+    def listing_stream(self, quote_ticker: str, is_known, on_new) -> ListingStream:
+        """
+        New symbols from the market streams, as soon as they trade
+        """
+        return ListingStream(f"wss://stream.binance.{self.tld}:9443/stream", quote_ticker, is_known, on_new)
+
+    def probe_tickers(self, tickers: List[Ticker]) -> List[Ticker]:
+        """
+        Returns the expected tickers that trade already, with a single symbol price request each
+        instead of downloading the exchange info. Not retried, the detection loop probes again right away
+        """
+        listed = []
+        for ticker in tickers:
+            try:
+                price = self.detection_get("ticker/price", symbol=ticker.ticker)
+            except binance.exceptions.BinanceAPIException as e:
+                # Invalid symbol: not listed yet
+                if e.code != -1121:
+                    raise
+                price = None
+            finally:
+                self.count_detection_request("probe", self.PRICE_TICKER_WEIGHT)
+            if price is not None and float(price["price"]) > 0:
+                listed.append(ticker)
+        return listed
 
-    @retry(
-        (
-                binance.exceptions.BinanceAPIException,
-                Exception,
-        ),
-        2,
-        3,
-        None,
-        1,
-        0,
-        logger,
-    )
     def get_current_price(self, ticker: Ticker) -> float:
         Config.NOTIFICATION_SERVICE.debug(
             "Getting latest price for [{}]".format(ticker)
         )
         time.sleep(0.2)
-        while True:
-            try:
-                retval = float(self.get_symbol_ticker(symbol=ticker.ticker)["price"])
-            except binance.exceptions.BinanceAPIException:
-                print("API get_current_price ERROR RETRY TOP KEK MY BROTHER")
-                print(traceback.format_exc())
-                time.sleep(0.3)
-                continue
-            break
-        return retval
+        return float(self.retries["price"].run(self.get_symbol_ticker, symbol=ticker.ticker)["price"])
 
 
-    def check_order(self, sell):
-        # check order filled
-        while True:
-            try:
-                return super(Binance, self).get_order(symbol=sell.ticker.ticker, orderId=sell.orderId)
-            except:
-                print(traceback.format_exc())
-                time.sleep(Config.SELL_RETRY_SECONDS)
-                continue
+    def start_user_stream(self, on_change=None) -> UserDataStream:
+        """
+        Tracks our orders on the user data stream, check_order then reads them without a request.
+        on_change is called whenever an order changes
+        """
+        self.user_stream = UserDataStream(self, f"wss://stream.binance.{self.tld}:9443/ws")
+        if on_change is not None:
+            self.user_stream.book.subscribe(on_change)
+        return self.user_stream.start()
+
+    def stop_user_stream(self) -> NoReturn:
+        if self.user_stream is not None:
+            self.user_stream.close()
+            self.user_stream = None
 
+    def track_order(self, api_resp: dict) -> NoReturn:
+        if self.user_stream is not None and "orderId" in api_resp:
+            self.user_stream.book.apply_status(api_resp)
+
+    def check_order(self, sell):
+        if self.user_stream is not None:
+            status = self.user_stream.book.status(sell.orderId)
+            # a disconnected stream may have missed the fill, a final status is final
+            if status is not None and (self.user_stream.connected.is_set() or status["status"] in FINAL_STATUSES):
+                return status
+        # the fill watcher polls again and handles errors
+        status = self.retries["order status"].run(
+            super(Binance, self).get_order, symbol=sell.ticker.ticker, orderId=sell.orderId
+        )
+        self.track_order(status)
+        return status
 
     def cancel(self, sell):
-        while True:
-            try:
-                return super(Binance, self).cancel_order(symbol=sell.ticker.ticker, orderId=sell.orderId)
-            except:
-                print(traceback.format_exc())
-                continue
-
-
-    # @retry(
-    #     (
-    #             binance.exceptions.BinanceAPIException,
-    #             Exception,
-    #     ),
-    #     2,
-    #     3,
-    #     None,
-    #     1,
-    #     0,
-    #     logger,
-    # )
+        api_resp = self.retries["cancel"].run(
+            super(Binance, self).cancel_order, symbol=sell.ticker.ticker, orderId=sell.orderId
+        )
+        self.track_order(api_resp)
+        return api_resp
+
+
     def place_order(self, config: Config, *args, **kwargs) -> Order:
+        """
+        Retries until the order goes through, or until the deadline keyword, an exchange timestamp
+        """
         kwargs["symbol"] = kwargs["ticker"].ticker
         kwargs["type"] = "market"
         kwargs["quantity"] = kwargs["size"]
         kwargs['side'] = kwargs['side'].upper()
-        all_filters = None
+        rules = None
         if kwargs['side'] == 'SELL':
             kwargs["type"] = "market" if kwargs["current_price"]==-1 else "limit"
-            all_filters = self.get_symbol_info(kwargs['symbol'])['filters']
-            Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(
-                "\n\nSTEP SIZE IS\n" + str(all_filters) + "\n\n"
-            )
-            LOT_SIZE_filter = {}
-            for f in all_filters:
-                if f["filterType"] == "LOT_SIZE":
-                    LOT_SIZE_filter = f
-                    break
-            step_size = float(LOT_SIZE_filter["stepSize"])
+            rules = self.rules.get(kwargs['symbol'])
             Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("QUANTITY BEFORE STEPSIZE " + str(kwargs['quantity']))
-            old_quantity = kwargs['quantity']
-            precision = int(round(-math.log(step_size, 10), 0))
-            new_quantity = round(old_quantity, precision)
-            while new_quantity > old_quantity:
-                new_quantity -= step_size
-            kwargs['quantity'] = float(round(new_quantity, precision))
+            kwargs['quantity'] = rules.round_quantity(kwargs['quantity'])
             Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("QUANTITY AFTER STEPSIZE " + str(kwargs['quantity']))
 
         kwargs['quoteOrderQty'] = kwargs['quantity']
@@ -313,111 +463,145 @@ class Binance(BinanceClient, Broker):
         if kwargs['side'] == 'SELL':
             for p in ["quantity", "side", "symbol", "type"]:
                 params[p] = kwargs[p]
+            # plain notation, str() of a Decimal can be exponential
+            params["quantity"] = format(params["quantity"], "f")
             if kwargs["type"] == "limit":
                 params["price"] = kwargs["buy_price"] + kwargs["current_price"]*kwargs["buy_price"]*config.LIMIT_SELL_PERCENT/100
                 params["timeInForce"] = "GTC"
-                for f in all_filters:
-                    if f["filterType"] == "PRICE_FILTER":
-                        PRICE_FILTER = f
-                        break
-                step_size = float(PRICE_FILTER["tickSize"])
-                Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("QUANTITY BEFORE STEPSIZE " + str(params["price"]))
-                old_price = params["price"]
-                precision = int(round(-math.log(step_size, 10), 0))
-                new_price = round(old_price, precision)
-                while new_price > old_price:
-                    new_price -= step_size
-                params["price"] = float(round(new_price, precision))
-                Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("QUANTITY AFTER STEPSIZE " + str(params["price"]))
+                Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("PRICE BEFORE TICKSIZE " + str(params["price"]))
+                params["price"] = format(rules.round_price(params["price"]), "f")
+                Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("PRICE AFTER TICKSIZE " + str(params["price"]))
+                # the exchange would reject it, the bot tries again and falls back to a market sell
+                if not rules.check_notional(params["price"], params["quantity"]):
+                    raise BelowMinNotionalException(
+                        f"{kwargs['symbol']} sell of {params['quantity']} at {params['price']} is below the minimum notional"
+                    )
         if kwargs['side'] == 'BUY':
             for p in ["quoteOrderQty", "side", "symbol", "type"]:
                 params[p] = kwargs[p]
+        # a retry after a lost response must not place the order twice, nor a resend of a prepared order
+        params["newClientOrderId"] = kwargs.get("client_order_id") or self.new_client_order_id()
 
         if Config.TEST:
             # does not return anything.  No error mean request was good.
             api_resp = super(Binance, self).create_test_order(**params)
-            price = self.get_current_price(kwargs["ticker"])
-
-            return Order(
-                broker="BINANCE",
-                ticker=kwargs["ticker"],
-                purchase_datetime=datetime.now(),
-                price=price,
-                side=kwargs["side"],
-                size=kwargs["size"],
-                type="market",
-                status="TEST_MODE",
-                take_profit=Util.percent_change(price, config.TAKE_PROFIT_PERCENT),
-                stop_loss=Util.percent_change(price, -config.STOP_LOSS_PERCENT),
-                trailing_stop_loss_max=float("-inf"),
-                trailing_stop_loss=Util.percent_change(
-                    price, -config.TRAILING_STOP_LOSS_PERCENT
-                ),
-            )
+            return self.test_order(config, kwargs["ticker"], kwargs["side"], kwargs["size"])
         else:
-            api_resp = {}
-            while True:
+            def send() -> dict:
                 try:
-                    api_resp = super(Binance, self).create_order(**params)
-                except binance.exceptions.BinanceAPIException:
+                    return super(Binance, self).create_order(**params)
+                except requests.exceptions.RequestException:
+                    print(traceback.format_exc())
+                    # the order may have been placed, only its response was lost
+                    api_resp = self.lookup_order(params["symbol"], params["newClientOrderId"])
+                    if api_resp is None:
+                        raise
+                    return api_resp
+                except binance.exceptions.BinanceAPIException as e:
                     print("API place_order ERROR RETRY TOP KEK MY BROTHER")
                     print(traceback.format_exc())
-                    if kwargs['side'] == 'SELL':
-                        time.sleep(config.SELL_RETRY_SECONDS)
-                    continue
-                break
-
-            fill_sum = 0
-            fill_count = 0
+                    # a resend of an order whose response was lost, or an order of unknown status
+                    if (e.code == -2010 and "Duplicate" in e.message) or send_status_unknown(e):
+                        api_resp = self.lookup_order(params["symbol"], params["newClientOrderId"])
+                        if api_resp is not None:
+                            return api_resp
+                    raise
+
+            policy = self.retries["buy" if kwargs["side"] == "BUY" else "sell"]
+            api_resp = policy.run(send, deadline=kwargs.get("deadline"))
+            self.track_order(api_resp)
+            return self.order_from_response(
+                config, kwargs["ticker"], api_resp, kwargs["type"], kwargs.get("buy_price"), float(kwargs["quantity"])
+            )
 
-            for fill in api_resp['fills']:
-                #fill_sum += (float(fill['price'])*float(fill['qty']) - float(fill['commission']))
-                fill_sum += float(fill['price'])*float(fill['qty'])
-                fill_count += float(fill['qty'])
+    def prepare_order(self, config: Config, ticker: Ticker) -> PreparedOrder:
+        """
+        Builds and pre-signs the market buy of place_order for a ticker that is not listed yet
+        """
+        params = {
+            "symbol": ticker.ticker, "side": "BUY", "type": "market", "quoteOrderQty": config.QUANTITY,
+            "newClientOrderId": self.new_client_order_id(),
+        }
+        return PreparedOrder(self, params, test=Config.TEST)
 
-            avg_fill_price = 0
-            if kwargs["type"] == "market":
-                avg_fill_price = fill_sum / fill_count
-            print(api_resp["executedQty"])
+    def fire_order(self, config: Config, prepared: PreparedOrder, ticker: Ticker) -> Order:
+        try:
+            api_resp = prepared.fire()
+        except Exception as e:
+            if not send_status_unknown(e):
+                raise
+            # looked up here, a client order id is only unique among open orders and a filled buy would be resent
+            api_resp = self.lookup_order(ticker.ticker, prepared.params["newClientOrderId"])
+            if api_resp is None:
+                raise
+        self.track_order(api_resp)
+        if Config.TEST:
+            return self.test_order(config, ticker, "BUY", float(config.QUANTITY))
+        return self.order_from_response(config, ticker, api_resp, "market")
+
+    def test_order(self, config: Config, ticker: Ticker, side: str, size: float) -> Order:
+        price = self.get_current_price(ticker)
+
+        return Order(
+            broker="BINANCE",
+            ticker=ticker,
+            purchase_datetime=datetime.now(),
+            price=price,
+            side=side,
+            size=size,
+            type="market",
+            status="TEST_MODE",
+            take_profit=Util.percent_change(price, config.TAKE_PROFIT_PERCENT),
+            stop_loss=Util.percent_change(price, -config.STOP_LOSS_PERCENT),
+            trailing_stop_loss_max=float("-inf"),
+            trailing_stop_loss=Util.percent_change(
+                price, -config.TRAILING_STOP_LOSS_PERCENT
+            ),
+        )
 
-            return Order(
-                broker="BINANCE",
-                ticker=kwargs["ticker"],
-                purchase_datetime=datetime.now(),
-                price=avg_fill_price if avg_fill_price!=0 else kwargs["buy_price"],
-                side=api_resp["side"],
-                size=float(api_resp["executedQty"])*0.995 if fill_count!=0 else params["quantity"],
-                type="market",
-                status="TEST_MODE" if Config.TEST else "LIVE",
-                take_profit=Util.percent_change(
-                    float(avg_fill_price), config.TAKE_PROFIT_PERCENT
-                ),
-                stop_loss=Util.percent_change(
-                    float(avg_fill_price), -config.STOP_LOSS_PERCENT
-                ),
-                trailing_stop_loss_max=float("-inf"),
-                trailing_stop_loss=Util.percent_change(
-                    float(avg_fill_price), -config.TRAILING_STOP_LOSS_PERCENT
-                ),
-                orderId=api_resp["orderId"],
-            )
+    def order_from_response(
+            self, config: Config, ticker: Ticker, api_resp: dict, order_type: str, buy_price: float = None,
+            quantity: float = None
+    ) -> Order:
+        fill_sum = 0
+        fill_count = 0
+
+        for fill in api_resp['fills']:
+            #fill_sum += (float(fill['price'])*float(fill['qty']) - float(fill['commission']))
+            fill_sum += float(fill['price'])*float(fill['qty'])
+            fill_count += float(fill['qty'])
+
+        avg_fill_price = 0
+        if order_type == "market":
+            avg_fill_price = fill_sum / fill_count
+        print(api_resp["executedQty"])
+
+        return Order(
+            broker="BINANCE",
+            ticker=ticker,
+            purchase_datetime=datetime.now(),
+            price=avg_fill_price if avg_fill_price!=0 else buy_price,
+            side=api_resp["side"],
+            size=float(api_resp["executedQty"])*0.995 if fill_count!=0 else quantity,
+            type="market",
+            status="TEST_MODE" if Config.TEST else "LIVE",
+            take_profit=Util.percent_change(
+                float(avg_fill_price), config.TAKE_PROFIT_PERCENT
+            ),
+            stop_loss=Util.percent_change(
+                float(avg_fill_price), -config.STOP_LOSS_PERCENT
+            ),
+            trailing_stop_loss_max=float("-inf"),
+            trailing_stop_loss=Util.percent_change(
+                float(avg_fill_price), -config.TRAILING_STOP_LOSS_PERCENT
+            ),
+            orderId=api_resp["orderId"],
+        )
 
-    @retry(
-        (
-            requests.exceptions.ConnectionError,
-            requests.exceptions.HTTPError,
-            NoBrokerResponseException,
-            Exception,
-        ),
-        2,
-        0,
-        None,
-        1,
-        0,
-        logger,
-    )
     def get_tickers(self, quote_ticker: str, **kwargs) -> List[Ticker]:
-        api_resp = super(Binance, self).get_exchange_info()
+        api_resp = self.retries["exchange info"].run(self.detection_get, "exchangeInfo")
+        self.count_detection_request("full", self.EXCHANGE_INFO_WEIGHT)
+        self.budget.update_limits(api_resp.get("rateLimits", []))
 
         test_retry = kwargs.get('test_retry', False)
         if test_retry:
@@ -438,18 +622,5 @@ class Binance(BinanceClient, Broker):
 
     def convert_size(self, config: Config, ticker: Ticker, price: float) -> float:
 
-        info = super(Binance, self).get_symbol_info(symbol=ticker.ticker)
-        step_size = info["filters"][2]["stepSize"]
-        lot_size = step_size.index("1") - 1
-        lot_size = max(lot_size, 0)
-
         # calculate the volume in coin from QUANTITY in USDT (default)
-        size = config.QUANTITY / price
-
-        # if lot size has 0 decimal points, make the volume an integer
-        if lot_size == 0:
-            size = int(size)
-        else:
-            size = float("{:.{}f}".format(size, lot_size))
-
-        return size
+        return float(self.rules.get(ticker.ticker).round_quantity(config.QUANTITY / price))
@@ -0,0 +1,121 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, List, NoReturn, Optional
+
+import requests
+
+
+class RequestBudget:
+    """
+    Request weight of the current Binance minute, as reported by the X-MBX-USED-WEIGHT-1M header of every
+    response, and what the detection polls may still spend of it. Polls are spread over the rest of the minute so
+    that it never runs out, and never eat into the reserve kept for orders and cancels, which are never held back.
+    After a 429 or a 418 nothing is polled until Retry-After is over.
+    """
+
+    # weights of the endpoints used, for the ones whose response carries no header
+    COSTS = {
+        "exchangeInfo": 20, "ticker/price": 2, "order": 1, "ping": 1, "time": 1, "userDataStream": 2,
+    }
+
+    def __init__(
+            self, limit: int = 1200, reserve: int = 50, window_seconds: float = 60,
+            clock: Callable[[], float] = time.time
+    ) -> NoReturn:
+        self.limit = limit
+        self.reserve = reserve
+        self.window_seconds = window_seconds
+        # the minutes are the ones of the exchange
+        self.clock = clock
+
+        self.used = 0
+        self.orders_10s = 0
+        self.blocked_until = 0
+        # metrics
+        self.peak = 0
+        self.rate_limited = 0
+        self.throttled = 0
+
+        self._window = self._window_of(clock())
+        self._lock = threading.Lock()
+
+    def observe(self, response: requests.Response, *args, **kwargs) -> NoReturn:
+        """
+        requests response hook
+        """
+        now = self.clock()
+        used = response.headers.get("X-MBX-USED-WEIGHT-1M", response.headers.get("X-MBX-USED-WEIGHT"))
+        with self._lock:
+            self._roll(now)
+            if used is not None:
+                # responses of concurrent requests arrive in any order, the weight of a window only grows
+                self.used = max(self.used, int(used))
+            else:
+                self.used += self.cost(response.url)
+            self.peak = max(self.peak, self.used)
+            orders = response.headers.get("X-MBX-ORDER-COUNT-10S")
+            if orders is not None:
+                self.orders_10s = int(orders)
+            if response.status_code in (418, 429):
+                self.rate_limited += 1
+                retry_after = float(response.headers.get("Retry-After", self.window_seconds))
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def update_limits(self, rate_limits: List[Dict]) -> NoReturn:
+        """
+        Takes the weight limit from the rateLimits of the exchange info
+        """
+        for limit in rate_limits:
+            if limit["rateLimitType"] == "REQUEST_WEIGHT" and limit["interval"] == "MINUTE":
+                self.limit = limit["limit"] // limit.get("intervalNum", 1)
+
+    def remaining(self, now: float = None) -> int:
+        """
+        Weight the polls may still spend in this window
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            self._roll(now)
+            return self.limit - self.reserve - self.used
+
+    def can_afford(self, cost: int, now: float = None) -> bool:
+        now = self.clock() if now is None else now
+        if now < self.blocked_until or self.remaining(now) < cost:
+            self.throttled += 1
+            return False
+        return True
+
+    def poll_interval(self, cost: float, now: float = None) -> float:
+        """
+        Shortest interval between polls of cost that the remaining weight sustains until the window ends
+        """
+        now = self.clock() if now is None else now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        seconds_left = (self._window_of(now) + 1) * self.window_seconds - now
+        remaining = self.remaining(now)
+        if remaining < cost:
+            return seconds_left
+        return cost * seconds_left / remaining
+
+    def cost(self, url: Optional[str]) -> int:
+        path = (url or "").split("?")[0]
+        for endpoint, cost in self.COSTS.items():
+            if path.endswith(endpoint):
+                return cost
+        return 1
+
+    def report(self) -> str:
+        return "weight {}/{} (peak {}, {} reserved), {} polls throttled, {} rate limited".format(
+            self.used, self.limit, self.peak, self.reserve, self.throttled, self.rate_limited
+        )
+
+    def _window_of(self, now: float) -> int:
+        return math.floor(now / self.window_seconds)
+
+    def _roll(self, now: float) -> NoReturn:
+        window = self._window_of(now)
+        if window != self._window:
+            self._window = window
+            self.used = 0
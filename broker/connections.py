@@ -0,0 +1,75 @@
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, NoReturn
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from util import Config
+
+# threads of a bot that use the session of its broker at once besides the detection hedge:
+# the loop, the bot executor, the fill watcher and the symbol rules refresh
+BOT_THREADS = 4
+
+
+class ConnectionManager:
+    """
+    Sizes the connection pools of a broker session and opens its connections ahead of the listing window,
+    so that no request of the window pays for DNS, TCP and TLS. warm() runs the cheap warm_up call
+    concurrently, every concurrent call opens a connection that the pool keeps alive afterwards.
+    """
+
+    def __init__(
+            self, session: requests.Session, warm_up: Callable[[], Any], pool_size: int = BOT_THREADS, hosts: int = 1
+    ) -> NoReturn:
+        self.session = session
+        self.warm_up = warm_up
+        self.pool_size = pool_size
+        # a pool of pool_size connections per host
+        self.adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+        session.mount("https://", self.adapter)
+        session.mount("http://", self.adapter)
+        self.last_warm_up = 0
+
+    def warm(self, connections: int = None) -> bool:
+        """
+        Opens up to connections connections, pool_size by default. Returns False if a warm-up call failed
+        """
+        connections = connections or self.pool_size
+        with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="warm-up") as executor:
+            ok = all(executor.map(lambda _: self._call(), range(connections)))
+        self.last_warm_up = time.time()
+        return ok
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Requests and connections opened per host since the start. Every connection is a handshake,
+        every other request reused one
+        """
+        pools = self.adapter.poolmanager.pools
+        stats = {}
+        for key in pools.keys():
+            pool = pools[key]
+            stats[pool.host] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": pool.num_requests - pool.num_connections,
+            }
+        return stats
+
+    def report(self) -> str:
+        return ", ".join(
+            "{}: {} requests on {} connections ({} reused)".format(
+                host, s["requests"], s["connections"], s["reused"]
+            )
+            for host, s in self.stats().items()
+        ) or "no connections"
+
+    def _call(self) -> bool:
+        try:
+            self.warm_up()
+            return True
+        except Exception:
+            Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(traceback.format_exc())
+            return False
@@ -0,0 +1,113 @@
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from typing import Callable, Dict, NoReturn, Optional, Tuple
+
+from util import Config
+from util.types import Order
+
+
+def is_filled(order_status: dict) -> bool:
+    return order_status["executedQty"] == order_status["origQty"]
+
+
+class FillWatcher:
+    """
+    Waits for sell orders to fill on a background thread instead of the bot loop.
+    watch() returns a future that resolves to True once the order is filled, or to False at the deadline,
+    after the order was cancelled. The bot keeps running meanwhile and escalates when it resolves to False.
+    Orders are checked every poll_seconds, or right away on wake(), when the broker is told an order changed.
+    """
+
+    def __init__(self, broker, poll_seconds: float, clock: Callable[[], float] = time.time) -> NoReturn:
+        self.broker = broker
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self._pending: Dict[str, Tuple[Order, float, Future]] = {}
+        self._lock = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._woken = False
+
+    def watch(self, order: Order, deadline: float) -> Future:
+        """
+        Resolves to True when the order is filled, to False if it is not by the deadline, a timestamp of clock
+        """
+        future = Future()
+        with self._lock:
+            self._pending[order.orderId] = (order, deadline, future)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"fills-{self.broker.brokerType}", daemon=True
+                )
+                self._thread.start()
+            self._lock.notify()
+        return future
+
+    def wake(self) -> NoReturn:
+        """
+        Checks the pending orders now instead of at the next poll
+        """
+        with self._lock:
+            self._woken = True
+            self._lock.notify()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def close(self) -> NoReturn:
+        with self._lock:
+            self._closed = True
+            self._lock.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> NoReturn:
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._lock.wait()
+                if self._closed:
+                    return
+                pending = list(self._pending.values())
+
+            for order, deadline, future in pending:
+                filled = self._check(order)
+                if filled is None and self.clock() >= deadline:
+                    filled = self._cancel(order)
+                if filled is not None:
+                    with self._lock:
+                        self._pending.pop(order.orderId, None)
+                    future.set_result(filled)
+
+            with self._lock:
+                self._lock.wait_for(lambda: self._woken or self._closed, self.poll_seconds)
+                self._woken = False
+
+    def _check(self, order: Order) -> Optional[bool]:
+        """
+        True if filled, None if not yet or if the status could not be read
+        """
+        try:
+            return True if is_filled(self.broker.check_order(order)) else None
+        except Exception:
+            Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(traceback.format_exc())
+            return None
+
+    def _cancel(self, order: Order) -> Optional[bool]:
+        """
+        Cancels an order past its deadline. An order that filled meanwhile cannot be cancelled,
+        its status decides. None if neither worked, it is retried on the next poll
+        """
+        try:
+            self.broker.cancel(order)
+            return False
+        except Exception:
+            Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(traceback.format_exc())
+        try:
+            return is_filled(self.broker.check_order(order)) or None
+        except Exception:
+            return None
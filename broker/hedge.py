@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NoReturn, Optional
+
+import requests
+
+from util.metrics import LatencyStats
+
+
+class HedgedRequests:
+    """
+    Sends an idempotent GET to several API hosts and returns the first valid answer, so that one slow edge node
+    does not stall detection. Hosts are ranked by their recent latency and failures, the fan_out best ones are
+    used: all at once, or, with a percentile, the next one only once the previous one has not answered within
+    that percentile of its latency. Slower answers are dropped but still steer the ranking.
+    Only for requests that may be sent twice, orders are never hedged.
+    """
+
+    # hedge delay of a host with fewer latency samples than MIN_SAMPLES
+    DEFAULT_DELAY = 0.05
+    MIN_SAMPLES = 10
+    # the percentile is stretched by this much, so that the usual jitter of a host is not hedged
+    HEDGE_MARGIN = 1.5
+
+    def __init__(
+            self, session: requests.Session, hosts: List[str], fan_out: int = 2, percentile: Optional[float] = None,
+            timeout: float = 10
+    ) -> NoReturn:
+        self.session = session
+        self.hosts = hosts
+        self.fan_out = fan_out
+        self.percentile = percentile
+        self.timeout = timeout
+
+        self.latency: Dict[str, LatencyStats] = {host: LatencyStats(host, max_samples=1000) for host in hosts}
+        # consecutive failures, a host that fails drops in the ranking until it answers again
+        self.failures: Dict[str, int] = {host: 0 for host in hosts}
+        self.wins: Dict[str, int] = {host: 0 for host in hosts}
+        self.hedges = 0
+
+        self._lock = threading.Lock()
+        # requests in flight at most, also the connections the session needs for them
+        self.workers = 4 * len(hosts)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hedge")
+
+    def ranked(self) -> List[str]:
+        with self._lock:
+            # hosts without samples first, so that every host gets measured
+            return sorted(self.hosts, key=lambda h: (self.failures[h], self.latency[h].percentile(50) or 0))
+
+    def get(self, path: str, params: Dict = None) -> requests.Response:
+        """
+        Returns the first valid response, or the last invalid one. Raises the last error if no host answered
+        """
+        hosts = self.ranked()[:self.fan_out]
+        results = queue.Queue()
+        launched = 0
+        answered = 0
+        last = None
+
+        def launch():
+            nonlocal launched
+            self._executor.submit(self._send, hosts[launched], path, params, results)
+            launched += 1
+
+        launch()
+        if self.percentile is None:
+            while launched < len(hosts):
+                launch()
+
+        while answered < launched:
+            wait = None
+            if self.percentile is not None and launched < len(hosts):
+                wait = self.hedge_delay(hosts[launched - 1])
+            try:
+                host, response, error = results.get(timeout=wait)
+            except queue.Empty:
+                self.hedges += 1
+                launch()
+                continue
+            answered += 1
+            if response is not None and self.valid(response):
+                with self._lock:
+                    self.wins[host] += 1
+                return response
+            last = error if error is not None else response
+            if answered == launched < len(hosts):
+                # every host asked so far failed, no point in waiting for the hedge delay
+                launch()
+
+        if isinstance(last, Exception):
+            raise last
+        return last
+
+    def hedge_delay(self, host: str) -> float:
+        with self._lock:
+            latency = self.latency[host]
+            if len(latency.samples) < self.MIN_SAMPLES:
+                return self.DEFAULT_DELAY
+            return latency.percentile(self.percentile) * self.HEDGE_MARGIN
+
+    @staticmethod
+    def valid(response: requests.Response) -> bool:
+        # a 4xx is an answer, "Invalid symbol" is what the probes expect until the listing,
+        # but not a rate limit, nor an overloaded or failing node
+        return response.status_code < 500 and response.status_code not in (418, 429)
+
+    def report(self) -> str:
+        return "\n".join(
+            "{}: {} wins, {} consecutive failures".format(self.latency[host], self.wins[host], self.failures[host])
+            for host in self.ranked()
+        ) + "\n{} hedges".format(self.hedges)
+
+    def close(self) -> NoReturn:
+        self._executor.shutdown(wait=False)
+
+    def _send(self, host: str, path: str, params: Optional[Dict], results: queue.Queue) -> NoReturn:
+        start = time.perf_counter()
+        try:
+            response = self.session.get(f"{host}/{path}", params=params, timeout=self.timeout)
+        except Exception as e:
+            with self._lock:
+                self.failures[host] += 1
+            results.put((host, None, e))
+            return
+        with self._lock:
+            self.latency[host].add(time.perf_counter() - start)
+            self.failures[host] = 0 if self.valid(response) else self.failures[host] + 1
+        results.put((host, response, None))
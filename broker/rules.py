@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from decimal import Decimal, ROUND_DOWN
+from typing import Callable, Dict, NoReturn, Tuple
+
+
+class SymbolRules:
+    """
+    Trading rules of a symbol as exact Decimals, from its exchange info filters in any order.
+    Rounding is a single quantize, down to a multiple of the tick or step size.
+    """
+
+    def __init__(
+            self, symbol: str, tick_size: Decimal, step_size: Decimal, min_qty: Decimal = Decimal(0),
+            min_notional: Decimal = Decimal(0)
+    ) -> NoReturn:
+        self.symbol = symbol
+        self.tick_size = tick_size
+        self.step_size = step_size
+        self.min_qty = min_qty
+        self.min_notional = min_notional
+
+    @classmethod
+    def from_symbol_info(cls, info: dict) -> "SymbolRules":
+        filters = {f["filterType"]: f for f in info["filters"]}
+        notional = filters.get("MIN_NOTIONAL", filters.get("NOTIONAL", {}))
+        return cls(
+            symbol=info["symbol"],
+            tick_size=Decimal(filters["PRICE_FILTER"]["tickSize"]).normalize(),
+            step_size=Decimal(filters["LOT_SIZE"]["stepSize"]).normalize(),
+            min_qty=Decimal(filters["LOT_SIZE"].get("minQty", "0")),
+            min_notional=Decimal(notional.get("minNotional", "0")),
+        )
+
+    @staticmethod
+    def _floor(value, size: Decimal) -> Decimal:
+        if not size:
+            return Decimal(str(value))
+        return (Decimal(str(value)) / size).quantize(Decimal(1), rounding=ROUND_DOWN) * size
+
+    def round_price(self, price) -> Decimal:
+        return self._floor(price, self.tick_size)
+
+    def round_quantity(self, quantity) -> Decimal:
+        return self._floor(quantity, self.step_size)
+
+    def check_notional(self, price, quantity) -> bool:
+        """
+        Whether an order of quantity at price passes the minimum quantity and notional filters
+        """
+        quantity = Decimal(str(quantity))
+        return quantity >= self.min_qty and Decimal(str(price)) * quantity >= self.min_notional
+
+
+class SymbolRulesCache:
+    """
+    SymbolRules by symbol. A symbol is fetched once, when first needed or prefetched,
+    entries older than refresh_seconds are served while they are refreshed in the background.
+    """
+
+    def __init__(self, fetch: Callable[[str], dict], refresh_seconds: float = 3600) -> NoReturn:
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        self._rules: Dict[str, Tuple[SymbolRules, float]] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="symbol-rules")
+
+    def get(self, symbol: str) -> SymbolRules:
+        entry = self._rules.get(symbol)
+        if entry is None:
+            with self._lock:
+                loading = self._loading.get(symbol)
+            # waits for a prefetch already on its way instead of a second request
+            return loading.result() if loading is not None else self._load(symbol)
+        rules, loaded = entry
+        if time.time() - loaded > self.refresh_seconds:
+            self.prefetch(symbol)
+        return rules
+
+    def prefetch(self, symbol: str) -> NoReturn:
+        """
+        Loads or refreshes a symbol in the background
+        """
+        with self._lock:
+            if symbol not in self._loading:
+                self._loading[symbol] = self._executor.submit(self._load, symbol)
+
+    def put(self, info: dict) -> SymbolRules:
+        rules = SymbolRules.from_symbol_info(info)
+        self._rules[rules.symbol] = (rules, time.time())
+        return rules
+
+    def _load(self, symbol: str) -> SymbolRules:
+        try:
+            return self.put(self.fetch(symbol))
+        finally:
+            with self._lock:
+                self._loading.pop(symbol, None)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._rules
@@ -0,0 +1,307 @@
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NoReturn, Optional, Tuple, Union
+
+import requests
+import yaml
+from binance.exceptions import BinanceAPIException
+from pydantic import BaseModel
+
+from broker.broker import Broker, binance_buy_retryable, binance_retryable
+from util import Config, Util
+from util.clock import ExchangeClock
+from util.decorators import CircuitBreaker, RetryPolicy
+from util.types import Order, Ticker
+
+
+class SimulatedListing(BaseModel):
+    base_ticker: str
+    quote_ticker: str = "USDT"
+    # seconds after the start of the simulation the symbol starts trading
+    at: float = 0
+    # (seconds after the listing, price), linear in between
+    prices: List[Tuple[float, float]] = [(0, 1.0)]
+
+
+class Scenario(BaseModel):
+    """
+    Script of a simulated exchange, times are seconds after the broker was created
+    """
+
+    seed: int = 0
+    # symbols trading from the start, at a price of 1
+    existing: List[str] = ["BTC", "ETH"]
+    quote_ticker: str = "USDT"
+    listings: List[SimulatedListing] = []
+    # seconds every request takes, plus up to jitter seconds
+    latency: float = 0
+    jitter: float = 0
+    # share of the requests that fail with a connection error
+    error_rate: float = 0
+    # (from, until) with every request failing
+    outages: List[Tuple[float, float]] = []
+    # requests answered per rate_limit_seconds before a 429, 0 for no limit
+    rate_limit: int = 0
+    rate_limit_seconds: float = 1
+    # when limit sells fill: once the price reaches them, right away or never
+    fills: str = "price"
+    # seconds the exchange clock is ahead of the local one
+    clock_offset: float = 0
+
+    @classmethod
+    def load(cls, scenario: Union[None, str, dict]) -> "Scenario":
+        """
+        From the SCENARIO broker setting, inline or the path of a yml file relative to the root dir
+        """
+        if scenario is None:
+            return cls()
+        if isinstance(scenario, str):
+            with open(Config.ROOT_DIR.joinpath(scenario)) as file:
+                scenario = yaml.load(file, Loader=yaml.FullLoader)
+        return cls.parse_obj(scenario)
+
+
+class SimulatedApiError(BinanceAPIException):
+    """
+    Error answer of the simulated exchange, the one Binance answers with, so that it is retried the same way
+    """
+
+    def __init__(self, status_code: int, code: int, message: str):
+        super().__init__(None, status_code, json.dumps({"code": code, "msg": message}))
+
+
+class VirtualTime:
+    """
+    Time of a simulation that only passes when slept, so that a seeded run does not depend on the load of the host
+    """
+
+    def __init__(self, start: float = 0) -> NoReturn:
+        self.current = start
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self.current
+
+    def sleep(self, seconds: float) -> NoReturn:
+        with self._lock:
+            self.current += max(seconds, 0)
+
+
+class SimulatedBroker(Broker):
+    """
+    Exchange that plays a Scenario in memory: symbols appear at their time and follow their price path,
+    every request takes the scripted latency and fails or gets rate limited as scripted, with a seeded random.
+    Market orders fill at the current price, limit sells as the scenario says. Nothing leaves the machine.
+    Runs on the local clock, or with the time and sleep of a VirtualTime to reproduce a run from its seed.
+    """
+
+    def __init__(
+            self, scenario: Scenario, now: Callable[[], float] = time.time, sleep: Callable[[float], Any] = time.sleep
+    ) -> NoReturn:
+        self.brokerType = "SIMULATED"
+        self.scenario = scenario
+        self.now = now
+        self.sleep = sleep
+        self.random = random.Random(scenario.seed)
+        self.start = self.exchange_time()
+        self.orders: Dict[str, dict] = {}
+        self._order_ids = itertools.count(1)
+        # metrics
+        self.requests = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+        self._window = 0
+        self._window_requests = 0
+        self._lock = threading.Lock()
+
+        self.clock = ExchangeClock(self.server_time, wall=now, monotonic=now)
+        # the policies of the Binance broker, with shorter pauses
+        self.retries = {
+            "tickers": self.retry_policy("tickers", tries=2, timeout=10),
+            "price": self.retry_policy("price", tries=5, timeout=10),
+            "buy": self.retry_policy(
+                "buy", binance_buy_retryable, tries=-1, backoff=1, jitter=0, timeout=30, threshold=10,
+                down=binance_retryable,
+            ),
+            "sell": self.retry_policy("sell", tries=-1, timeout=30, threshold=10),
+            "order status": self.retry_policy("order status", tries=2, timeout=5),
+            "cancel": self.retry_policy("cancel", tries=3, timeout=5),
+        }
+
+    def retry_policy(
+            self, name: str, retryable=binance_retryable, threshold: int = 5, **kwargs
+    ) -> RetryPolicy:
+        return RetryPolicy(
+            name, retryable, delay=0.01, breaker=CircuitBreaker(name, threshold, clock=self.now),
+            clock=self.clock.now, sleep=self.sleep, **kwargs
+        )
+
+    def exchange_time(self) -> float:
+        return self.now() + self.scenario.clock_offset
+
+    def elapsed(self) -> float:
+        return self.exchange_time() - self.start
+
+    def server_time(self) -> float:
+        self.request("time")
+        return round(self.exchange_time(), 3)
+
+    def request(self, endpoint: str) -> NoReturn:
+        """
+        One request to the exchange: waits for its latency and raises the scripted errors
+        """
+        with self._lock:
+            self.requests += 1
+            delay = self.scenario.latency + self.scenario.jitter * self.random.random()
+            fails = self.random.random() < self.scenario.error_rate
+        if delay > 0:
+            self.sleep(delay)
+        elapsed = self.elapsed()
+        if fails or any(start <= elapsed < end for start, end in self.scenario.outages):
+            with self._lock:
+                self.failed += 1
+            raise requests.exceptions.ConnectionError(f"simulated {endpoint} failure")
+        if self.scenario.rate_limit:
+            with self._lock:
+                window = int(elapsed // self.scenario.rate_limit_seconds)
+                if window != self._window:
+                    self._window, self._window_requests = window, 0
+                self._window_requests += 1
+                limited = self._window_requests > self.scenario.rate_limit
+                self.rate_limited += limited
+            if limited:
+                raise SimulatedApiError(429, -1003, "Too many requests.")
+
+    def listed(self, elapsed: float = None) -> List[Ticker]:
+        elapsed = self.elapsed() if elapsed is None else elapsed
+        tickers = [
+            Ticker(ticker=base + self.scenario.quote_ticker, base_ticker=base, quote_ticker=self.scenario.quote_ticker)
+            for base in self.scenario.existing
+        ]
+        for listing in self.scenario.listings:
+            if listing.at <= elapsed:
+                tickers.append(Ticker(
+                    ticker=listing.base_ticker + listing.quote_ticker, base_ticker=listing.base_ticker,
+                    quote_ticker=listing.quote_ticker,
+                ))
+        return tickers
+
+    def price(self, symbol: str, elapsed: float = None) -> float:
+        elapsed = self.elapsed() if elapsed is None else elapsed
+        for listing in self.scenario.listings:
+            if listing.base_ticker + listing.quote_ticker == symbol and listing.at <= elapsed:
+                return interpolate(listing.prices, elapsed - listing.at)
+        if symbol in (base + self.scenario.quote_ticker for base in self.scenario.existing):
+            return 1.0
+        raise SimulatedApiError(400, -1121, "Invalid symbol.")
+
+    def get_tickers(self, quote_ticker: str, **kwargs) -> List[Ticker]:
+        def tickers() -> List[Ticker]:
+            self.request("exchangeInfo")
+            return [t for t in self.listed() if t.quote_ticker == quote_ticker]
+        return self.retries["tickers"].run(tickers)
+
+    def probe_tickers(self, tickers: List[Ticker]) -> List[Ticker]:
+        listed = []
+        for ticker in tickers:
+            self.request("ticker/price")
+            try:
+                self.price(ticker.ticker)
+            except SimulatedApiError:
+                continue
+            listed.append(ticker)
+        return listed
+
+    def get_current_price(self, ticker: Ticker) -> float:
+        def price() -> float:
+            self.request("ticker/price")
+            return self.price(ticker.ticker)
+        return self.retries["price"].run(price)
+
+    def place_order(self, config: Config, *args, **kwargs) -> Order:
+        policy = self.retries["buy" if kwargs["side"].upper() == "BUY" else "sell"]
+        return policy.run(self._place_order, config, deadline=kwargs.pop("deadline", None), **kwargs)
+
+    def check_order(self, sell: Order) -> dict:
+        def status() -> dict:
+            self.request("order")
+            order = self.orders[sell.orderId]
+            self._fill_limit(order)
+            return dict(order)
+        return self.retries["order status"].run(status)
+
+    def cancel(self, sell: Order) -> dict:
+        def cancel() -> dict:
+            self.request("order")
+            order = self.orders[sell.orderId]
+            self._fill_limit(order)
+            if order["status"] != "NEW":
+                raise SimulatedApiError(400, -2011, "Unknown order sent.")
+            order["status"] = "CANCELED"
+            return dict(order)
+        return self.retries["cancel"].run(cancel)
+
+    def convert_size(self, config: Config, ticker: Ticker, price: float) -> float:
+        return config.QUANTITY / price
+
+    def report(self) -> str:
+        return "simulated: {} requests, {} failed, {} rate limited, {} orders".format(
+            self.requests, self.failed, self.rate_limited, len(self.orders)
+        )
+
+    def retry_report(self) -> str:
+        return "\n".join(policy.report() for policy in self.retries.values())
+
+    def _place_order(
+            self, config: Config, ticker: Ticker, side: str, size: float, current_price: Optional[float] = None,
+            buy_price: Optional[float] = None, **kwargs
+    ) -> Order:
+        self.request("order")
+        price = self.price(ticker.ticker)
+        side = side.upper()
+        # unique across the threads placing orders at once
+        order_id = str(next(self._order_ids))
+        order = {"orderId": order_id, "symbol": ticker.ticker, "side": side, "status": "FILLED"}
+        if side == "BUY":
+            # size is the quote quantity, as the quoteOrderQty of Binance
+            order_type, quantity = "market", size / price
+        elif current_price in (None, -1):
+            order_type, quantity = "market", size
+        else:
+            order_type, quantity = "limit", size
+            price = buy_price + current_price * buy_price * config.LIMIT_SELL_PERCENT / 100
+            order["status"] = "NEW"
+        order.update(type=order_type, price=price, origQty=str(quantity),
+                     executedQty=str(quantity) if order["status"] == "FILLED" else "0")
+        self.orders[order_id] = order
+        self._fill_limit(order)
+
+        return Order(
+            broker=self.brokerType, ticker=ticker, purchase_datetime=datetime.now(), price=price, side=side,
+            size=quantity, type=order_type, status="LIVE", orderId=order_id,
+            take_profit=Util.percent_change(price, config.TAKE_PROFIT_PERCENT),
+            stop_loss=Util.percent_change(price, -config.STOP_LOSS_PERCENT),
+            trailing_stop_loss_max=float("-inf"),
+            trailing_stop_loss=Util.percent_change(price, -config.TRAILING_STOP_LOSS_PERCENT),
+        )
+
+    def _fill_limit(self, order: dict) -> NoReturn:
+        if order["status"] != "NEW" or self.scenario.fills == "never":
+            return
+        if self.scenario.fills == "always" or self.price(order["symbol"]) >= order["price"]:
+            order["status"] = "FILLED"
+            order["executedQty"] = order["origQty"]
+
+
+def interpolate(path: List[Tuple[float, float]], t: float) -> float:
+    if t <= path[0][0]:
+        return path[0][1]
+    for (t0, p0), (t1, p1) in zip(path, path[1:]):
+        if t <= t1:
+            return p0 + (p1 - p0) * (t - t0) / (t1 - t0)
+    return path[-1][1]
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, NoReturn, Optional, Set
+
+import websockets
+
+from util import Config
+from util.metrics import LatencyStats
+from util.types import Ticker
+
+
+class WebSocketStream:
+    """
+    A websocket on a background thread with its own event loop, reconnected with a growing delay
+    whenever the connection drops. Subclasses build the url and handle the messages.
+    """
+
+    name = "stream"
+
+    def __init__(self, reconnect_seconds: float = 0.1, max_reconnect_seconds: float = 5) -> NoReturn:
+        self.reconnect_seconds = reconnect_seconds
+        self.max_reconnect_seconds = max_reconnect_seconds
+
+        self.connected = threading.Event()
+        self.frames = 0
+        self.reconnects = 0
+
+        self._ws = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "WebSocketStream":
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name=self.name, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def close(self) -> NoReturn:
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stream_url(self) -> str:
+        """
+        Url of the next connection, called off the event loop so it may block
+        """
+        raise NotImplementedError
+
+    async def on_open(self, ws) -> NoReturn:
+        """
+        Called once connected, before connected is set and before the first message
+        """
+
+    def on_close(self) -> NoReturn:
+        pass
+
+    def on_message(self, message: str) -> NoReturn:
+        raise NotImplementedError
+
+    def _run(self, started: threading.Event) -> NoReturn:
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self._listen())
+        started.set()
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    async def _listen(self) -> NoReturn:
+        delay = self.reconnect_seconds
+        while True:
+            try:
+                url = await asyncio.get_running_loop().run_in_executor(None, self.stream_url)
+                async with websockets.connect(url) as ws:
+                    self._ws = ws
+                    await self.on_open(ws)
+                    self.connected.set()
+                    delay = self.reconnect_seconds
+                    async for message in ws:
+                        self.frames += 1
+                        self.on_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(traceback.format_exc())
+            finally:
+                self._ws = None
+                self.connected.clear()
+                self.on_close()
+            # also after a clean close, binance drops every connection after 24h
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_seconds)
+
+
+class ListingStream(WebSocketStream):
+    """
+    Detects new symbols on the Binance market streams instead of REST polls.
+    The all-market mini ticker array carries every symbol that traded in the last second, the trade stream of a
+    watched symbol carries its first trade as it happens. A symbol that is_known() does not know is handed to
+    on_new() the moment its first frame arrives, once.
+    """
+
+    name = "listing-stream"
+    MINI_TICKERS = "!miniTicker@arr"
+
+    def __init__(
+            self, url: str, quote_ticker: str, is_known: Callable[[str], bool], on_new: Callable[[Ticker], None],
+            **kwargs
+    ) -> NoReturn:
+        super().__init__(**kwargs)
+        self.url = url
+        self.quote_ticker = quote_ticker
+        self.is_known = is_known
+        self.on_new = on_new
+
+        self.streams: List[str] = [self.MINI_TICKERS]
+        # exchange event time to receipt of the frame that revealed a new symbol
+        self.latency = LatencyStats("stream detection")
+
+        self._reported: Set[str] = set()
+        self._requests = 0
+
+    def watch(self, symbol: str) -> NoReturn:
+        """
+        Adds the trade stream of a symbol that is not listed yet, its first trade reports it
+        """
+        stream = f"{symbol.lower()}@trade"
+        if stream in self.streams:
+            return
+        self.streams.append(stream)
+        if self._loop is not None and self.connected.is_set():
+            asyncio.run_coroutine_threadsafe(self._subscribe([stream]), self._loop)
+
+    def stream_url(self) -> str:
+        return f"{self.url}?streams={'/'.join(self.streams)}"
+
+    async def _subscribe(self, streams: List[str]) -> NoReturn:
+        if self._ws is None:
+            # the next connection subscribes with its url
+            return
+        self._requests += 1
+        await self._ws.send(json.dumps({"method": "SUBSCRIBE", "params": streams, "id": self._requests}))
+
+    def on_message(self, message: str) -> NoReturn:
+        received = time.time()
+        data = json.loads(message).get("data")
+        # answers to SUBSCRIBE carry no data
+        if data is None:
+            return
+        for event in data if isinstance(data, list) else [data]:
+            self._check(event, received)
+
+    def _check(self, event: Dict, received: float) -> NoReturn:
+        symbol = event.get("s")
+        if (
+                symbol is None
+                or not symbol.endswith(self.quote_ticker)
+                or symbol in self._reported
+                or self.is_known(symbol)
+        ):
+            return
+        self._reported.add(symbol)
+        if "E" in event:
+            self.latency.add(max(0.0, received - event["E"] / 1000))
+        try:
+            self.on_new(Ticker(
+                ticker=symbol, base_ticker=symbol[:-len(self.quote_ticker)], quote_ticker=self.quote_ticker
+            ))
+        except Exception:
+            Config.NOTIFICATION_SERVICE.error(traceback.format_exc())
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import traceback
+from typing import Callable, Dict, List, NoReturn, Optional
+
+from broker.stream import WebSocketStream
+from util import Config
+
+FINAL_STATUSES = {"FILLED", "CANCELED", "REJECTED", "EXPIRED"}
+
+
+class OrderBook:
+    """
+    Our own orders by orderId, in the format of get_order, as of the latest execution report or REST status.
+    An older status never overwrites a newer one, whichever arrives last.
+    """
+
+    def __init__(self) -> NoReturn:
+        self._orders: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[], None]] = []
+
+    def subscribe(self, listener: Callable[[], None]) -> NoReturn:
+        """
+        listener is called, without arguments, whenever an order changes
+        """
+        self._listeners.append(listener)
+
+    def apply_report(self, event: dict) -> NoReturn:
+        """
+        Applies an executionReport of the user data stream
+        """
+        self.apply_status({
+            "symbol": event["s"],
+            "orderId": event["i"],
+            "clientOrderId": event["c"],
+            "side": event["S"],
+            "type": event["o"],
+            "status": event["X"],
+            "origQty": event["q"],
+            "executedQty": event["z"],
+            "cummulativeQuoteQty": event["Z"],
+            "updateTime": event["T"],
+        })
+
+    def apply_status(self, status: dict) -> NoReturn:
+        """
+        Applies a get_order status or a create_order response
+        """
+        key = str(status["orderId"])
+        with self._lock:
+            current = self._orders.get(key)
+            if current is not None and self._rank(current) > self._rank(status):
+                return
+            self._orders[key] = dict(current or {}, **status)
+        for listener in self._listeners:
+            listener()
+
+    def status(self, order_id) -> Optional[dict]:
+        with self._lock:
+            status = self._orders.get(str(order_id))
+            return dict(status) if status is not None else None
+
+    def open_orders(self) -> List[dict]:
+        with self._lock:
+            return [dict(s) for s in self._orders.values() if s["status"] not in FINAL_STATUSES]
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    @staticmethod
+    def _rank(status: dict):
+        return (
+            status.get("status") in FINAL_STATUSES,
+            float(status.get("executedQty", 0)),
+            status.get("updateTime", status.get("transactTime", 0)),
+        )
+
+
+class UserDataStream(WebSocketStream):
+    """
+    Keeps an OrderBook of our orders current from the executionReport events of the Binance user data stream,
+    so that fills are known without polling get_order. The listen key is kept alive while connected and a new
+    one is requested on every connection. After a reconnect the orders still open are read once over REST,
+    in case an event was missed meanwhile.
+    """
+
+    name = "user-data-stream"
+    KEEPALIVE_SECONDS = 30 * 60
+
+    def __init__(self, client, url: str, **kwargs) -> NoReturn:
+        super().__init__(**kwargs)
+        self.client = client
+        self.url = url
+        self.book = OrderBook()
+        self.listen_key: Optional[str] = None
+        self.events = 0
+        self.resyncs = 0
+        self._keepalive: Optional[asyncio.Task] = None
+
+    def stream_url(self) -> str:
+        self.listen_key = self.client.stream_get_listen_key()
+        return f"{self.url}/{self.listen_key}"
+
+    async def on_open(self, ws) -> NoReturn:
+        await asyncio.get_running_loop().run_in_executor(None, self.resync)
+        self._keepalive = asyncio.ensure_future(self._keep_alive(self.listen_key))
+
+    def on_close(self) -> NoReturn:
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+
+    def resync(self) -> NoReturn:
+        """
+        Reads the open orders of the book over REST, the only REST calls of the stream
+        """
+        for status in self.book.open_orders():
+            try:
+                self.book.apply_status(self.client.get_order(symbol=status["symbol"], orderId=status["orderId"]))
+                self.resyncs += 1
+            except Exception:
+                Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(traceback.format_exc())
+
+    def on_message(self, message: str) -> NoReturn:
+        event = json.loads(message)
+        kind = event.get("e")
+        if kind == "executionReport":
+            self.events += 1
+            self.book.apply_report(event)
+        elif kind == "listenKeyExpired" and self._ws is not None:
+            # reconnects with a new key
+            asyncio.ensure_future(self._ws.close())
+
+    async def _keep_alive(self, listen_key: str) -> NoReturn:
+        while True:
+            await asyncio.sleep(self.KEEPALIVE_SECONDS)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.client.stream_keepalive, listen_key)
+            except Exception:
+                Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error(traceback.format_exc())
@@ -1,8 +1,11 @@
 import asyncio
-from typing import List
+from typing import Dict, List
 import time
 from util import Config, Util
+from util.metrics import LatencyStats
+from util.scheduler import Scheduler
 from bot import Bot
+import scraper
 import traceback
 from pathlib import Path
 
@@ -23,36 +26,70 @@ def setup() -> List[Bot]:
 
     if len(b) > 0:
         b[0].upgrade_update()
+
+    for bot in b:
+        schedulers[bot.broker.brokerType] = Scheduler(clock=bot.clock.now)
+    # scraping runs on its own thread, the bots only read its latest result
+    # in exchange time like the bots, a listing that started on the exchange is in the past
+    # a new listing re-plans the sleeps right away
+    scraper.start_worker(
+        Config.PROGRAM_OPTIONS["LOG_INFO_UPDATE_INTERVAL"] * 60, clock=b[0].clock.now if b else time.time,
+        listeners=[scheduler.wake for scheduler in schedulers.values()],
+    )
     return b
 
 
+# every bot runs its own loop, a slow broker never delays the others
+schedulers: Dict[str, Scheduler] = {}
+loop_time: Dict[str, LatencyStats] = {}
+# how much later than planned a loop wakes up, i.e. how long something blocked it
+loop_lag: Dict[str, LatencyStats] = {}
+
+
 async def forever(routines: List):
+    await asyncio.gather(*(forever_bot(b) for b in routines))
+
+
+async def forever_bot(bot: Bot):
+    broker = bot.broker.brokerType
+    scheduler = schedulers.setdefault(broker, Scheduler(clock=bot.clock.now))
+    loop_time[broker] = LatencyStats(f"[{broker}] loop time")
+    loop_lag[broker] = LatencyStats(f"[{broker}] loop lag")
+    last_report = time.time()
     while True:
         t = time.time()
-        await main(routines)
+        await bot.run_async()
+        loop_time[broker].add(time.time() - t)
         #Config.NOTIFICATION_SERVICE.debug(
         #    "Loop finished in [{}] seconds".format(time.time() - t)
         #)
+
+        # sleep until the bot needs to run: tight polling only inside a listing window
+        target, precise = bot.next_wakeup()
         #Config.NOTIFICATION_SERVICE.debug(
-        #    "Sleeping for [{}] seconds".format(Config.FREQUENCY_SECONDS)
+        #    "Sleeping for [{}] seconds".format(target - time.time())
         #)
-        await asyncio.sleep(Config.FREQUENCY_SECONDS)
+        if await scheduler.sleep_until(target, precise):
+            loop_lag[broker].add(max(0.0, bot.clock.now() - target))
+            if precise:
+                Config.NOTIFICATION_SERVICE.debug(
+                    "[{}] Woke up {:.3f}ms after the listing window/T-0 instant".format(
+                        broker, scheduler.jitter.samples[-1] * 1000)
+                )
 
+        if time.time() - last_report > Config.PROGRAM_OPTIONS["LOG_INFO_UPDATE_INTERVAL"] * 60:
+            last_report = time.time()
+            Config.NOTIFICATION_SERVICE.debug("{}\n{}\n{}".format(loop_time[broker], loop_lag[broker], scheduler.jitter))
 
-async def main(bots_: List):
-    coroutines = [b.run_async() for b in bots_]
 
-    # This returns the results one by one.
-    for future in asyncio.as_completed(coroutines):
-        await future
+async def main(bots_: List):
+    """
+    Runs every bot once, concurrently: the blocking broker calls of each bot run on its own thread
+    """
+    await asyncio.gather(*(b.run_async() for b in bots_))
 
 
 if __name__ == "__main__":
-    import json
-    json.dump({}, open("BINANCE_orders.json", 'w'))
-    json.dump({}, open("BINANCE_sold.json", 'w'))
-    json.dump({}, open("new_listing.json", 'w'))
-
     Config.NOTIFICATION_SERVICE.info("Starting..")
     loop = asyncio.get_event_loop()
     bots = setup()
@@ -65,4 +102,4 @@ if __name__ == "__main__":
         Config.NOTIFICATION_SERVICE.error(traceback.format_exc())
     finally:
         for bot in bots:
-            bot.save()
+            bot.close()
@@ -1,14 +1,17 @@
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from chromedriver_py import binary_path
-import os.path, json
+import json
+from pathlib import Path
 import smtplib, ssl
 import yaml
 import time
+import re
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Thread, Event, Lock
 
+from announcement import classify_title, parse_listing_times
 from util import Config
+from util.cache import LRUCache
+from util.listings import ListingCalendar, listing_timestamp
 import json
 import traceback
 
@@ -33,8 +36,103 @@ def load_config(file):
         return yaml.load(file, Loader=yaml.FullLoader)
 
 
+class ScraperResources:
+    """
+    The scraper's config, HTTP session, thread pool and browser. Each is created on first use and
+    reused across scrapes; the browser is health-checked and restarted after a crash.
+    """
+
+    def __init__(self, config_file='config.yml'):
+        self.config_file = config_file
+        self.driver_restarts = 0
+        self._config = None
+        self._session = None
+        self._executor = None
+        self._driver = None
+        self._lock = Lock()
+
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = load_config(self.config_file)
+            article_cache.max_size = self.options.get('CACHE_SIZE', 64)
+        return self._config
+
+    @property
+    def options(self):
+        # 'MODE': 'SELENIUM' drives a headless Chrome, 'HTTP' reads the JSON embedded in the pages
+        return self.config.setdefault('SCRAPER_OPTIONS', {}) or {}
+
+    @property
+    def mode(self):
+        return self.options.get('MODE', 'SELENIUM').upper()
+
+    @property
+    def timeout(self):
+        return self.options.get('TIMEOUT_SECONDS', 5)
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                self._session.headers.update({"User-Agent": "Mozilla/5.0 (X11; Linux x86_64)", "Accept-Language": "en"})
+            return self._session
+
+    @property
+    def executor(self):
+        # articles of one scrape are fetched in parallel (HTTP mode)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.options.get('WORKERS', 6), thread_name_prefix="scraper")
+            return self._executor
+
+    @property
+    def driver(self):
+        with self._lock:
+            if self._driver is None:
+                self._driver = start_driver()
+            return self._driver
+
+    def check_driver(self):
+        """
+        Restarts the browser if it doesn't answer anymore
+        """
+        if self._driver is None:
+            return self.driver
+        try:
+            self._driver.current_url
+        except Exception as e:
+            Config.NOTIFICATION_SERVICE.error("Scraper browser crashed, restarting: {}".format(e))
+            self.close_driver()
+            self.driver_restarts += 1
+        return self.driver
+
+    def close_driver(self):
+        with self._lock:
+            driver, self._driver = self._driver, None
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception as e:
+                pass
+
+    def close(self):
+        self.close_driver()
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
 
-config = load_config('config.yml')
+ANNOUNCEMENT_URL = "https://www.binance.com/en/support/announcement/c-48"
+ARTICLE_URL = "https://www.binance.com/en/support/announcement/{code}"
+# number of announcements checked per scrape (link-0-0-p1 .. link-0-5-p1)
+ANNOUNCEMENT_SLOTS = 6
+APP_DATA_RE = re.compile(r'<script[^>]*type="application/json"[^>]*>(.*?)</script>', re.S)
 
 
 def send_notification_telegram(listing):
@@ -47,8 +145,8 @@ def send_notification_telegram(listing):
 def send_notification(coin):
     port = 465  # For SSL
     smtp_server = "smtp.gmail.com"
-    sent_from = config['EMAIL_ADDRESS']
-    to = [config['EMAIL_ADDRESS']]
+    sent_from = resources.config['EMAIL_ADDRESS']
+    to = [resources.config['EMAIL_ADDRESS']]
     subject = f'Binance will list {coin}, deposit some funds to be able to short it when listed'
     body = f'Read more at https://www.binance.com/en/support/announcement/c-48 or do a Google search https://www.google.com/search?q={coin}+token&oq={coin}+token&aqs=chrome.0.0i131i433i512l2j0i512l6j0i131i433i512j0i20i263i512.1732j0j4&sourceid=chrome&ie=UTF-8'
     message = 'Subject: {}\n\n{}'.format(subject, body)
@@ -56,71 +154,240 @@ def send_notification(coin):
     try:
         context = ssl.create_default_context()
         with smtplib.SMTP_SSL(smtp_server, port, context=context) as server:
-            server.login(sent_from, config['EMAIL_PASSWORD'])
+            server.login(sent_from, resources.config['EMAIL_PASSWORD'])
             server.sendmail(sent_from, to, message)
 
     except Exception as e:
         print(e)
 
 
+def start_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from chromedriver_py import binary_path
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    return webdriver.Chrome(executable_path=binary_path, options=chrome_options)
+
+
+# parsed [(coin, list_time)] by article code (HTTP) or title (Selenium), empty for irrelevant announcements
+article_cache = LRUCache(64)
+# seconds an announcement naming a symbol but no listing time stays cached, its body may be filled in later
+EMPTY_RESULT_SECONDS = 600
+# ETag response headers, sent back as If-None-Match for conditional requests
+page_etags = {}
+# list page announcements of the last scrape and how often the list page was not modified
+last_announcements = []
+list_page_stats = {"fetched": 0, "not_modified": 0}
+
+# every upcoming listing, the bots arm themselves for the next one
+calendar = ListingCalendar(Path('new_listing.json'))
 
+resources = ScraperResources()
 
-chrome_options = Options()
-chrome_options.add_argument("--headless")
-driver = webdriver.Chrome(executable_path=binary_path, options=chrome_options)
 
-def get_listing_time(link_id):
+def get_listing_time(link_id, symbols):
+    from selenium.webdriver.common.by import By
+
     #return "2021-11-18 14:08" # hardcode
+    driver = resources.driver
     el = driver.find_element(By.ID, link_id)
     el.click()
-    x = str(driver.page_source)#.replace("2021-10-11 06:00", "2021-10-19 14:03")
-    will_list_i = x.find("will list")
-    if will_list_i == -1:
-        will_list_i = x.find("will then list")
-    if will_list_i == -1:
-        return None
-    x = x[will_list_i:]
-    utc_i = x.find(" (UTC)")
-    if utc_i == -1:
-        return None
-    x = x[:utc_i]
-    listing_time = x[-19:].replace(" AM", "").replace(" PM", "").replace("at ", "")
-    print("DEBUG PARSING LISTING TIME:", listing_time)
-    try:
-        time.mktime(time.strptime(listing_time, "%Y-%m-%d %H:%M"))
-    except:
-        return None
-    return listing_time
+    return parse_listing_times(str(driver.page_source), symbols)#.replace("2021-10-11 06:00", "2021-10-19 14:03")
+
 
 def get_last_coin(link_id):
     """
-    Scrapes new listings page for and returns new Symbol when appropriate
+    Scrapes new listings page for and returns [(Symbol, list_time)] when appropriate
     """
-    driver.get("https://www.binance.com/en/support/announcement/c-48")
+    from selenium.webdriver.common.by import By
+
+    driver = resources.driver
+    driver.get(ANNOUNCEMENT_URL)
     latest_announcement = driver.find_element(By.ID, link_id)
     latest_announcement = latest_announcement.text+"."
     print(latest_announcement)
 
-    # Binance makes several annoucements, irrevelant ones will be ignored
-    #exclusions = ['Futures', 'Margin', 'adds', 'Subscription']
-    exclusions = ['Futures', 'Margin', 'adds']
-    for item in exclusions:
-        if item.lower() in latest_announcement.lower():
-            return None, None
-    if ('(' not in latest_announcement) or (')' not in latest_announcement):
-        return None, None
-    list_time = get_listing_time(link_id)
-    if list_time is None:
-        return None, None
-    #enum = [item for item in enumerate(latest_announcement)]
-    #uppers = ''.join(item[1] for item in enum if item[1].isupper() and (enum[enum.index(item)+1][1].isupper() or enum[enum.index(item)+1][1]==')') )
+    cached = get_cached_listings(latest_announcement)
+    if cached is not None:
+        return cached
+
+    symbols = classify_title(latest_announcement)
+    listings = get_listing_time(link_id, symbols) if symbols else []
+    #return [("ANKR", list_time)] # hardcode
+
+    cache_listings(latest_announcement, symbols, listings)
+    return listings
+
+
+def get_cached_listings(key):
+    """
+    Returns the cached listings of an announcement, None if not cached or if its empty result expired
+    """
+    cached = article_cache.get(key)
+    if cached is None:
+        return None
+    listings, expires = cached
+    if expires is not None and time.time() >= expires:
+        return None
+    return listings
+
+
+def cache_listings(key, symbols, listings):
+    expires = time.time() + EMPTY_RESULT_SECONDS if symbols and not listings else None
+    article_cache.put(key, (listings, expires))
+
+
+def fetch_page(url, conditional=False):
+    """
+    Returns the page html. If conditional, returns None when the server answers the page didn't change
+    """
+    headers = {}
+    if conditional and url in page_etags:
+        headers["If-None-Match"] = page_etags[url]
+    resp = resources.session.get(url, headers=headers, timeout=resources.timeout)
+    if resp.status_code == 304:
+        return None
+    resp.raise_for_status()
+    if resp.headers.get("ETag"):
+        page_etags[url] = resp.headers["ETag"]
+    return resp.text
 
-    op = latest_announcement.find('(')
-    cp = latest_announcement.find(')')
-    uppers = latest_announcement[op+1:cp]
-    #return "ANKR", list_time # hardcode
 
-    return uppers, list_time
+def parse_app_data(html):
+    """
+    Returns the application/json blob the announcement pages are rendered from
+    """
+    match = APP_DATA_RE.search(html)
+    if match is None:
+        return None
+    return json.loads(match.group(1))
+
+
+def parse_announcements(html):
+    """
+    Returns the announcements of the list page, newest first, as dicts with at least 'code' and 'title'
+    """
+    app_data = parse_app_data(html)
+    if app_data is None:
+        return []
+    stack = [app_data.get('routeProps', app_data)]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            articles = node.get('articles')
+            if isinstance(articles, list) and articles and isinstance(articles[0], dict) and 'code' in articles[0]:
+                return articles
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return []
+
+
+def parse_article_text(html):
+    """
+    Returns the plain text of an announcement article page
+    """
+    app_data = parse_app_data(html)
+    detail = None
+    stack = [app_data.get('routeProps', {})] if app_data is not None else []
+    while stack and detail is None:
+        node = stack.pop()
+        if isinstance(node, dict):
+            detail = node.get('articleDetail')
+            stack.extend(node.values())
+    if detail is None or not detail.get('body'):
+        return html
+
+    texts = [detail.get('title') or '']
+    nodes = [json.loads(detail['body'])]
+    while nodes:
+        node = nodes.pop()
+        if node.get('node') == 'text':
+            texts.append(node.get('text', ''))
+        nodes.extend(reversed(node.get('child', [])))
+    return " ".join(texts).replace("&nbsp;", " ")
+
+
+def get_article_candidates(article):
+    """
+    Returns [(coin, list_time)] for one announcement of the list page, empty if it is not a listing.
+    Results are cached by article code, so an announcement is only fetched and parsed once, or again after
+    EMPTY_RESULT_SECONDS if it named a symbol without a listing time.
+    """
+    cached = get_cached_listings(article['code'])
+    if cached is not None:
+        return cached
+
+    symbols = classify_title(article['title'])
+    listings = []
+    if symbols:
+        listings = parse_listing_times(parse_article_text(fetch_page(ARTICLE_URL.format(code=article['code']))), symbols)
+    cache_listings(article['code'], symbols, listings)
+    return listings
+
+
+def get_announcements():
+    """
+    Returns the newest announcements of the list page, reusing the last ones if the page wasn't modified
+    """
+    global last_announcements
+    html = fetch_page(ANNOUNCEMENT_URL, conditional=True)
+    if html is None:
+        list_page_stats["not_modified"] += 1
+        return last_announcements
+    list_page_stats["fetched"] += 1
+    last_announcements = parse_announcements(html)[:ANNOUNCEMENT_SLOTS]
+    return last_announcements
+
+
+def cache_stats():
+    return {"articles": article_cache.stats(), "list_page": dict(list_page_stats)}
+
+
+def get_candidates_http():
+    """
+    Same as the Selenium slots, but over plain HTTP: one request for the list, then the relevant
+    articles concurrently. A slot that fails or doesn't answer within TIMEOUT_SECONDS is skipped.
+    """
+    announcements = get_announcements()
+    futures = [resources.executor.submit(get_article_candidates, article) for article in announcements]
+    done, not_done = wait(futures, timeout=resources.timeout)
+
+    candidates = []
+    for article, future in zip(announcements, futures):
+        if future in not_done:
+            future.cancel()
+            print("SCRAPE TIMEOUT", article['title'])
+            continue
+        try:
+            candidates.extend(future.result())
+        except Exception as e:
+            print("SCRAPE ERROR")
+            print(traceback.format_exc())
+    return candidates
+
+
+def get_candidates_selenium():
+    resources.check_driver()
+    candidates = []
+    for i in range(ANNOUNCEMENT_SLOTS): #from 0 to 2
+        try:
+            candidates.extend(get_last_coin('link-0-%d-p1'%i))
+        except Exception as e:
+            print("SCRAPE ERROR")
+            print(traceback.format_exc())
+    return candidates
+
+
+def get_candidates():
+    """
+    Returns the (coin, list_time) of every relevant announcement, using SCRAPER_OPTIONS.MODE
+    """
+    if resources.mode == 'HTTP':
+        return get_candidates_http()
+    return get_candidates_selenium()
 
 
 def store_new_listing(listing):
@@ -128,41 +395,113 @@ def store_new_listing(listing):
     Only store a new listing if different from existing value
     """
     coin, list_time = listing
-    if os.path.isfile('new_listing.json'):
-        file = load_order('new_listing.json')
-        if coin in file:
-            print("No new listings detected...")
-            return False
-        else:
-            file = store_order('new_listing.json', listing)
-            send_notification_telegram(listing)
-            return True
-    else:
-        send_notification_telegram(listing)
-        return True
-
-
-def search_and_update():
+    if not calendar.add(coin, list_time):
+        print("No new listings detected...")
+        return False
+    send_notification_telegram(listing)
+    return True
+
+
+def pick_next_listing(candidates, now):
+    """
+    Returns the earliest (coin, list_time) still after now, or (None, None)
+    """
     max_time = "2030-12-12 11:11"
     latest_coin, list_time = None, max_time
-    this_coin, list_time_ = None, max_time
-    for i in range(6): #from 0 to 2
+    for this_coin, list_time_ in candidates:
         try:
-            this_coin, list_time_ = get_last_coin('link-0-%d-p1'%i)
-            list_time__ts = time.mktime(time.strptime(list_time_, "%Y-%m-%d %H:%M"))
+            list_time__ts = listing_timestamp(list_time_)
         except Exception as e:
             print("SCRAPE ERROR")
             print(traceback.format_exc())
             continue
-        Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("DETECTED [%s] at [%s] (UTC)"%(this_coin, list_time_))
-        if (time.time() < list_time__ts < time.mktime(time.strptime(list_time, "%Y-%m-%d %H:%M"))) and (this_coin is not None):
+        if (now < list_time__ts < listing_timestamp(list_time)) and (this_coin is not None):
             list_time = list_time_
             latest_coin = this_coin
-        else:
-            Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("But it's None or in the past.")
-    if latest_coin is not None:
-        if not store_new_listing((latest_coin, list_time)):
-            return None, None
-    else:
+    if latest_coin is None:
         return None, None
     return latest_coin, list_time
+
+
+def search_and_update(clock=time.time):
+    """
+    Adds every listing after clock() to the calendar, returns the earliest newly announced one or (None, None)
+    """
+    now = clock()
+    new_listings = []
+    for this_coin, list_time_ in get_candidates():
+        Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("DETECTED [%s] at [%s] (UTC)"%(this_coin, list_time_))
+        if listing_timestamp(list_time_) <= now:
+            Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("But it's in the past.")
+            continue
+        if store_new_listing((this_coin, list_time_)):
+            new_listings.append((this_coin, list_time_))
+    Config.NOTIFICATION_SERVICE.debug("Scraper cache: {}".format(cache_stats()))
+    return pick_next_listing(new_listings, now)
+
+
+class ScrapeWorker:
+    """
+    Runs search_and_update on a background thread every interval seconds, the listings go to the calendar.
+    Readers only look at the calendar and never wait for a scrape, subscribers are told about new listings.
+    """
+
+    def __init__(self, interval, scrape=search_and_update):
+        self.interval = interval
+        self.scrape = scrape
+        self.scrapes = 0
+        self._listeners = []
+        self._wake = Event()
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name="scrape-worker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def request_scrape(self):
+        self._wake.set()
+
+    def subscribe(self, callback):
+        """
+        callback() is called from the worker thread whenever a new listing was found
+        """
+        self._listeners.append(callback)
+
+    def _run(self):
+        while not self._stop.is_set():
+            Config.NOTIFICATION_SERVICE.get_service('VERBOSE_FILE').error("Scraping...")
+            try:
+                coin, list_time = self.scrape()
+            except Exception as e:
+                Config.NOTIFICATION_SERVICE.error(traceback.format_exc())
+                coin, list_time = None, None
+            self.scrapes += 1
+            if coin is not None:
+                for callback in self._listeners:
+                    callback()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+worker = None
+
+
+def start_worker(interval, clock=time.time, listeners=()):
+    """
+    Starts the scrape worker shared by every bot, if not running yet. Listings before clock() are skipped.
+    The listeners are subscribed before the first scrape, so that a listing it finds wakes them
+    """
+    global worker
+    new = worker is None
+    if new:
+        worker = ScrapeWorker(interval, scrape=lambda: search_and_update(clock))
+    for callback in listeners:
+        worker.subscribe(callback)
+    if new:
+        worker.start()
+    return worker
@@ -0,0 +1,57 @@
+import json
+from unittest import TestCase
+
+import scraper
+from announcement import classify_title, classify_titles, parse_listing_times, parse_announcement
+from util import Config
+
+PAGES_DIR = Config.TEST_DIR.joinpath("pages")
+
+
+class TestAnnouncement(TestCase):
+    def test_classify_title(self):
+        self.assertEqual(classify_title("Binance Will List SuperRare (RARE)"), ["RARE"])
+        self.assertEqual(classify_title("Binance Will List Gitcoin (GTC) and Keep3rV1 (KP3R)"), ["GTC", "KP3R"])
+        self.assertEqual(classify_title("Binance Will List 1inch (1INCH) (Updated)"), ["1INCH"])
+        self.assertEqual(classify_title("Binance Adds AVAX/AUD, AVAX/BRL & TROY/BUSD Trading Pairs"), [])
+        self.assertEqual(classify_title("Binance Margin Will Add Ankr (ANKR) as a Borrowable Asset"), [])
+        self.assertEqual(classify_title("Binance FUTURES Will Launch Coin-Margined (ARPA) Contracts"), [])
+        self.assertEqual(classify_title("Binance Completes the Beta Finance Subscription Launchpad"), [])
+
+    def test_classify_titles(self):
+        expected = json.loads(PAGES_DIR.joinpath("expected.json").read_text())["announcement_list.html"]
+        articles = scraper.parse_announcements(PAGES_DIR.joinpath("announcement_list.html").read_text())
+        self.assertEqual(classify_titles(a["title"] for a in articles), expected["titles"])
+
+    def test_parse_listing_times(self):
+        self.assertEqual(
+            parse_listing_times("Binance will list SuperRare (RARE) and will open trading for RARE/BTC and "
+                                "RARE/USDT trading pairs at 2021-10-11 06:00 (UTC)."),
+            [("RARE", "2021-10-11 06:00")],
+        )
+        self.assertEqual(
+            parse_listing_times("Binance will then list MBOX at 2021-10-12 06:00 AM (UTC) and open trading."),
+            [("MBOX", "2021-10-12 06:00")],
+        )
+        self.assertEqual(
+            parse_listing_times("Binance will list Alpha (AAA) at 2021-12-01 12:30 AM (UTC) and will then list "
+                                "Beta (BBB) at 2021-12-01 02:00 PM (UTC).", ["AAA", "BBB"]),
+            [("AAA", "2021-12-01 00:30"), ("BBB", "2021-12-01 14:00")],
+        )
+        # the withdrawal time of another sentence is not a listing time
+        self.assertEqual(
+            parse_listing_times("Binance will list Foo (FOO) in the Innovation Zone. "
+                                "Withdrawals will open at 2021-12-02 06:00 (UTC).", ["FOO"]),
+            [],
+        )
+
+    def test_saved_pages(self):
+        expected = json.loads(PAGES_DIR.joinpath("expected.json").read_text())
+        for name, page in expected.items():
+            if "listings" not in page:
+                continue
+            path = Config.ROOT_DIR.joinpath(name) if name == "source.txt" else PAGES_DIR.joinpath(name)
+            text = scraper.parse_article_text(path.read_text())
+            self.assertEqual(
+                parse_announcement(page["title"], text), [tuple(l) for l in page["listings"]], name
+            )
@@ -0,0 +1,181 @@
+import json
+import math
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+import requests
+
+import scraper
+from bot import Bot
+from broker.budget import RequestBudget
+from tests.test_exits import offline_bot_patches
+from tests.test_prepared import binance_offline
+from util import Config
+from util.listings import LISTING_TIME_FORMAT
+
+
+def weight_response(status=200, used=None, retry_after=None, url="https://api.binance.com/api/v3/ping"):
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    if used is not None:
+        response.headers["X-MBX-USED-WEIGHT-1M"] = str(used)
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+class LimitedApi(BaseHTTPRequestHandler):
+    """
+    Binance stand-in that enforces a weight limit per window, with the headers and the 429 of the exchange
+    """
+
+    limit = 100
+    window_seconds = 1.0
+    weights = {}
+    rate_limited = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        cost = 20 if path.endswith("exchangeInfo") else 2 if path.endswith("ticker/price") else 1
+        window = math.floor(time.time() / self.window_seconds)
+        with self.lock:
+            used = self.weights[window] = self.weights.get(window, 0) + cost
+            if used > self.limit:
+                LimitedApi.rate_limited += 1
+        if used > self.limit:
+            self.reply(429, {"code": -1003, "msg": "Too many requests."}, used, {"Retry-After": "1"})
+        elif path.endswith("exchangeInfo"):
+            self.reply(200, {"rateLimits": [], "symbols": [{
+                "symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "isSpotTradingAllowed": True
+            }]}, used)
+        else:
+            self.reply(400, {"code": -1121, "msg": "Invalid symbol."}, used)
+
+    def reply(self, status, body, used, headers=None):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-MBX-USED-WEIGHT-1M", str(used))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRequestBudget(TestCase):
+    def test_reads_the_weight_headers(self):
+        budget = RequestBudget(limit=100, reserve=10)
+        budget.observe(weight_response(used=30))
+        # a slower response of an earlier request
+        budget.observe(weight_response(used=25))
+        self.assertEqual(budget.used, 30)
+        self.assertEqual(budget.remaining(), 60)
+        self.assertTrue(budget.can_afford(60))
+        self.assertFalse(budget.can_afford(61))
+
+        budget.observe(weight_response(url="https://api.binance.com/api/v3/exchangeInfo"))
+        self.assertEqual(budget.used, 50)
+
+    def test_new_window(self):
+        budget = RequestBudget(limit=100, reserve=10, window_seconds=60)
+        start = math.floor(time.time() / 60) * 60
+        budget.observe(weight_response(used=90))
+        self.assertEqual(budget.remaining(start + 30), 0)
+        self.assertEqual(budget.remaining(start + 61), 90)
+
+    def test_rate_limited(self):
+        budget = RequestBudget()
+        budget.observe(weight_response(status=429, used=1300, retry_after=2))
+        self.assertEqual(budget.rate_limited, 1)
+        self.assertFalse(budget.can_afford(1))
+        self.assertAlmostEqual(budget.poll_interval(2), 2, delta=0.1)
+
+    def test_poll_interval_spreads_the_weight(self):
+        budget = RequestBudget(limit=130, reserve=10, window_seconds=60)
+        start = math.floor(time.time() / 60) * 60
+        budget._window = budget._window_of(start)
+        # 120 weight left for 30 seconds, 2 per poll
+        self.assertAlmostEqual(budget.poll_interval(2, start + 30), 0.5)
+        budget.used = 119
+        self.assertAlmostEqual(budget.poll_interval(2, start + 30), 30)
+
+    def test_limits_from_exchange_info(self):
+        budget = RequestBudget()
+        budget.update_limits([
+            {"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1, "limit": 6000},
+            {"rateLimitType": "ORDERS", "interval": "SECOND", "intervalNum": 10, "limit": 100},
+        ])
+        self.assertEqual(budget.limit, 6000)
+
+
+class TestSimulatedLimits(TestCase):
+    """
+    A bot in a listing window polls an exchange stand-in with a weight limit per second
+    """
+
+    def setUp(self) -> None:
+        LimitedApi.weights, LimitedApi.rate_limited = {}, 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), LimitedApi)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+
+        self.client = binance_offline()
+        self.client.API_URL = "http://127.0.0.1:{}/api".format(self.server.server_address[1])
+        self.client.budget = RequestBudget(
+            limit=LimitedApi.limit, reserve=20, window_seconds=LimitedApi.window_seconds
+        )
+        self.client.session.hooks["response"] = [self.client.budget.observe]
+
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        for patcher in offline_bot_patches(Path(root.name), self.client):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        scraper.calendar.add("RARE", datetime.utcnow().strftime(LISTING_TIME_FORMAT))
+        self.bot = Bot("BINANCE")
+        self.addCleanup(self.bot.close)
+        self.bot.scrape_the_fucking_shit_m8()
+
+    def poll(self, seconds):
+        end = time.time() + seconds
+        while time.time() < end:
+            try:
+                self.bot.get_new_tickers()
+            except Exception:
+                pass
+            target, _ = self.bot.next_wakeup()
+            time.sleep(max(0.0, min(target, end) - time.time()))
+
+    def test_stays_within_the_limit(self):
+        self.assertTrue(self.bot.in_listing_window())
+        # starts with a fresh window
+        time.sleep(1 - time.time() % 1)
+        self.poll(2)
+        self.assertEqual(LimitedApi.rate_limited, 0)
+        # most of the weight the polls may use is used
+        self.assertGreater(max(LimitedApi.weights.values()), 0.6 * (LimitedApi.limit - 20))
+
+    def test_poll_cost_counts_the_hedged_hosts_and_the_full_scan(self):
+        self.client.hedge = SimpleNamespace(fan_out=3, close=lambda: None)
+        with mock.patch.object(Config, "FULL_SCAN_SECONDS", 1), \
+                mock.patch.object(self.client.budget, "poll_interval", return_value=0) as poll_interval:
+            self.bot.next_wakeup()
+        # 3 probes of 2, and a hundredth of the scan of 20 in each 0.01s poll
+        self.assertAlmostEqual(poll_interval.call_args.args[0], 3 * 2 + 20 * 0.01)
+
+    def test_without_budget(self):
+        del self.client.budget
+        self.poll(1)
+        self.assertGreater(LimitedApi.rate_limited, 0)
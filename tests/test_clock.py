@@ -0,0 +1,127 @@
+import asyncio
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import TestCase, mock
+
+import scraper
+from bot import Bot
+from tests.test_exits import FakeExchange, offline_bot_patches
+from util import Config
+from util.clock import ExchangeClock
+from util.listings import LISTING_TIME_FORMAT, listing_timestamp
+from util.scheduler import Scheduler
+
+
+class ServerTime:
+    """
+    get_server_time stand-in of an exchange offset seconds ahead, with the delays of each request
+    on its way to the exchange and back
+    """
+
+    def __init__(self, offset: float, delays=((0.001, 0.001),)):
+        self.offset = offset
+        self.delays = list(delays)
+        self.requests = 0
+
+    def __call__(self) -> float:
+        there, back = self.delays[min(self.requests, len(self.delays) - 1)]
+        self.requests += 1
+        time.sleep(there)
+        server = round(time.time() + self.offset, 3)
+        time.sleep(back)
+        return server
+
+
+def reported_offset(report: str) -> float:
+    return float(re.search(r"offset ([+-][\d.]+)ms", report).group(1))
+
+
+class TestExchangeClock(TestCase):
+    def test_offset(self):
+        clock = ExchangeClock(ServerTime(2.5))
+        self.assertTrue(clock.sync())
+        self.assertAlmostEqual(clock.now() - time.time(), 2.5, delta=clock.error)
+        self.assertLess(clock.error, 0.005)
+        self.assertAlmostEqual(reported_offset(clock.report()), 2500, delta=5)
+
+    def test_fastest_round_trip_wins(self):
+        # the first answer is held up on its way back, it would put the exchange 40ms behind
+        clock = ExchangeClock(ServerTime(-1, delays=[(0.0, 0.08), (0.002, 0.002)]))
+        clock.sync(4)
+        self.assertAlmostEqual(clock.offset, -1, delta=0.005)
+        self.assertLess(clock.rtt, 0.02)
+
+    def test_error_grows_with_age(self):
+        clock = ExchangeClock(ServerTime(0))
+        clock.sample()
+        sample = clock.samples[0]
+        self.assertAlmostEqual(
+            clock.sample_error(sample, sample[0] + 1000) - clock.sample_error(sample, sample[0]),
+            1000 * ExchangeClock.MAX_DRIFT
+        )
+
+    def test_ignores_wall_clock_jumps(self):
+        clock = ExchangeClock(ServerTime(0))
+        clock.sync()
+        before = clock.now()
+        with mock.patch("time.time", return_value=before - 3600):
+            self.assertAlmostEqual(clock.now(), before, delta=0.05)
+
+    def test_failures(self):
+        clock = ExchangeClock(mock.Mock(side_effect=ConnectionError))
+        self.assertFalse(clock.sync(2))
+        self.assertEqual(clock.failures, 2)
+        self.assertAlmostEqual(clock.now(), time.time(), delta=0.05)
+        self.assertIn("no exchange time", clock.report())
+        self.assertFalse(ExchangeClock().sample())
+
+    def test_scheduler_sleeps_in_exchange_time(self):
+        clock = ExchangeClock(ServerTime(3600))
+        clock.sync()
+        scheduler = Scheduler(clock=clock.now)
+
+        async def run():
+            return await scheduler.sleep_until(clock.now() + 0.05, precise=True)
+
+        start = time.perf_counter()
+        self.assertTrue(asyncio.run(run()))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertTrue(0 <= scheduler.jitter.samples[-1] < 0.02)
+
+
+class TestListingTime(TestCase):
+    def test_utc(self):
+        self.assertEqual(listing_timestamp("2021-10-11 06:00"), 1633932000)
+
+
+class TestBotClock(TestCase):
+    def test_listing_window_in_exchange_time(self):
+        exchange = FakeExchange()
+        # an exchange two hours ahead of the local clock
+        exchange.clock = ExchangeClock(ServerTime(7200))
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        patches = offline_bot_patches(Path(root.name), exchange) + [
+            mock.patch.object(Config, "WARMUP_SECONDS", 3600, create=True),
+            mock.patch.object(Config, "NOTIFICATION_SERVICE"),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        listing = datetime.utcnow() + timedelta(hours=2, minutes=5)
+        scraper.calendar.add("RARE", listing.strftime(LISTING_TIME_FORMAT))
+        bot = Bot("BINANCE")
+        self.addCleanup(bot.close)
+
+        self.assertLess(bot.clock.error, 0.01)
+        bot.run()
+        self.assertFalse(bot.warm_up_due())
+        reports = [str(c) for c in Config.NOTIFICATION_SERVICE.debug.call_args_list]
+        before_listing = [r for r in reports if "RARE lists in" in r]
+        self.assertEqual(len(before_listing), 1)
+        self.assertAlmostEqual(reported_offset(before_listing[0]), 7200 * 1000, delta=10)
+        self.assertFalse(bot.in_listing_window())
+        self.assertTrue(bot.in_listing_window(listing_timestamp(listing.strftime(LISTING_TIME_FORMAT))))
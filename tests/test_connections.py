@@ -0,0 +1,123 @@
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import TestCase, mock, skipUnless
+
+import scraper
+from bot import Bot
+from broker.connections import BOT_THREADS
+from tests.test_exits import FakeExchange, offline_bot_patches
+from tests.test_prepared import binance_offline
+from util import Config
+from util.listings import LISTING_TIME_FORMAT
+
+
+class Ping(BaseHTTPRequestHandler):
+    # keeps connections alive, as the exchange does
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, Nagle would hold the body back for the delayed ack of the client
+    disable_nagle_algorithm = True
+    handshakes = 0
+
+    def setup(self):
+        super().setup()
+        Ping.handshakes += 1
+
+    def do_GET(self):
+        # long enough for the warm-up calls to overlap
+        time.sleep(0.05)
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def https_server(handler, directory: str):
+    """
+    Local HTTPS server with a self-signed certificate made by openssl, returns the server and the certificate file
+    """
+    cert, key = Path(directory, "cert.pem"), Path(directory, "key.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-keyout", str(key),
+        "-out", str(cert), "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+    ], check=True, capture_output=True)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, str(cert)
+
+
+@skipUnless(shutil.which("openssl"), "openssl is needed for the certificate of the local HTTPS server")
+class TestConnectionManager(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dir = tempfile.TemporaryDirectory()
+        cls.server, cls.cert = https_server(Ping, cls.dir.name)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.dir.cleanup()
+
+    def test_requests_reuse_warm_connections(self):
+        client = binance_offline()
+        client.API_URL = "https://127.0.0.1:{}/api".format(self.server.server_address[1])
+        # requests_params of python-binance, the session verify setting loses to REQUESTS_CA_BUNDLE
+        client._requests_params = {"verify": self.cert}
+        Ping.handshakes = 0
+
+        self.assertTrue(client.connections.warm(3))
+        self.assertEqual(Ping.handshakes, 3)
+        for _ in range(5):
+            client.ping()
+        stats = client.connections.stats()["127.0.0.1"]
+        self.assertEqual(stats, {"requests": 8, "connections": 3, "reused": 5})
+        self.assertEqual(Ping.handshakes, 3)
+        self.assertIn("8 requests on 3 connections (5 reused)", client.connections.report())
+
+
+class TestPoolSize(TestCase):
+    def test_sized_to_the_threads_and_hosts(self):
+        adapter = binance_offline().connections.adapter
+        self.assertEqual((adapter._pool_connections, adapter._pool_maxsize), (1, BOT_THREADS))
+
+        with mock.patch.object(Config, "HEDGE_HOSTS", 2):
+            client = binance_offline()
+        self.addCleanup(client.hedge.close)
+        adapter = client.connections.adapter
+        self.assertEqual((adapter._pool_connections, adapter._pool_maxsize), (4, BOT_THREADS + 16))
+
+
+class TestBotWarmUp(TestCase):
+    def test_warms_up_once_before_the_window(self):
+        exchange = FakeExchange()
+        exchange.connections = mock.Mock(**{"report.return_value": ""})
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        patches = offline_bot_patches(Path(root.name), exchange) + [
+            mock.patch.object(Config, "WARMUP_SECONDS", 3600),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        scraper.calendar.add("RARE", (datetime.utcnow() + timedelta(minutes=30)).strftime(LISTING_TIME_FORMAT))
+        bot = Bot("BINANCE")
+        self.addCleanup(bot.close)
+
+        bot.run()
+        bot.run()
+        exchange.connections.warm.assert_called_once_with()
+        self.assertFalse(bot.warm_up_due())
@@ -0,0 +1,94 @@
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase, mock
+
+import requests
+
+import scraper
+from bot import Bot
+from tests.test_exits import FakeExchange, offline_bot_patches
+from tests.test_prepared import binance_offline
+from util import Config
+from util.listings import LISTING_TIME_FORMAT
+from util.types import Ticker
+
+
+def json_response(status_code, payload) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode()
+    return response
+
+
+def price_ticker(listed):
+    def get(url, **kwargs):
+        symbol = kwargs["params"].split("=")[1]
+        if symbol in listed:
+            return json_response(200, {"symbol": symbol, "price": "1.5"})
+        return json_response(400, {"code": -1121, "msg": "Invalid symbol."})
+    return get
+
+
+class ProbingExchange(FakeExchange):
+    def __init__(self):
+        super().__init__()
+        self.listed = set()
+        self.probes = 0
+        self.full_scans = 0
+
+    def get_tickers(self, quote_ticker, **kwargs):
+        self.full_scans += 1
+        return super().get_tickers(quote_ticker) + [
+            Ticker(ticker=t, base_ticker=t[:-4], quote_ticker=quote_ticker) for t in self.listed
+        ]
+
+    def probe_tickers(self, tickers):
+        self.probes += 1
+        return [t for t in tickers if t.ticker in self.listed]
+
+
+class TestDetection(TestCase):
+    def test_probe_tickers(self):
+        client = binance_offline()
+        rare = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+        mbox = Ticker(ticker="MBOXUSDT", base_ticker="MBOX", quote_ticker="USDT")
+        with mock.patch.object(client.session, "get", side_effect=price_ticker({"RAREUSDT"})):
+            self.assertEqual(client.probe_tickers([rare, mbox]), [rare])
+        stats = client.detection_stats["probe"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["weight"], 2 * client.PRICE_TICKER_WEIGHT)
+        self.assertGreater(stats["bytes"], 0)
+        self.assertIn("probe detection: 2 requests", client.detection_report())
+
+    def test_bot_probes_the_target(self):
+        exchange = ProbingExchange()
+        with tempfile.TemporaryDirectory() as d:
+            patches = offline_bot_patches(Path(d), exchange)
+            for patcher in patches:
+                patcher.start()
+            try:
+                scraper.calendar.add("RARE", datetime.utcnow().strftime(LISTING_TIME_FORMAT))
+                with mock.patch.object(Config, "FULL_SCAN_SECONDS", 60):
+                    bot = Bot("BINANCE")
+                    bot.scrape_the_fucking_shit_m8()
+                    self.assertEqual(bot.get_new_tickers(), [])
+                    self.assertEqual((exchange.full_scans, exchange.probes), (2, 0))
+                    for _ in range(5):
+                        self.assertEqual(bot.get_new_tickers(), [])
+                    self.assertEqual((exchange.full_scans, exchange.probes), (2, 5))
+                    exchange.listed.add("RAREUSDT")
+                    self.assertEqual([t.ticker for t in bot.get_new_tickers()], ["RAREUSDT"])
+                    # seen once
+                    self.assertEqual(bot.get_new_tickers(), [])
+
+                    # the slower full scan still catches listings that were not scraped
+                    exchange.listed.add("SURPRISEUSDT")
+                    bot.last_full_scan = time.time() - 61
+                    self.assertEqual([t.ticker for t in bot.get_new_tickers()], ["SURPRISEUSDT"])
+                    bot.close()
+            finally:
+                for patcher in patches:
+                    patcher.stop()
@@ -0,0 +1,157 @@
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase, mock
+
+import yaml
+
+import scraper
+from bot import Bot
+from util import Config
+from util.listings import ListingCalendar
+from util.types import Order, Ticker
+
+
+class FakeExchange:
+    """
+    Buys fill at 1.0, limit sells fill when fill() is called, market sells right away
+    """
+
+    def __init__(self, broker_type: str = "BINANCE"):
+        self.brokerType = broker_type
+        self.limit_sell_percent = 26
+        self.filled = set()
+        self.cancelled = []
+        self.sells = []
+
+    def get_tickers(self, quote_ticker, **kwargs):
+        return [Ticker(ticker="BTC" + quote_ticker, base_ticker="BTC", quote_ticker=quote_ticker)]
+
+    def place_order(self, config, ticker, side, size, current_price=None, buy_price=None, **kwargs):
+        order_id = str(len(self.sells) + 100)
+        price = 1.0
+        if side.upper() == "SELL":
+            self.sells.append(order_id)
+            if current_price == -1:
+                self.filled.add(order_id)
+            else:
+                price = buy_price + current_price * buy_price * self.limit_sell_percent / 100
+        return Order(
+            broker=self.brokerType, ticker=ticker, purchase_datetime=datetime.now(), price=price,
+            side=side.upper(), size=size, type="market" if current_price in (None, -1) else "limit", status="LIVE",
+            orderId=order_id, take_profit=price, stop_loss=price, trailing_stop_loss_max=price,
+            trailing_stop_loss=price,
+        )
+
+    def check_order(self, sell):
+        return {"origQty": "1", "executedQty": "1" if sell.orderId in self.filled else "0"}
+
+    def cancel(self, sell):
+        if sell.orderId in self.filled:
+            raise Exception("Unknown order sent.")
+        self.cancelled.append(sell.orderId)
+
+    def fill(self, order_id):
+        self.filled.add(order_id)
+
+
+def offline_bot_patches(root: Path, exchange: FakeExchange, **broker_config):
+    """
+    Patches for a Bot that runs without auth, network or files outside of root
+    """
+    root.joinpath("config.yml").write_text(yaml.dump({"TRADE_OPTIONS": {"BROKERS": {
+        exchange.brokerType: dict(ENABLED=True, **broker_config)
+    }}}))
+    return [
+        mock.patch.multiple(Config, create=True, ROOT_DIR=root, TEST=False, SHARE_DATA=False,
+                            CHECK_LISTING_START_TIME=1.5, FREQUENCY_SECONDS=0.01, SELL_RETRY_SECONDS=0.01,
+                            FIRST_WARNING_TIME_MINUTES=60, SECOND_WARNING_TIME_MINUTES=10,
+                            THIRD_WARNING_TIME_SECONDS=120),
+        mock.patch.object(Config, "load_version", return_value=(0, 0, False)),
+        mock.patch("bot.bot.Broker.factory", return_value=exchange),
+        mock.patch.object(scraper, "calendar", ListingCalendar()),
+    ]
+
+
+def wait_for(condition, timeout=2):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.005)
+    return condition()
+
+
+class TestExits(TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.exchange = FakeExchange()
+        for patcher in offline_bot_patches(Path(self.dir.name), self.exchange,
+                                           LIMIT_SELL_SECONDS=0.3, MARKET_SELL_SECONDS=0.6):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.bot = Bot("BINANCE")
+        self.addCleanup(self.bot.close)
+
+    def buy(self, coin, listing_time_ts):
+        ticker = Ticker(ticker=coin + "USDT", base_ticker=coin, quote_ticker="USDT")
+        order = self.exchange.place_order(self.bot.config, ticker=ticker, side="BUY", size=10)
+        order.listing_time_ts = listing_time_ts
+        self.bot.orders[ticker.ticker] = order
+        self.bot.schedule_exit(ticker.ticker, time.time())
+        return ticker.ticker
+
+    def test_overlapping_listings(self):
+        now = time.time()
+        a = self.buy("AAA", now)
+        # listed 0.4s earlier, past its limit sell deadline already
+        b = self.buy("BBB", now - 0.4)
+        self.bot.drive_exits()
+        self.assertEqual(self.bot.orders[a].exit_stage, 0)
+        self.assertEqual(self.bot.orders[b].exit_stage, 1)
+        sell_a, sell_b = self.bot.orders[a].sell_order_id, self.bot.orders[b].sell_order_id
+        self.assertNotEqual(sell_a, sell_b)
+
+        self.exchange.fill(sell_a)
+        self.assertTrue(wait_for(lambda: self.bot._sells_resolved))
+        self.bot.drive_exits()
+        self.bot.run()
+        self.assertIn(a, self.bot.sold)
+        self.assertNotIn(a, self.bot.orders)
+        self.assertAlmostEqual(self.bot.sold[a].price, 1.26)
+        self.assertEqual(self.bot.orders[b].exit_stage, 1)
+
+        # b's limit sell is cancelled at its deadline, then sold at market
+        self.assertTrue(wait_for(lambda: self.bot._sells_resolved))
+        self.bot.drive_exits()
+        self.assertEqual(self.exchange.cancelled, [sell_b])
+        self.assertIn(b, self.bot.sold)
+        self.assertEqual(self.bot.sold[b].type, "market")
+
+    def test_only_due_positions_are_stepped(self):
+        now = time.time()
+        keys = [self.buy("C{}".format(i), now) for i in range(200)]
+        self.bot.drive_exits()
+        self.assertTrue(all(self.bot.orders[k].sell_order_id is not None for k in keys))
+
+        with mock.patch.object(self.bot, "do_the_selling") as do_the_selling:
+            self.bot.drive_exits()
+            do_the_selling.assert_not_called()
+            self.exchange.fill(self.bot.orders[keys[7]].sell_order_id)
+            self.assertTrue(wait_for(lambda: self.bot._sells_resolved))
+            self.bot.drive_exits()
+            self.assertEqual([c.args[0] for c in do_the_selling.call_args_list], [keys[7]])
+
+    def test_pending_sell_survives_restart(self):
+        a = self.buy("AAA", time.time())
+        self.bot.drive_exits()
+        sell_a = self.bot.orders[a].sell_order_id
+        self.bot.close()
+
+        self.bot = Bot("BINANCE")
+        self.assertEqual(self.bot.orders[a].sell_order_id, sell_a)
+        self.exchange.fill(sell_a)
+        self.assertTrue(wait_for(lambda: self.bot._sells_resolved))
+        self.bot.drive_exits()
+        self.assertIn(a, self.bot.sold)
+        self.assertEqual(self.exchange.sells, [sell_a])
@@ -0,0 +1,58 @@
+import time
+from unittest import TestCase
+
+from broker.fills import FillWatcher
+from tests.test_persistence import make_order
+
+
+class FakeBroker:
+    brokerType = "BINANCE"
+
+    def __init__(self, fill_after: float, fails: int = 0, stale: int = 0):
+        self.fill_after = time.time() + fill_after
+        self.fails = fails
+        # status reads that do not see the fill yet
+        self.stale = stale
+        self.cancelled = []
+
+    def check_order(self, order):
+        if self.fails > 0:
+            self.fails -= 1
+            raise ConnectionError()
+        filled = time.time() >= self.fill_after and self.stale == 0
+        self.stale = max(0, self.stale - 1)
+        return {"origQty": "10", "executedQty": "10" if filled else "0"}
+
+    def cancel(self, order):
+        if time.time() >= self.fill_after:
+            raise Exception("Unknown order sent.")
+        self.cancelled.append(order.orderId)
+
+
+class TestFillWatcher(TestCase):
+    def test_filled(self):
+        watcher = FillWatcher(FakeBroker(fill_after=0.05, fails=2), poll_seconds=0.01)
+        filled = watcher.watch(make_order("RAREUSDT"), deadline=time.time() + 1)
+        # does not block meanwhile
+        self.assertFalse(filled.done())
+        self.assertTrue(filled.result(timeout=1))
+        self.assertEqual(watcher.pending(), 0)
+        watcher.close()
+
+    def test_deadline(self):
+        broker = FakeBroker(fill_after=60)
+        watcher = FillWatcher(broker, poll_seconds=0.01)
+        t = time.time()
+        filled = watcher.watch(make_order("RAREUSDT"), deadline=t + 0.1)
+        self.assertFalse(filled.result(timeout=1))
+        self.assertGreaterEqual(time.time(), t + 0.1)
+        self.assertEqual(broker.cancelled, ["1"])
+        watcher.close()
+
+    def test_filled_before_cancel(self):
+        broker = FakeBroker(fill_after=0, stale=1)
+        watcher = FillWatcher(broker, poll_seconds=0.01)
+        # the deadline is past and the status read is stale, the cancel fails since the order filled
+        self.assertTrue(watcher.watch(make_order("RAREUSDT"), deadline=0).result(timeout=1))
+        self.assertEqual(broker.cancelled, [])
+        watcher.close()
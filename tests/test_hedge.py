@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+import requests
+
+from broker.hedge import HedgedRequests
+from tests.test_prepared import binance_offline
+from util import Config
+from util.types import Ticker
+
+
+def api_host(delay=0.0, status=400, body=None):
+    """
+    Binance API host stand-in answering every GET after delay, by default with the "Invalid symbol" of a probe
+    """
+    body = json.dumps(body or {"code": -1121, "msg": "Invalid symbol."}).encode()
+
+    class Host(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        requests = 0
+
+        def do_GET(self):
+            Host.requests += 1
+            time.sleep(Host.delay)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    Host.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Host)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, Host, "http://127.0.0.1:{}/api".format(server.server_address[1])
+
+
+class TestHedgedRequests(TestCase):
+    def host(self, **kwargs):
+        server, handler, url = api_host(**kwargs)
+        self.addCleanup(server.shutdown)
+        return handler, url
+
+    def hedged(self, hosts, **kwargs):
+        hedge = HedgedRequests(requests.Session(), hosts, **kwargs)
+        self.addCleanup(hedge.close)
+        return hedge
+
+    def test_fastest_host_wins(self):
+        _, slow = self.host(delay=0.3)
+        _, fast = self.host(delay=0.01)
+        hedge = self.hedged([slow, fast], fan_out=2)
+
+        start = time.perf_counter()
+        response = hedge.get("v3/ticker/price", {"symbol": "RAREUSDT"})
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertEqual(response.json()["code"], -1121)
+        self.assertEqual(hedge.wins[fast], 1)
+
+    def test_hedges_after_the_percentile(self):
+        slow_handler, slow = self.host(delay=0.01)
+        fast_handler, fast = self.host(delay=0.01)
+        hedge = self.hedged([slow, fast], fan_out=2, percentile=90)
+        for _ in range(20):
+            hedge.get("v3/ping")
+        # only the best host is asked while it answers within its usual latency
+        self.assertEqual(slow_handler.requests + fast_handler.requests, 20)
+        self.assertEqual(hedge.hedges, 0)
+
+        best = hedge.ranked()[0]
+        handlers = {slow: slow_handler, fast: fast_handler}
+        handlers[best].delay = 0.5
+        start = time.perf_counter()
+        hedge.get("v3/ping")
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertEqual(hedge.hedges, 1)
+
+    def test_failing_hosts_are_skipped_and_ranked_down(self):
+        _, down = self.host(status=503, body={"msg": "Service unavailable"})
+        unreachable = "http://127.0.0.1:9/api"
+        _, up = self.host(delay=0.05)
+        hedge = self.hedged([down, unreachable, up], fan_out=3)
+
+        self.assertEqual(hedge.get("v3/ping").status_code, 400)
+        time.sleep(0.1)
+        self.assertEqual(hedge.ranked()[0], up)
+        self.assertGreater(hedge.failures[down], 0)
+        self.assertGreater(hedge.failures[unreachable], 0)
+
+    def test_raises_when_no_host_answers(self):
+        hedge = self.hedged(["http://127.0.0.1:9/api"], fan_out=1)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            hedge.get("v3/ping")
+
+
+class TestBinanceHedged(TestCase):
+    def setUp(self) -> None:
+        self.slow_handler, slow = self.host(delay=0.3)
+        self.fast_handler, fast = self.host(delay=0.01)
+        self.client = binance_offline()
+        self.client.hedge = HedgedRequests(self.client.session, [slow, fast], fan_out=2)
+        self.addCleanup(self.client.hedge.close)
+
+    def host(self, **kwargs):
+        server, handler, url = api_host(**kwargs)
+        self.addCleanup(server.shutdown)
+        return handler, url
+
+    def test_probe_is_hedged(self):
+        ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+        start = time.perf_counter()
+        self.assertEqual(self.client.probe_tickers([ticker]), [])
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertEqual(self.fast_handler.requests, 1)
+        self.assertEqual(self.slow_handler.requests, 1)
+
+    def test_lost_order_response_is_looked_up(self):
+        placed = {
+            "symbol": "RAREUSDT", "orderId": 28, "side": "BUY", "status": "FILLED", "executedQty": "10.00000000",
+            "cummulativeQuoteQty": "30.00000000",
+        }
+        config = SimpleNamespace(TAKE_PROFIT_PERCENT=30, STOP_LOSS_PERCENT=9, TRAILING_STOP_LOSS_PERCENT=8)
+        ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+        with mock.patch.object(Config, "TEST", False), \
+                mock.patch("binance.client.Client.create_order", side_effect=requests.exceptions.ReadTimeout), \
+                mock.patch("binance.client.Client.get_order", return_value=placed) as get_order:
+            order = self.client.place_order(config, ticker=ticker, side="BUY", size=30)
+        self.assertEqual(order.price, 3.0)
+        self.assertEqual(order.orderId, "28")
+        client_order_id = get_order.call_args.kwargs["origClientOrderId"]
+        self.assertTrue(client_order_id.startswith("ncb"))
+        get_order.assert_called_once_with(symbol="RAREUSDT", origClientOrderId=client_order_id)
+        # orders go to the host of the client, never hedged
+        self.assertEqual(self.fast_handler.requests + self.slow_handler.requests, 0)
@@ -0,0 +1,61 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from tests.test_persistence import make_order
+from util.journal import Journal
+from util.types import Order
+
+
+class TestJournal(TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = Path(self.dir.name).joinpath("BINANCE_journal.jsonl")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_replay(self):
+        journal = Journal(self.file).replay()
+        self.assertEqual(journal.entries, 0)
+        journal.record_state(coin="RARE", listing_time="2021-10-11 06:00", stage=0)
+        journal.record_order("RAREUSDT", make_order("RAREUSDT"))
+        journal.record_order("MBOXUSDT", make_order("MBOXUSDT"))
+        journal.record_state(stage=1)
+        journal.record_sold("MBOXUSDT", make_order("MBOXUSDT"))
+        journal.record_remove("MBOXUSDT")
+        journal.close()
+
+        journal = Journal(self.file).replay()
+        self.assertEqual(journal.entries, 6)
+        self.assertEqual(list(journal.orders), ["RAREUSDT"])
+        self.assertEqual(Order.parse_obj(journal.orders["RAREUSDT"]), make_order("RAREUSDT"))
+        self.assertEqual(list(journal.sold), ["MBOXUSDT"])
+        self.assertEqual(journal.state, {"coin": "RARE", "listing_time": "2021-10-11 06:00", "stage": 1})
+
+    def test_compaction(self):
+        journal = Journal(self.file, compact_every=10).replay()
+        journal.record_order("RAREUSDT", make_order("RAREUSDT"))
+        for stage in range(12):
+            journal.record_state(stage=stage)
+        journal.close()
+        self.assertLess(len(self.file.read_text().splitlines()), 10)
+
+        journal = Journal(self.file).replay()
+        self.assertEqual(list(journal.orders), ["RAREUSDT"])
+        self.assertEqual(journal.state, {"stage": 11})
+
+    def test_torn_write(self):
+        journal = Journal(self.file).replay()
+        journal.record_order("RAREUSDT", make_order("RAREUSDT"))
+        journal.record_state(stage=1)
+        journal.close()
+        # crash in the middle of a write
+        with open(self.file, "a") as f:
+            f.write('{"type": "state", "data": {"sta')
+
+        journal = Journal(self.file).replay()
+        self.assertEqual(journal.state, {"stage": 1})
+        journal.record_state(stage=2)
+        journal.close()
+        self.assertEqual(Journal(self.file).replay().state, {"stage": 2})
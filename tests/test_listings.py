@@ -0,0 +1,68 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from util.listings import ListingCalendar, listing_timestamp
+
+
+class TestListingCalendar(TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = Path(self.dir.name).joinpath("new_listing.json")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_next_listing(self):
+        calendar = ListingCalendar(self.file)
+        self.assertIsNone(calendar.peek())
+        self.assertTrue(calendar.add("DAR", "2021-11-04 06:00"))
+        self.assertTrue(calendar.add("RARE", "2021-10-11 06:00"))
+        self.assertTrue(calendar.add("MBOX", "2021-10-12 06:00"))
+
+        self.assertEqual(calendar.peek(), ("RARE", "2021-10-11 06:00", listing_timestamp("2021-10-11 06:00")))
+        self.assertEqual(calendar.pop()[0], "RARE")
+        self.assertEqual(calendar.peek()[0], "MBOX")
+        self.assertEqual(calendar.pop("DAR")[0], "DAR")
+        self.assertEqual(calendar.peek()[0], "MBOX")
+        self.assertEqual(len(calendar), 1)
+
+    def test_duplicates(self):
+        calendar = ListingCalendar(self.file)
+        self.assertTrue(calendar.add("RARE", "2021-10-11 06:00"))
+        self.assertFalse(calendar.add("RARE", "2021-10-11 06:00"))
+        self.assertIn("RARE", calendar)
+        self.assertNotIn("DAR", calendar)
+
+        # rescheduled listings move, the old time is dropped
+        self.assertTrue(calendar.add("MBOX", "2021-10-12 06:00"))
+        self.assertTrue(calendar.add("RARE", "2021-10-13 06:00"))
+        self.assertEqual([l[0] for l in calendar.upcoming()], ["MBOX", "RARE"])
+        self.assertEqual(calendar.pop()[0], "MBOX")
+        self.assertEqual(calendar.pop()[:2], ("RARE", "2021-10-13 06:00"))
+        self.assertIsNone(calendar.pop())
+
+    def test_expire(self):
+        calendar = ListingCalendar(self.file)
+        calendar.add("RARE", "2021-10-11 06:00")
+        calendar.add("MBOX", "2021-10-12 06:00")
+        expired = calendar.expire(listing_timestamp("2021-10-12 00:00"))
+        self.assertEqual([l[0] for l in expired], ["RARE"])
+        self.assertEqual(calendar.peek()[0], "MBOX")
+
+    def test_survives_restart(self):
+        calendar = ListingCalendar(self.file)
+        calendar.add("DAR", "2021-11-04 06:00")
+        calendar.add("RARE", "2021-10-11 06:00")
+
+        calendar = ListingCalendar(self.file)
+        self.assertEqual([l[:2] for l in calendar.upcoming()],
+                         [("RARE", "2021-10-11 06:00"), ("DAR", "2021-11-04 06:00")])
+
+    def test_legacy_file(self):
+        json.dump(["RARE", "2021-10-11 06:00"], open(self.file, "w"))
+        self.assertEqual(ListingCalendar(self.file).peek()[:2], ("RARE", "2021-10-11 06:00"))
+
+        json.dump({}, open(self.file, "w"))
+        self.assertIsNone(ListingCalendar(self.file).peek())
@@ -0,0 +1,70 @@
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase
+
+from util.persistence import JsonStore
+from util.types import Order, Ticker
+
+
+def make_order(ticker: str) -> Order:
+    return Order(
+        broker="BINANCE", ticker=Ticker(ticker=ticker, base_ticker=ticker[:-4], quote_ticker="USDT"),
+        purchase_datetime=datetime(2021, 10, 11, 6), price=1.0, side="BUY", size=10, type="MARKET",
+        status="FILLED", orderId="1", take_profit=1.1, stop_loss=0.9, trailing_stop_loss_max=1.0,
+        trailing_stop_loss=0.95,
+    )
+
+
+class TestJsonStore(TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = Path(self.dir.name).joinpath("BINANCE_orders.json")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_write_behind(self):
+        store = JsonStore(self.file, Order, debounce_seconds=0.1)
+        self.assertFalse(store.flush())
+        for ticker in ["RAREUSDT", "MBOXUSDT", "DARUSDT"]:
+            store.data[ticker] = make_order(ticker)
+        self.assertTrue(store.dirty)
+        self.assertFalse(self.file.exists())
+
+        # a burst of changes is a single write
+        time.sleep(0.3)
+        self.assertFalse(store.dirty)
+        self.assertEqual(store.writes, 1)
+        self.assertEqual(set(json.loads(self.file.read_text())), {"RAREUSDT", "MBOXUSDT", "DARUSDT"})
+
+        # nothing changed, nothing written
+        time.sleep(0.2)
+        self.assertEqual(store.writes, 1)
+        store.close()
+
+    def test_flush_and_reload(self):
+        store = JsonStore(self.file, Order, debounce_seconds=60)
+        store.data["RAREUSDT"] = make_order("RAREUSDT")
+        self.assertTrue(store.flush())
+        store.data.pop("RAREUSDT")
+        store.data["MBOXUSDT"] = make_order("MBOXUSDT")
+        store.close()
+        self.assertEqual(store.writes, 2)
+        self.assertFalse(Path(str(self.file) + ".tmp").exists())
+
+        store = JsonStore(self.file, Order)
+        self.assertEqual(list(store.data), ["MBOXUSDT"])
+        self.assertEqual(store.data["MBOXUSDT"], make_order("MBOXUSDT"))
+        self.assertFalse(store.dirty)
+        store.close()
+        self.assertEqual(store.writes, 0)
+
+    def test_replace(self):
+        store = JsonStore(self.file, Order, debounce_seconds=60)
+        store.replace({"RAREUSDT": make_order("RAREUSDT")})
+        self.assertTrue(store.dirty)
+        store.close()
+        self.assertEqual(list(json.loads(self.file.read_text())), ["RAREUSDT"])
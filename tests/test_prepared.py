@@ -0,0 +1,151 @@
+import hashlib
+import hmac
+import json
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import TestCase, mock
+from urllib.parse import parse_qsl
+
+import requests
+from binance.exceptions import BinanceAPIException
+
+import scraper
+from bot import Bot
+from broker.broker import Binance
+from util import Config
+from util.clock import ExchangeClock
+from util.listings import LISTING_TIME_FORMAT
+from util.types import Ticker
+from tests.test_exits import offline_bot_patches
+
+SECRET = "NhqPtmdSJYdKjVHjA7PZj4Mge3R5YNiP1e3UZjInClVN65XAbvqqM6A7H5fATj0j"
+
+
+def binance_offline() -> Binance:
+    with mock.patch("binance.client.Client.ping"):
+        return Binance(subaccount="", key="vmPUZE6mv9SD5VNHk4HlWFsOr6aKE2zvsw0MuIgwCIPy6utIco14y7Ju91duEh8A",
+                       secret=SECRET)
+
+
+def filled_response(*args, **kwargs) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps({
+        "symbol": "RAREUSDT", "orderId": 28, "side": "BUY", "executedQty": "10.00000000",
+        "fills": [{"price": "3.00000000", "qty": "10.00000000", "commission": "0"}],
+    }).encode()
+    return response
+
+
+class TestPreparedOrder(TestCase):
+    def setUp(self) -> None:
+        self.client = binance_offline()
+        self.config = SimpleNamespace(QUANTITY=30, TAKE_PROFIT_PERCENT=30, STOP_LOSS_PERCENT=9,
+                                      TRAILING_STOP_LOSS_PERCENT=8)
+        self.ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+
+    def test_signature(self):
+        with mock.patch.object(Config, "TEST", False):
+            prepared = self.client.prepare_order(self.config, self.ticker)
+        body = prepared.sign(1499827319559)
+        unsigned, signature = body.rsplit("&signature=", 1)
+        self.assertEqual(
+            signature, hmac.new(SECRET.encode(), unsigned.encode(), hashlib.sha256).hexdigest()
+        )
+        params = dict(parse_qsl(unsigned))
+        self.assertEqual(params.pop("newClientOrderId"), prepared.params["newClientOrderId"])
+        self.assertEqual(params, {
+            "symbol": "RAREUSDT", "side": "BUY", "type": "market", "quoteOrderQty": "30", "recvWindow": "10000",
+            "timestamp": "1499827319559"
+        })
+        self.assertTrue(prepared.uri.endswith("/v3/order"))
+
+    def test_fire(self):
+        with mock.patch.object(Config, "TEST", False):
+            prepared = self.client.prepare_order(self.config, self.ticker)
+            with mock.patch.object(self.client.session, "post", side_effect=filled_response) as post:
+                order = self.client.fire_order(self.config, prepared, self.ticker)
+        self.assertEqual(post.call_args.args[0], prepared.uri)
+        self.assertIn("X-MBX-APIKEY", self.client.session.headers)
+        self.assertTrue(post.call_args.kwargs["data"].startswith(prepared.body + "&timestamp="))
+        self.assertEqual(order.price, 3.0)
+        self.assertEqual(order.orderId, "28")
+
+
+class TestLostPreparedBuy(TestCase):
+    """
+    The prepared buy reaches the exchange, but its response is lost
+    """
+
+    placed = {
+        "symbol": "RAREUSDT", "orderId": 28, "side": "BUY", "status": "FILLED", "executedQty": "10.00000000",
+        "cummulativeQuoteQty": "30.00000000",
+    }
+
+    def setUp(self) -> None:
+        self.client = binance_offline()
+        self.client.clock = ExchangeClock()
+        self.client.retries["buy"].delay = 0.001
+        self.client.retries["order lookup"].delay = 0.001
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        patches = offline_bot_patches(Path(root.name), self.client, QUANTITY=30) + [
+            mock.patch.object(self.client, "get_tickers", return_value=[]),
+            mock.patch.object(self.client.rules, "prefetch"),
+            mock.patch.object(self.client.session, "post", side_effect=requests.exceptions.ReadTimeout),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        scraper.calendar.add("RARE", (datetime.utcnow() + timedelta(hours=1)).strftime(LISTING_TIME_FORMAT))
+        self.bot = Bot("BINANCE")
+        self.addCleanup(self.bot.close)
+        self.bot.scrape_the_fucking_shit_m8()
+        self.ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+
+    def test_found_by_its_client_order_id(self):
+        with mock.patch("binance.client.Client.get_order", return_value=dict(self.placed)) as get_order, \
+                mock.patch("binance.client.Client.create_order") as create_order:
+            self.bot.process_new_ticker(self.ticker)
+
+        create_order.assert_not_called()
+        client_order_id = get_order.call_args.kwargs["origClientOrderId"]
+        self.assertEqual(self.client.session.post.call_count, 1)
+        self.assertIn("newClientOrderId=" + client_order_id, self.client.session.post.call_args.kwargs["data"])
+        self.assertEqual(self.bot.orders["RAREUSDT"].orderId, "28")
+
+    def test_found_after_an_unknown_send_status(self):
+        unavailable = requests.Response()
+        unavailable.status_code = 503
+        unavailable._content = b"Service Unavailable"
+        self.client.session.post.side_effect = None
+        self.client.session.post.return_value = unavailable
+        with mock.patch("binance.client.Client.get_order", return_value=dict(self.placed)), \
+                mock.patch("binance.client.Client.create_order") as create_order:
+            self.bot.process_new_ticker(self.ticker)
+
+        create_order.assert_not_called()
+        self.assertEqual(self.bot.orders["RAREUSDT"].orderId, "28")
+
+    def test_not_resent_while_its_lookup_fails(self):
+        lost = requests.exceptions.ConnectionError
+        with mock.patch("binance.client.Client.get_order", side_effect=lost) as get_order, \
+                mock.patch("binance.client.Client.create_order") as create_order:
+            self.bot.process_new_ticker(self.ticker)
+
+        create_order.assert_not_called()
+        self.assertEqual(get_order.call_count, self.client.retries["order lookup"].tries)
+        self.assertNotIn("RAREUSDT", self.bot.orders)
+
+    def test_bought_again_once_it_does_not_exist(self):
+        missing = BinanceAPIException(None, 400, json.dumps({"code": -2013, "msg": "Order does not exist."}))
+        with mock.patch("binance.client.Client.get_order", side_effect=missing), \
+                mock.patch("binance.client.Client.create_order", return_value=filled_response().json()) as create_order:
+            self.bot.process_new_ticker(self.ticker)
+
+        create_order.assert_called_once()
+        prepared_id = dict(parse_qsl(self.client.session.post.call_args.kwargs["data"]))["newClientOrderId"]
+        self.assertEqual(create_order.call_args.kwargs["newClientOrderId"], prepared_id)
+        self.assertEqual(self.bot.orders["RAREUSDT"].orderId, "28")
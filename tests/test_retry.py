@@ -0,0 +1,227 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+import requests
+from binance.exceptions import BinanceAPIException
+
+from broker.broker import binance_buy_retryable, binance_retryable
+from tests.test_prepared import binance_offline, filled_response
+from util import Config
+from util.decorators import CircuitBreaker, RetryPolicy, is_retryable
+from util.exceptions import CircuitOpenException
+from util.types import Ticker
+
+
+def api_error(status: int, code: int, msg: str = "") -> BinanceAPIException:
+    return BinanceAPIException(None, status, json.dumps({"code": code, "msg": msg}))
+
+
+class Flaky:
+    """
+    Raises the errors in turn, then returns result
+    """
+
+    def __init__(self, *errors, result="ok"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+class TestRetryPolicy(TestCase):
+    def test_retries_transient_errors(self):
+        policy = RetryPolicy("test", tries=3, delay=0.001, logger=None)
+        f = Flaky(requests.exceptions.ConnectionError(), requests.exceptions.ReadTimeout())
+        self.assertEqual(policy.run(f), "ok")
+        self.assertEqual((policy.calls, policy.attempts, policy.retries, policy.give_ups), (1, 3, 2, 0))
+
+    def test_rejected_requests_are_not_retried(self):
+        policy = RetryPolicy("test", binance_retryable, tries=3, delay=0.001, logger=None)
+        f = Flaky(api_error(400, -2010, "Account has insufficient balance for requested action."))
+        with self.assertRaises(BinanceAPIException):
+            policy.run(f)
+        self.assertEqual(f.calls, 1)
+
+    def test_gives_up_after_tries(self):
+        policy = RetryPolicy("test", tries=2, delay=0.001, logger=None)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            policy.run(Flaky(*[requests.exceptions.ConnectionError()] * 5))
+        self.assertEqual((policy.attempts, policy.give_ups), (2, 1))
+
+    def test_deadline(self):
+        policy = RetryPolicy("test", tries=-1, delay=0.02, backoff=1, jitter=0, logger=None)
+        start = time.time()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            policy.run(Flaky(*[requests.exceptions.ConnectionError()] * 100), deadline=start + 0.1)
+        self.assertLess(time.time() - start, 0.15)
+        self.assertEqual(policy.give_ups, 1)
+        self.assertLess(policy.attempts, 10)
+
+    def test_timeout(self):
+        policy = RetryPolicy("test", tries=-1, delay=0.02, backoff=1, jitter=0, timeout=0.1, logger=None)
+        start = time.time()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            policy.run(Flaky(*[requests.exceptions.ConnectionError()] * 100))
+        self.assertLess(time.time() - start, 0.15)
+
+    def test_jittered_backoff(self):
+        policy = RetryPolicy("test", delay=0.1, backoff=2, max_delay=0.3, jitter=0.5)
+        for attempt, full in [(1, 0.1), (2, 0.2), (3, 0.3), (6, 0.3)]:
+            pause = policy.backoff_delay(attempt)
+            self.assertTrue(full / 2 <= pause <= full, (attempt, pause))
+
+    def test_async(self):
+        policy = RetryPolicy("test", tries=3, delay=0.05, jitter=0, logger=None)
+        attempts = []
+
+        @policy
+        async def call():
+            attempts.append(time.perf_counter())
+            if len(attempts) < 3:
+                raise requests.exceptions.ConnectionError()
+            return "ok"
+
+        async def ticks():
+            # runs meanwhile, the backoff does not block the event loop
+            count = 0
+            while len(attempts) < 3:
+                count += 1
+                await asyncio.sleep(0.005)
+            return count
+
+        async def run():
+            return await asyncio.gather(call(), ticks())
+
+        result, ticked = asyncio.run(run())
+        self.assertEqual(result, "ok")
+        self.assertGreater(ticked, 5)
+        self.assertEqual(policy.retries, 2)
+
+    def test_decorated_method(self):
+        class Endpoint:
+            def __init__(self):
+                self.flaky = Flaky(requests.exceptions.ConnectionError())
+
+            @RetryPolicy("method", delay=0.001, logger=None)
+            def get(self, x):
+                return self.flaky(x)
+
+        self.assertEqual(Endpoint().get(1), "ok")
+
+    def test_circuit_breaker(self):
+        now = [0.0]
+        breaker = CircuitBreaker("test", threshold=3, reset_seconds=10, clock=lambda: now[0])
+        policy = RetryPolicy("test", tries=1, breaker=breaker, logger=None)
+        down = Flaky(*[requests.exceptions.ConnectionError()] * 4)
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                policy.run(down)
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenException):
+            policy.run(down)
+        self.assertEqual((down.calls, policy.rejected), (3, 1))
+
+        # a single trial once reset_seconds passed, its failure opens the circuit again
+        now[0] = 10
+        self.assertEqual(breaker.state, "half-open")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            policy.run(down)
+        self.assertEqual(breaker.state, "open")
+        now[0] = 20
+        self.assertEqual(policy.run(down), "ok")
+        self.assertEqual(breaker.state, "closed")
+        self.assertIn("circuit closed (opened 2x)", policy.report())
+
+    def test_rejections_do_not_open_the_circuit(self):
+        breaker = CircuitBreaker("test", threshold=1)
+        policy = RetryPolicy("test", binance_retryable, tries=1, breaker=breaker, logger=None)
+        with self.assertRaises(BinanceAPIException):
+            policy.run(Flaky(api_error(400, -1013, "Filter failure: LOT_SIZE")))
+        self.assertEqual(breaker.state, "closed")
+
+
+    def test_errors_that_are_no_outage_are_retried_with_the_circuit_closed(self):
+        breaker = CircuitBreaker("test", threshold=2)
+        policy = RetryPolicy(
+            "test", lambda e: True, tries=5, delay=0.001, breaker=breaker, logger=None,
+            down=lambda e: isinstance(e, requests.exceptions.ConnectionError),
+        )
+        self.assertEqual(policy.run(Flaky(*[ValueError()] * 3, result="ok")), "ok")
+        self.assertEqual((policy.retries, breaker.opened), (3, 0))
+        with self.assertRaises(CircuitOpenException):
+            policy.run(Flaky(*[requests.exceptions.ConnectionError()] * 5))
+        self.assertEqual(breaker.state, "open")
+
+class TestClassification(TestCase):
+    def test_generic(self):
+        self.assertTrue(is_retryable(requests.exceptions.ConnectionError()))
+        self.assertTrue(is_retryable(requests.exceptions.ReadTimeout()))
+        self.assertTrue(is_retryable(api_error(503, 0)))
+        self.assertTrue(is_retryable(api_error(429, -1003)))
+        self.assertFalse(is_retryable(api_error(418, -1003)))
+        self.assertFalse(is_retryable(api_error(400, -1121)))
+        self.assertFalse(is_retryable(ValueError()))
+
+    def test_binance(self):
+        self.assertTrue(binance_retryable(api_error(400, -1021, "Timestamp for this request is outside of the recvWindow.")))
+        self.assertFalse(binance_retryable(api_error(400, -1121, "Invalid symbol.")))
+        # buys of a symbol that is not trading yet
+        self.assertTrue(binance_buy_retryable(api_error(400, -1121, "Invalid symbol.")))
+        self.assertTrue(binance_buy_retryable(api_error(400, -1013, "Market is closed.")))
+        self.assertFalse(binance_buy_retryable(api_error(400, -2010, "Account has insufficient balance.")))
+
+
+class TestBinanceRetries(TestCase):
+    def setUp(self) -> None:
+        self.client = binance_offline()
+        for policy in self.client.retries.values():
+            policy.delay = 0.001
+        self.ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+
+    def test_price(self):
+        prices = Flaky(requests.exceptions.ConnectionError(), api_error(502, 0), result={"price": "3.5"})
+        with mock.patch.object(self.client, "get_symbol_ticker", side_effect=prices):
+            self.assertEqual(self.client.get_current_price(self.ticker), 3.5)
+        self.assertEqual(self.client.retries["price"].retries, 2)
+
+    def test_price_outage_is_bounded(self):
+        with mock.patch.object(self.client, "get_symbol_ticker", side_effect=requests.exceptions.ConnectionError):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.client.get_current_price(self.ticker)
+        self.assertEqual(self.client.retries["price"].attempts, 5)
+
+    def test_order_deadline(self):
+        config = SimpleNamespace(TAKE_PROFIT_PERCENT=30, STOP_LOSS_PERCENT=9, TRAILING_STOP_LOSS_PERCENT=8)
+        # the symbol is not trading yet, and not before the deadline
+        rejected = api_error(400, -1121, "Invalid symbol.")
+        start = time.time()
+        with mock.patch.object(Config, "TEST", False), \
+                mock.patch("binance.client.Client.create_order", side_effect=rejected) as create:
+            with self.assertRaises(BinanceAPIException):
+                self.client.place_order(
+                    config, ticker=self.ticker, side="BUY", size=30, deadline=self.client.clock.now() + 0.2
+                )
+        self.assertLess(time.time() - start, 0.5)
+        self.assertGreater(create.call_count, 1)
+        self.assertEqual(self.client.retries["buy"].give_ups, 1)
+        self.assertIn("buy: 1 calls", self.client.retry_report())
+
+    def test_buy_polls_at_a_flat_pace_until_the_symbol_trades(self):
+        config = SimpleNamespace(TAKE_PROFIT_PERCENT=30, STOP_LOSS_PERCENT=9, TRAILING_STOP_LOSS_PERCENT=8)
+        buy = self.client.retries["buy"]
+        self.assertEqual(buy.backoff_delay(1), buy.backoff_delay(20))
+        # more rejections than the threshold of the circuit, which stays closed
+        responses = Flaky(*[api_error(400, -1121, "Invalid symbol.")] * 12, result=filled_response().json())
+        with mock.patch.object(Config, "TEST", False), \
+                mock.patch("binance.client.Client.create_order", side_effect=responses):
+            order = self.client.place_order(config, ticker=self.ticker, side="BUY", size=30)
+        self.assertEqual((order.orderId, order.price), ("28", 3.0))
+        self.assertEqual(buy.breaker.state, "closed")
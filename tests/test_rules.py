@@ -0,0 +1,100 @@
+import threading
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+from broker.rules import SymbolRules, SymbolRulesCache
+from tests.test_prepared import binance_offline
+from util import Config
+from util.exceptions import BelowMinNotionalException
+from util.types import Ticker
+
+INFO = {
+    "symbol": "RAREUSDT",
+    "filters": [
+        {"filterType": "LOT_SIZE", "minQty": "0.10000000", "maxQty": "9000000.00000000", "stepSize": "0.10000000"},
+        {"filterType": "NOTIONAL", "minNotional": "5.00000000", "applyMinToMarket": True},
+        {"filterType": "PRICE_FILTER", "minPrice": "0.00010000", "maxPrice": "1000.00000000",
+         "tickSize": "0.00010000"},
+    ],
+}
+
+
+class TestSymbolRules(TestCase):
+    def setUp(self) -> None:
+        self.rules = SymbolRules.from_symbol_info(INFO)
+
+    def test_filters_in_any_order(self):
+        self.assertEqual(self.rules.tick_size, Decimal("0.0001"))
+        self.assertEqual(self.rules.step_size, Decimal("0.1"))
+        self.assertEqual(self.rules.min_notional, Decimal("5"))
+
+    def test_rounds_down_exactly(self):
+        self.assertEqual(self.rules.round_quantity(9.95), Decimal("9.9"))
+        # 0.3 is 0.29999... as a float, the old float loop gave 0.2
+        self.assertEqual(self.rules.round_quantity(0.3), Decimal("0.3"))
+        self.assertEqual(self.rules.round_price(3.14159), Decimal("3.1415"))
+        self.assertEqual(format(SymbolRules("X", Decimal("1E+1"), Decimal("1E+1")).round_quantity(57), "f"), "50")
+
+    def test_notional(self):
+        self.assertTrue(self.rules.check_notional(Decimal("1.0"), Decimal("5.0")))
+        self.assertFalse(self.rules.check_notional(Decimal("1.0"), Decimal("4.9")))
+        self.assertFalse(self.rules.check_notional(Decimal("100"), Decimal("0.0")))
+
+
+class TestSymbolRulesCache(TestCase):
+    def test_fetches_once(self):
+        fetch = mock.Mock(return_value=INFO)
+        cache = SymbolRulesCache(fetch)
+        self.assertIs(cache.get("RAREUSDT"), cache.get("RAREUSDT"))
+        fetch.assert_called_once_with("RAREUSDT")
+
+    def test_get_waits_for_prefetch(self):
+        release = threading.Event()
+        fetch = mock.Mock(side_effect=lambda symbol: release.wait(5) and INFO)
+        cache = SymbolRulesCache(fetch)
+        cache.prefetch("RAREUSDT")
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(cache.get("RAREUSDT").symbol, "RAREUSDT")
+        fetch.assert_called_once_with("RAREUSDT")
+
+    def test_stale_entry_refreshed_in_background(self):
+        fetch = mock.Mock(return_value=INFO)
+        cache = SymbolRulesCache(fetch, refresh_seconds=0)
+        first = cache.get("RAREUSDT")
+        self.assertIs(cache.get("RAREUSDT"), first)
+        cache._executor.shutdown(wait=True)
+        self.assertEqual(fetch.call_count, 2)
+        self.assertIsNot(cache._rules["RAREUSDT"][0], first)
+
+
+class TestBinanceSell(TestCase):
+    def test_limit_sell_params(self):
+        client = binance_offline()
+        config = SimpleNamespace(QUANTITY=30, TAKE_PROFIT_PERCENT=30, STOP_LOSS_PERCENT=9,
+                                 TRAILING_STOP_LOSS_PERCENT=8, LIMIT_SELL_PERCENT=10)
+        ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+        response = {"orderId": 29, "side": "SELL", "executedQty": "0", "fills": []}
+        with mock.patch.object(Config, "TEST", False), \
+                mock.patch.object(client.rules, "fetch", return_value=INFO) as fetch, \
+                mock.patch("binance.client.Client.create_order", return_value=response) as create:
+            client.place_order(config, ticker=ticker, size=9.95, side="SELL", current_price=1, buy_price=3.14159)
+            client.place_order(config, ticker=ticker, size=9.95, side="SELL", current_price=1, buy_price=3.14159)
+        fetch.assert_called_once_with("RAREUSDT")
+        params = dict(create.call_args.kwargs)
+        self.assertTrue(params.pop("newClientOrderId").startswith("ncb"))
+        self.assertEqual(params, {
+            "quantity": "9.9", "side": "SELL", "symbol": "RAREUSDT", "type": "limit", "price": "3.4557",
+            "timeInForce": "GTC"
+        })
+
+    def test_limit_sell_below_min_notional_is_not_sent(self):
+        client = binance_offline()
+        config = SimpleNamespace(QUANTITY=30, LIMIT_SELL_PERCENT=10)
+        ticker = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+        with mock.patch.object(Config, "TEST", False), \
+                mock.patch.object(client.rules, "fetch", return_value=INFO), \
+                mock.patch("binance.client.Client.create_order") as create:
+            with self.assertRaises(BelowMinNotionalException):
+                client.place_order(config, ticker=ticker, size=1.5, side="SELL", current_price=1, buy_price=3)
+        create.assert_not_called()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from util.scheduler import Scheduler
+
+
+class TestScheduler(TestCase):
+    def test_precise_wakeup(self):
+        scheduler = Scheduler()
+
+        async def run():
+            for _ in range(5):
+                await scheduler.sleep_until(time.time() + 0.02, precise=True)
+
+        asyncio.run(run())
+        # the spin never wakes up early, how late depends on the load of the host
+        self.assertEqual(scheduler.jitter.summary()["count"], 5)
+        self.assertGreaterEqual(min(scheduler.jitter.samples), 0)
+        self.assertLess(scheduler.jitter.summary()["max"], 0.02)
+
+    def test_wake_from_thread(self):
+        scheduler = Scheduler()
+        threading.Timer(0.2, scheduler.wake).start()
+
+        async def run():
+            # the first sleep only binds the scheduler to the loop
+            await scheduler.sleep_until(time.time())
+            return await scheduler.sleep_until(time.time() + 5)
+
+        t = time.perf_counter()
+        self.assertFalse(asyncio.run(run()))
+        self.assertLess(time.perf_counter() - t, 1)
+
+    def test_wake_while_running_is_kept(self):
+        scheduler = Scheduler()
+
+        async def run():
+            await scheduler.sleep_until(time.time())
+            # a stream detection while the bot runs, before it goes back to sleep
+            scheduler.wake()
+            await asyncio.sleep(0.01)
+            return await scheduler.sleep_until(time.time() + 5)
+
+        t = time.perf_counter()
+        self.assertFalse(asyncio.run(run()))
+        self.assertLess(time.perf_counter() - t, 1)
+
+    def test_max_sleep(self):
+        scheduler = Scheduler(max_sleep_seconds=0.05)
+
+        async def run():
+            return await scheduler.sleep_until(time.time() + 5)
+
+        t = time.perf_counter()
+        self.assertFalse(asyncio.run(run()))
+        self.assertLess(time.perf_counter() - t, 1)
@@ -0,0 +1,191 @@
+import calendar
+import time
+from threading import Event
+from unittest import TestCase, mock
+
+import scraper
+from util import Config
+
+PAGES_DIR = Config.TEST_DIR.joinpath("pages")
+
+
+def read_page(url, conditional=False):
+    if url == scraper.ANNOUNCEMENT_URL:
+        return PAGES_DIR.joinpath("announcement_list.html").read_text()
+    code = url.rsplit("/", 1)[-1]
+    if code == "abccb898c2144bfda3647031b2a60bc7":
+        return Config.ROOT_DIR.joinpath("source.txt").read_text()
+    return PAGES_DIR.joinpath(f"article_{code}.html").read_text()
+
+
+class TestScraper(TestCase):
+    def setUp(self) -> None:
+        scraper.article_cache.clear()
+
+    def test_parse_announcements(self):
+        articles = scraper.parse_announcements(read_page(scraper.ANNOUNCEMENT_URL))
+        self.assertEqual(len(articles), 7)
+        self.assertEqual(articles[0]["code"], "abccb898c2144bfda3647031b2a60bc7")
+        self.assertEqual(articles[0]["title"], "Binance Will List SuperRare (RARE)")
+
+    def test_parse_article_text(self):
+        text = scraper.parse_article_text(Config.ROOT_DIR.joinpath("source.txt").read_text())
+        self.assertTrue(text.startswith("Binance Will List SuperRare (RARE) Fellow Binancians,"))
+        self.assertIn("Binance will list SuperRare (RARE)", text)
+        self.assertNotIn("&nbsp;", text)
+
+    def test_get_candidates_http(self):
+        with mock.patch.object(scraper, "fetch_page", side_effect=read_page) as fetch_page:
+            candidates = scraper.get_candidates_http()
+
+        self.assertEqual(
+            candidates,
+            [("RARE", "2021-10-11 06:00"), ("DAR", "2021-11-04 06:00"), ("MBOX", "2021-10-12 06:00")],
+        )
+        # list page + one request per announcement with a symbol in its title
+        self.assertEqual(fetch_page.call_count, 5)
+
+    def test_pick_next_listing(self):
+        candidates = [("RARE", "2021-10-11 06:00"), ("DAR", "2021-11-04 06:00"), ("MBOX", "2021-10-12 06:00")]
+        now = calendar.timegm(time.strptime("2021-10-10 00:00", "%Y-%m-%d %H:%M"))
+        self.assertEqual(scraper.pick_next_listing(candidates, now), ("RARE", "2021-10-11 06:00"))
+
+        now = calendar.timegm(time.strptime("2021-10-11 12:00", "%Y-%m-%d %H:%M"))
+        self.assertEqual(scraper.pick_next_listing(candidates, now), ("MBOX", "2021-10-12 06:00"))
+
+        now = calendar.timegm(time.strptime("2021-12-01 00:00", "%Y-%m-%d %H:%M"))
+        self.assertEqual(scraper.pick_next_listing(candidates, now), (None, None))
+
+    def test_search_and_update_in_the_time_of_its_clock(self):
+        candidates = [("RARE", "2021-10-11 06:00"), ("MBOX", "2021-10-12 06:00")]
+        now = calendar.timegm(time.strptime("2021-10-11 12:00", "%Y-%m-%d %H:%M"))
+        with mock.patch.object(scraper, "get_candidates", return_value=candidates), \
+                mock.patch.object(scraper, "calendar", scraper.ListingCalendar()), \
+                mock.patch.object(scraper, "send_notification_telegram"):
+            self.assertEqual(scraper.search_and_update(clock=lambda: now), ("MBOX", "2021-10-12 06:00"))
+            self.assertEqual(scraper.calendar.peek()[0], "MBOX")
+
+    def test_get_candidates_http_concurrent(self):
+        def slow_page(url, conditional=False):
+            if url != scraper.ANNOUNCEMENT_URL:
+                time.sleep(0.2)
+            return read_page(url)
+
+        t = time.perf_counter()
+        with mock.patch.object(scraper, "fetch_page", side_effect=slow_page):
+            candidates = scraper.get_candidates_http()
+        elapsed = time.perf_counter() - t
+
+        self.assertEqual(len(candidates), 3)
+        # 4 articles are fetched, in parallel they take about one round-trip
+        self.assertLess(elapsed, 0.6)
+
+    def test_get_candidates_http_failed_and_slow_slots(self):
+        def flaky_page(url, conditional=False):
+            if url.endswith("5e1a4f16f8b64c5fa4b8b7b0f1b7c1d2"):
+                raise ConnectionError("slot down")
+            if url.endswith("0c8f2a7e3b4d4f6a9e1d2c3b4a5f6e7d"):
+                time.sleep(1)
+            return read_page(url)
+
+        t = time.perf_counter()
+        with mock.patch.object(scraper, "fetch_page", side_effect=flaky_page), \
+                mock.patch.dict(scraper.resources.options, {"TIMEOUT_SECONDS": 0.3}):
+            candidates = scraper.get_candidates_http()
+
+        self.assertLess(time.perf_counter() - t, 0.9)
+        self.assertEqual(candidates, [("RARE", "2021-10-11 06:00")])
+
+    def test_article_cache(self):
+        with mock.patch.object(scraper, "fetch_page", side_effect=read_page) as fetch_page:
+            first = scraper.get_candidates_http()
+            second = scraper.get_candidates_http()
+
+        self.assertEqual(first, second)
+        # the second scrape only fetches the list page
+        self.assertEqual(fetch_page.call_count, 5 + 1)
+        self.assertEqual(scraper.article_cache.hits, 6)
+        self.assertEqual(scraper.article_cache.misses, 6)
+
+    def test_empty_result_expires(self):
+        # the Launchpad announcement of LAZIO names a symbol but no listing time
+        with mock.patch.object(scraper, "fetch_page", side_effect=read_page) as fetch_page, \
+                mock.patch.object(scraper, "EMPTY_RESULT_SECONDS", 0):
+            scraper.get_candidates_http()
+            scraper.get_candidates_http()
+
+        # the list page again and the announcement without a listing time
+        self.assertEqual(fetch_page.call_count, 5 + 2)
+        self.assertIn(mock.call(scraper.ARTICLE_URL.format(code="7e2ab0778e4b409d857dedcb2d4da175")),
+                      fetch_page.call_args_list[5:])
+
+    def test_list_page_not_modified(self):
+        def not_modified(url, conditional=False):
+            if url == scraper.ANNOUNCEMENT_URL and conditional:
+                return None
+            return read_page(url)
+
+        with mock.patch.object(scraper, "fetch_page", side_effect=read_page):
+            first = scraper.get_candidates_http()
+        not_modified_before = scraper.list_page_stats["not_modified"]
+        with mock.patch.object(scraper, "fetch_page", side_effect=not_modified) as fetch_page:
+            second = scraper.get_candidates_http()
+
+        self.assertEqual(first, second)
+        self.assertEqual(fetch_page.call_count, 1)
+        self.assertEqual(scraper.list_page_stats["not_modified"], not_modified_before + 1)
+
+    def test_scrape_worker(self):
+        results = iter([(None, None), ("RARE", "2021-10-11 06:00")])
+
+        def slow_scrape():
+            time.sleep(0.2)
+            return next(results, (None, None))
+
+        found = Event()
+        worker = scraper.ScrapeWorker(interval=60, scrape=slow_scrape)
+        worker.subscribe(found.set)
+        worker.start()
+        try:
+            # the first scrape finds nothing, the one requested finds the listing
+            self.assertFalse(found.wait(0.1))
+            worker.request_scrape()
+            self.assertTrue(found.wait(2))
+            self.assertEqual(worker.scrapes, 2)
+        finally:
+            worker.stop()
+
+    def test_first_scrape_wakes_the_listeners(self):
+        found = Event()
+        with mock.patch.object(scraper, "worker", None), \
+                mock.patch.object(scraper, "search_and_update", return_value=("RARE", "2021-10-11 06:00")):
+            worker = scraper.start_worker(60, listeners=[found.set])
+            try:
+                self.assertTrue(found.wait(2))
+            finally:
+                worker.stop()
+
+    def test_resources_lazy_and_restart(self):
+        class FakeDriver:
+            crashed = False
+
+            @property
+            def current_url(self):
+                if self.crashed:
+                    raise ConnectionError("chrome not reachable")
+                return scraper.ANNOUNCEMENT_URL
+
+            def quit(self):
+                pass
+
+        resources = scraper.ScraperResources()
+        with mock.patch.object(scraper, "start_driver", side_effect=FakeDriver) as start_driver:
+            self.assertEqual(start_driver.call_count, 0)
+            driver = resources.check_driver()
+            self.assertIs(resources.check_driver(), driver)
+            self.assertEqual(start_driver.call_count, 1)
+
+            driver.crashed = True
+            self.assertIsNot(resources.check_driver(), driver)
+            self.assertEqual(start_driver.call_count, 2)
+            self.assertEqual(resources.driver_restarts, 1)
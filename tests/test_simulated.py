@@ -0,0 +1,212 @@
+import math
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+import requests
+import yaml
+
+import scraper
+from bot import Bot
+from broker.broker import Broker
+from broker.simulated import Scenario, SimulatedApiError, SimulatedBroker, VirtualTime, interpolate
+from util import Config
+from util.listings import LISTING_TIME_FORMAT, ListingCalendar
+from util.types import Ticker
+
+CONFIG = SimpleNamespace(TAKE_PROFIT_PERCENT=30, STOP_LOSS_PERCENT=9, TRAILING_STOP_LOSS_PERCENT=8,
+                         LIMIT_SELL_PERCENT=26, QUANTITY=30)
+RARE = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+
+
+def simulated(**scenario) -> SimulatedBroker:
+    virtual = VirtualTime()
+    broker = SimulatedBroker(Scenario.parse_obj(scenario), now=virtual.time, sleep=virtual.sleep)
+    for policy in broker.retries.values():
+        policy.delay = 0.001
+    return broker
+
+
+class TestScenario(TestCase):
+    def test_load(self):
+        self.assertEqual(Scenario.load(None), Scenario())
+        self.assertEqual(Scenario.load({"listings": [{"base_ticker": "RARE", "at": 2}]}).listings[0].at, 2)
+
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        Path(root.name).joinpath("scenario.yml").write_text(yaml.dump({"seed": 7, "latency": 0.01}))
+        with mock.patch.object(Config, "ROOT_DIR", Path(root.name)):
+            scenario = Scenario.load("scenario.yml")
+        self.assertEqual((scenario.seed, scenario.latency), (7, 0.01))
+
+    def test_interpolate(self):
+        path = [(0, 1.0), (2, 2.0), (4, 1.0)]
+        self.assertEqual(interpolate(path, -1), 1.0)
+        self.assertEqual(interpolate(path, 1), 1.5)
+        self.assertEqual(interpolate(path, 3), 1.5)
+        self.assertEqual(interpolate(path, 10), 1.0)
+
+
+class TestSimulatedBroker(TestCase):
+    def test_listing_appears_at_its_time(self):
+        broker = simulated(listings=[{"base_ticker": "RARE", "at": 0.05, "prices": [(0, 2.0)]}])
+        self.assertNotIn("RAREUSDT", [t.ticker for t in broker.get_tickers("USDT")])
+        self.assertEqual(broker.probe_tickers([RARE]), [])
+        with self.assertRaises(SimulatedApiError):
+            broker.get_current_price(RARE)
+
+        broker.sleep(0.05)
+        self.assertIn("RAREUSDT", [t.ticker for t in broker.get_tickers("USDT")])
+        self.assertEqual(broker.probe_tickers([RARE]), [RARE])
+        self.assertEqual(broker.get_current_price(RARE), 2.0)
+
+    def test_latency(self):
+        broker = simulated(latency=0.02, jitter=0.01)
+        broker.get_tickers("USDT")
+        self.assertTrue(0.02 <= broker.elapsed() <= 0.03)
+
+    def test_local_clock(self):
+        broker = SimulatedBroker(Scenario(latency=0.02))
+        start = time.perf_counter()
+        broker.get_tickers("USDT")
+        self.assertTrue(0.02 <= time.perf_counter() - start < 0.1)
+
+    def test_errors_are_retried(self):
+        broker = simulated(seed=3, error_rate=0.5)
+        for _ in range(10):
+            broker.get_current_price(Ticker(ticker="BTCUSDT", base_ticker="BTC", quote_ticker="USDT"))
+        self.assertGreater(broker.failed, 0)
+        self.assertEqual(broker.retries["price"].retries, broker.failed)
+
+    def test_same_seed_same_run(self):
+        runs = []
+        for _ in range(2):
+            broker = simulated(seed=11, latency=0.01, jitter=0.01, error_rate=0.3,
+                               listings=[{"base_ticker": "RARE", "at": 0.3, "prices": [(0, 1.0), (1, 2.0)]}])
+            order = broker.place_order(CONFIG, ticker=RARE, side="BUY", size=30, deadline=broker.clock.now() + 5)
+            runs.append((broker.failed, broker.requests, broker.elapsed(), order.price))
+        self.assertEqual(runs[0], runs[1])
+        self.assertGreater(runs[0][0], 0)
+
+    def test_concurrent_orders_get_their_own_ids(self):
+        broker = simulated(latency=0.001, listings=[{"base_ticker": "RARE"}])
+        ids = []
+        threads = [
+            threading.Thread(target=lambda: ids.append(broker.place_order(CONFIG, ticker=RARE, side="BUY", size=30).orderId))
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 20)
+        self.assertEqual(len(broker.orders), 20)
+
+    def test_outage(self):
+        broker = simulated(outages=[(0, 10)])
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            broker.get_tickers("USDT")
+        self.assertEqual(broker.retries["tickers"].give_ups, 1)
+
+    def test_rate_limit(self):
+        broker = simulated(rate_limit=3, rate_limit_seconds=10)
+        for _ in range(3):
+            broker.request("ping")
+        with self.assertRaises(SimulatedApiError) as raised:
+            broker.request("ping")
+        self.assertEqual(raised.exception.status_code, 429)
+        self.assertEqual(broker.rate_limited, 1)
+
+    def test_buy_before_the_listing_is_retried_until_it_trades(self):
+        broker = simulated(listings=[{"base_ticker": "RARE", "at": 0.05, "prices": [(0, 3.0)]}])
+        order = broker.place_order(CONFIG, ticker=RARE, side="BUY", size=30, deadline=broker.clock.now() + 1)
+        self.assertEqual((order.price, order.size), (3.0, 10.0))
+        self.assertGreater(broker.retries["buy"].retries, 0)
+
+    def test_limit_sell_fills_at_its_price(self):
+        broker = simulated(listings=[{"base_ticker": "RARE", "prices": [(0, 1.0), (0.1, 2.0)]}])
+        sell = broker.place_order(CONFIG, ticker=RARE, side="SELL", size=10, current_price=0.5, buy_price=1.0)
+        self.assertEqual((sell.type, sell.price), ("limit", 1.13))
+        self.assertEqual(broker.check_order(sell)["executedQty"], "0")
+        broker.sleep(0.1)
+        self.assertEqual(float(broker.check_order(sell)["executedQty"]), 10)
+        with self.assertRaises(SimulatedApiError):
+            broker.cancel(sell)
+
+    def test_fill_modes(self):
+        for fills, executed in (("always", 10), ("never", 0)):
+            broker = simulated(fills=fills, listings=[{"base_ticker": "RARE", "prices": [(0, 1.0)]}])
+            sell = broker.place_order(CONFIG, ticker=RARE, side="SELL", size=10, current_price=1, buy_price=1.0)
+            self.assertEqual(float(broker.check_order(sell)["executedQty"]), executed)
+        self.assertEqual(broker.cancel(sell)["status"], "CANCELED")
+
+    def test_market_sell(self):
+        broker = simulated(fills="never", listings=[{"base_ticker": "RARE", "prices": [(0, 1.5)]}])
+        sell = broker.place_order(CONFIG, ticker=RARE, side="SELL", size=10, current_price=-1, buy_price=1.0)
+        self.assertEqual((sell.type, sell.price), ("market", 1.5))
+        self.assertEqual(broker.check_order(sell)["status"], "FILLED")
+
+
+class TestSimulatedBot(TestCase):
+    def setUp(self) -> None:
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        shutil.copy(Config.ROOT_DIR.joinpath("version.json"), self.root)
+
+        # the exchange runs 0.5s into the minute of the listing, its symbol trades 0.3s later
+        listing = math.ceil(time.time() / 60) * 60
+        self.scenario = {
+            "seed": 1, "latency": 0.002, "jitter": 0.002, "error_rate": 0.05, "clock_offset": listing + 0.5 - time.time(),
+            "listings": [{"base_ticker": "RARE", "at": 0.3, "prices": [(0, 1.0), (0.5, 1.2), (1.0, 1.5)]}],
+        }
+        self.root.joinpath("config.yml").write_text(yaml.dump({"TRADE_OPTIONS": {"BROKERS": {"SIMULATED": dict(
+            ENABLED=True, QUANTITY=30, LIMIT_SELL_PERCENT=26, SCENARIO=self.scenario,
+        )}}}))
+        calendar = ListingCalendar()
+        calendar.add("RARE", datetime.utcfromtimestamp(listing).strftime(LISTING_TIME_FORMAT))
+
+        patches = [
+            mock.patch.multiple(Config, create=True, ROOT_DIR=self.root, TEST=False, SHARE_DATA=False,
+                                CHECK_LISTING_START_TIME=1.5, FREQUENCY_SECONDS=0.01, SELL_RETRY_SECONDS=0.01,
+                                FIRST_WARNING_TIME_MINUTES=60, SECOND_WARNING_TIME_MINUTES=10,
+                                THIRD_WARNING_TIME_SECONDS=120),
+            mock.patch.object(scraper, "calendar", calendar),
+            # nothing may leave the machine
+            mock.patch("socket.getaddrinfo", side_effect=OSError("offline")),
+            mock.patch("socket.socket.connect", side_effect=OSError("offline")),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_factory(self):
+        broker = Broker.factory("SIMULATED")
+        self.assertIsInstance(broker, SimulatedBroker)
+        self.assertEqual(broker.scenario, Scenario.parse_obj(self.scenario))
+
+    def test_listing_end_to_end(self):
+        bot = Bot("SIMULATED")
+        self.addCleanup(bot.close)
+        broker: SimulatedBroker = bot.broker
+        self.assertAlmostEqual(bot.clock.now(), broker.exchange_time(), delta=0.01)
+
+        end = time.time() + 10
+        while "RAREUSDT" not in bot.sold and time.time() < end:
+            bot.run()
+            wakeup, _ = bot.next_wakeup()
+            time.sleep(min(max(wakeup - bot.clock.now(), 0), 0.05))
+
+        self.assertIn("RAREUSDT", bot.sold)
+        buy = broker.orders["1"]
+        self.assertEqual(buy["side"], "BUY")
+        sold = bot.sold["RAREUSDT"]
+        self.assertEqual(sold.type, "limit")
+        self.assertAlmostEqual(sold.price, buy["price"] * 1.26)
+        self.assertEqual(broker.orders[sold.orderId]["status"], "FILLED")
+        self.assertIn("simulated:", broker.report())
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from unittest import TestCase, mock
+
+import websockets
+
+import scraper
+from bot import Bot
+from broker.stream import ListingStream
+from tests.test_exits import FakeExchange, offline_bot_patches, wait_for
+from util import Config
+from util.listings import LISTING_TIME_FORMAT
+
+
+def mini_tickers(*symbols) -> dict:
+    return {"stream": "!miniTicker@arr", "data": [
+        {"e": "24hrMiniTicker", "s": s, "c": "1.0", "o": "1.0", "h": "1.0", "l": "1.0", "v": "1", "q": "1"}
+        for s in symbols
+    ]}
+
+
+def trade(symbol) -> dict:
+    return {"stream": f"{symbol.lower()}@trade", "data": {
+        "e": "trade", "s": symbol, "t": 1, "p": "1.0", "q": "10", "m": False
+    }}
+
+
+class StreamServer:
+    """
+    Local stand-in for the Binance market streams, replays recorded frames stamped with the time they are sent.
+    Every connection replays the next list of frames and is closed, the last one stays open.
+    """
+
+    def __init__(self, *connections, interval: float = 0.01):
+        self.connections = deque(connections)
+        self.interval = interval
+        self.paths = []
+        self.received = []
+        self.url = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "StreamServer":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+
+    def _run(self):
+        self._loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        self._stop = asyncio.Event()
+        server = await websockets.serve(self._handler, "127.0.0.1", 0)
+        self.url = "ws://127.0.0.1:{}/stream".format(server.sockets[0].getsockname()[1])
+        self._ready.set()
+        await self._stop.wait()
+        server.close()
+        await server.wait_closed()
+
+    async def _handler(self, ws, *args):
+        # websockets < 10 passes the path, later versions keep it on the request
+        self.paths.append(args[0] if args else ws.request.path)
+        frames = self.connections.popleft() if self.connections else []
+        for frame in frames:
+            await asyncio.sleep(self.interval)
+            now = int(time.time() * 1000)
+            # combined streams wrap the events in data
+            events = frame.get("data", frame)
+            for event in events if isinstance(events, list) else [events]:
+                event["E"] = now
+            await ws.send(json.dumps(frame))
+        if self.connections:
+            return
+        try:
+            async for message in ws:
+                self.received.append(json.loads(message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+class TestListingStream(TestCase):
+    def listen(self, server, known=("BTCUSDT",)):
+        found = []
+        stream = ListingStream(server.url, "USDT", set(known).__contains__, found.append,
+                               reconnect_seconds=0.01)
+        self.addCleanup(stream.close)
+        return stream, found
+
+    def test_reports_new_symbol_once(self):
+        server = StreamServer([
+            mini_tickers("BTCUSDT", "ETHBTC"), mini_tickers("BTCUSDT", "RAREUSDT"), mini_tickers("RAREUSDT"),
+        ]).start()
+        self.addCleanup(server.stop)
+        stream, found = self.listen(server)
+        stream.start()
+
+        self.assertTrue(wait_for(lambda: stream.frames == 3))
+        self.assertEqual([(t.ticker, t.base_ticker, t.quote_ticker) for t in found], [("RAREUSDT", "RARE", "USDT")])
+        self.assertEqual(stream.latency.count, 1)
+        self.assertIn("streams=!miniTicker@arr", server.paths[0])
+
+    def test_reconnects_with_watched_symbol(self):
+        server = StreamServer([mini_tickers("BTCUSDT")], [trade("RAREUSDT")]).start()
+        self.addCleanup(server.stop)
+        stream, found = self.listen(server)
+        stream.watch("RAREUSDT")
+        stream.start()
+
+        self.assertTrue(wait_for(lambda: found))
+        self.assertEqual(found[0].ticker, "RAREUSDT")
+        self.assertGreaterEqual(stream.reconnects, 1)
+        self.assertTrue(all(path.endswith("!miniTicker@arr/rareusdt@trade") for path in server.paths))
+
+    def test_watch_subscribes_while_connected(self):
+        server = StreamServer().start()
+        self.addCleanup(server.stop)
+        stream, _ = self.listen(server)
+        stream.start()
+        self.assertTrue(stream.connected.wait(2))
+
+        stream.watch("RAREUSDT")
+        stream.watch("RAREUSDT")
+        self.assertTrue(wait_for(lambda: server.received))
+        self.assertEqual(server.received, [{"method": "SUBSCRIBE", "params": ["rareusdt@trade"], "id": 1}])
+
+
+class StreamingExchange(FakeExchange):
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+
+    def listing_stream(self, quote_ticker, is_known, on_new):
+        return ListingStream(self.url, quote_ticker, is_known, on_new, reconnect_seconds=0.01)
+
+
+class TestBotStreamDetection(TestCase):
+    def test_buys_on_first_trade(self):
+        # the trade frame is sent once the bot is armed and listening
+        server = StreamServer([], [trade("RAREUSDT")], interval=0.05).start()
+        self.addCleanup(server.stop)
+        exchange = StreamingExchange(server.url)
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        patches = offline_bot_patches(Path(root.name), exchange) + [mock.patch.object(Config, "STREAM_DETECTION", True)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        scraper.calendar.add("RARE", datetime.utcnow().strftime(LISTING_TIME_FORMAT))
+        bot = Bot("BINANCE")
+        self.addCleanup(bot.close)
+        bot.scrape_the_fucking_shit_m8()
+
+        self.assertTrue(wait_for(lambda: "RAREUSDT" in bot.orders))
+        self.assertTrue(bot.ticker_seen_dict["RAREUSDT"])
+        self.assertEqual(bot.orders["RAREUSDT"].side, "BUY")
@@ -0,0 +1,118 @@
+import time
+from datetime import datetime
+from unittest import TestCase, mock
+
+from broker.fills import FillWatcher
+from broker.userdata import OrderBook, UserDataStream
+from tests.test_exits import wait_for
+from tests.test_prepared import binance_offline
+from tests.test_stream import StreamServer
+from util.types import Order, Ticker
+
+TICKER = Ticker(ticker="RAREUSDT", base_ticker="RARE", quote_ticker="USDT")
+
+
+def report(status, executed="0", order_id=7, update_time=1) -> dict:
+    return {
+        "e": "executionReport", "s": "RAREUSDT", "c": "sell-7", "S": "SELL", "o": "LIMIT", "X": status,
+        "i": order_id, "q": "10", "z": executed, "Z": str(float(executed) * 1.26), "T": update_time,
+    }
+
+
+def order_status(status, executed="0", order_id=7, update_time=1) -> dict:
+    return {
+        "symbol": "RAREUSDT", "orderId": order_id, "status": status, "origQty": "10", "executedQty": executed,
+        "updateTime": update_time,
+    }
+
+
+def sell_order(order_id="7") -> Order:
+    return Order(
+        broker="BINANCE", ticker=TICKER, purchase_datetime=datetime.now(), price=1.26, side="SELL", size=10,
+        type="limit", status="LIVE", orderId=order_id, take_profit=1, stop_loss=1, trailing_stop_loss_max=1,
+        trailing_stop_loss=1,
+    )
+
+
+class TestOrderBook(TestCase):
+    def test_newer_status_wins(self):
+        book = OrderBook()
+        changes = []
+        book.subscribe(lambda: changes.append(1))
+        book.apply_report(report("NEW"))
+        book.apply_report(report("PARTIALLY_FILLED", "4", update_time=2))
+        # the response of the order placement arrives after its first events
+        book.apply_status(order_status("NEW"))
+        self.assertEqual(book.status("7")["status"], "PARTIALLY_FILLED")
+        self.assertEqual(book.status(7)["executedQty"], "4")
+
+        book.apply_report(report("FILLED", "10", update_time=3))
+        book.apply_status(order_status("PARTIALLY_FILLED", "4", update_time=2))
+        self.assertEqual(book.status("7")["status"], "FILLED")
+        self.assertEqual(book.open_orders(), [])
+        self.assertEqual(len(changes), 3)
+
+
+class TestUserDataStream(TestCase):
+    def setUp(self) -> None:
+        self.client = binance_offline()
+        for patcher in [
+            mock.patch.object(self.client, "stream_get_listen_key", return_value="listen-key"),
+            mock.patch.object(self.client, "stream_keepalive"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def listen(self, *connections, interval=0.01) -> UserDataStream:
+        server = StreamServer(*connections, interval=interval).start()
+        self.addCleanup(server.stop)
+        self.server = server
+        stream = UserDataStream(self.client, server.url.rsplit("/", 1)[0] + "/ws", reconnect_seconds=0.01)
+        self.client.user_stream = stream
+        self.addCleanup(self.client.stop_user_stream)
+        return stream
+
+    def test_check_order_reads_the_stream(self):
+        stream = self.listen([report("NEW"), report("PARTIALLY_FILLED", "4", update_time=2),
+                              report("FILLED", "10", update_time=3)])
+        with mock.patch("binance.client.Client.get_order") as get_order:
+            stream.start()
+            self.assertTrue(wait_for(lambda: stream.events == 3))
+            status = self.client.check_order(sell_order())
+            get_order.assert_not_called()
+        self.assertEqual(status["status"], "FILLED")
+        self.assertEqual(self.server.paths, ["/ws/listen-key"])
+
+    def test_resync_after_reconnect(self):
+        # the fill happens while the stream is disconnected
+        stream = self.listen([report("NEW")], [])
+        with mock.patch("binance.client.Client.get_order",
+                        return_value=order_status("FILLED", "10", update_time=2)) as get_order:
+            stream.start()
+            self.assertTrue(wait_for(lambda: stream.resyncs == 1))
+            get_order.assert_called_once_with(symbol="RAREUSDT", orderId=7)
+        self.assertGreaterEqual(stream.reconnects, 1)
+        self.assertEqual(self.client.user_stream.book.status("7")["status"], "FILLED")
+
+    def test_unknown_order_falls_back_to_rest(self):
+        stream = self.listen([])
+        with mock.patch("binance.client.Client.get_order", return_value=order_status("NEW", order_id=8)) as get_order:
+            stream.start()
+            self.assertTrue(stream.connected.wait(2))
+            self.client.check_order(sell_order("8"))
+            self.client.check_order(sell_order("8"))
+            get_order.assert_called_once()
+
+    def test_fill_wakes_the_watcher(self):
+        stream = self.listen([report("NEW"), report("FILLED", "10", update_time=2)], interval=0.1)
+        watcher = FillWatcher(self.client, poll_seconds=30)
+        self.addCleanup(watcher.close)
+        stream.book.subscribe(watcher.wake)
+        self.client.track_order(order_status("NEW"))
+
+        stream.start()
+        self.assertTrue(stream.connected.wait(2))
+        start = time.time()
+        filled = watcher.watch(sell_order(), time.time() + 60)
+        self.assertTrue(filled.result(timeout=2))
+        self.assertLess(time.time() - start, 1)
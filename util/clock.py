@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, NoReturn, Optional, Tuple
+
+
+class ExchangeClock:
+    """
+    Time of the exchange, estimated from its server time the way NTP does: every sample measures the offset
+    against the midpoint of its round trip, and the sample with the smallest error wins, the error being half
+    its round trip plus the resolution of the server time plus the drift since it was taken.
+    now() runs on the monotonic clock from a fixed origin, so it never jumps when the system clock is adjusted,
+    the offset absorbs the difference to the exchange.
+    Without server_time, or before a sample succeeded, now() is the local clock.
+    wall and monotonic are the local clocks, a simulation passes its own.
+    """
+
+    # half the resolution of the millisecond server time, in seconds
+    RESOLUTION = 0.0005
+    # frequency error the local clock is assumed to have at most, as NTP does
+    MAX_DRIFT = 15e-6
+
+    def __init__(
+            self, server_time: Optional[Callable[[], float]] = None, max_samples: int = 8,
+            wall: Callable[[], float] = time.time, monotonic: Callable[[], float] = time.monotonic
+    ) -> NoReturn:
+        self.server_time = server_time
+        self.monotonic = monotonic
+        # (local time of the sample, round trip, offset)
+        self.samples = deque(maxlen=max_samples)
+        self.offset = 0.0
+        self.error: Optional[float] = None
+        self.rtt: Optional[float] = None
+        self.failures = 0
+
+        self._origin_wall = wall()
+        self._origin = monotonic()
+        self._lock = threading.Lock()
+
+    def local(self) -> float:
+        """
+        Local timestamp that only moves forward, time.time() as of the start
+        """
+        return self._origin_wall + self.monotonic() - self._origin
+
+    def now(self) -> float:
+        """
+        Timestamp of the exchange, in seconds
+        """
+        return self.local() + self.offset
+
+    def sample(self) -> bool:
+        """
+        Takes one sample of the server time. Returns False if it failed
+        """
+        if self.server_time is None:
+            return False
+        sent = self.local()
+        try:
+            server = self.server_time()
+        except Exception:
+            self.failures += 1
+            return False
+        received = self.local()
+        with self._lock:
+            self.samples.append((received, received - sent, server - (sent + received) / 2))
+            self._select(received)
+        return True
+
+    def sync(self, samples: int = 4) -> bool:
+        """
+        Takes a burst of samples, the fastest of their round trips sets the offset
+        """
+        results = [self.sample() for _ in range(samples)]
+        return any(results)
+
+    def sample_error(self, sample: Tuple[float, float, float], now: float = None) -> float:
+        now = self.local() if now is None else now
+        taken, rtt, _ = sample
+        return rtt / 2 + self.RESOLUTION + (now - taken) * self.MAX_DRIFT
+
+    def report(self) -> str:
+        if self.error is None:
+            return "clock: no exchange time, {} failed samples".format(self.failures)
+        with self._lock:
+            self._select(self.local())
+            return "clock: offset {:+.1f}ms ±{:.1f}ms (rtt {:.1f}ms, {} samples, {} failed)".format(
+                self.offset * 1000, self.error * 1000, self.rtt * 1000, len(self.samples), self.failures
+            )
+
+    def _select(self, now: float) -> NoReturn:
+        best = min(self.samples, key=lambda s: self.sample_error(s, now))
+        self.offset = best[2]
+        self.rtt = best[1]
+        self.error = self.sample_error(best, now)
@@ -39,6 +39,18 @@ class Config:
     TEST_DIR = ROOT_DIR.joinpath("tests")
 
     FREQUENCY_SECONDS = 10
+    # while the expected symbol is probed, how often all tickers are still compared
+    FULL_SCAN_SECONDS = 1
+    # also detect new symbols on the websocket market streams, where the broker has them
+    STREAM_DETECTION = False
+    # order and fill updates from the user data stream instead of polls, where the broker has it
+    USER_DATA_STREAM = False
+    # seconds before a listing the connections to the broker are opened
+    WARMUP_SECONDS = 10
+    # API hosts every detection call is sent to, 1 sends it to a single host
+    HEDGE_HOSTS = 1
+    # 0 sends to all of them at once, otherwise to the next one after this percentile of the latency of the last
+    HEDGE_PERCENTILE = 90
     TEST = True
     ENABLED_BROKERS = []
 
@@ -68,6 +80,11 @@ class Config:
         self.ENABLE_TRAILING_STOP_LOSS = True
         self.TRAILING_STOP_LOSS_PERCENT = 10
         self.TRAILING_STOP_LOSS_ACTIVATION = 35
+        self.LIMIT_SELL_PERCENT = 26
+        self.LIMIT_SELL_SECONDS = 6
+        self.MARKET_SELL_SECONDS = 10
+        # script of the SIMULATED broker
+        self.SCENARIO = None
 
         self.load_broker_config(broker, file)
         self.CURRENT_VERSION, self.LATEST_VERSION, self.OUTDATED = self.load_version()
@@ -78,7 +95,12 @@ class Config:
         current_version = int(current_versions['tradingBotNewCoins'])
         current_version_mn = int(current_versions['multiNotification'])
 
-        latest_versions = json.loads(requests.get(self.VERSION_URL).text)
+        try:
+            latest_versions = json.loads(requests.get(self.VERSION_URL, timeout=10).text)
+        except (requests.exceptions.RequestException, ValueError):
+            # offline, the update check waits for the next config reload
+            logger.warning("Could not check for updates at [{}]".format(self.VERSION_URL))
+            return current_version, current_version, False
         latest_version = int(latest_versions['tradingBotNewCoins'])
         latest_version_mn = int(latest_versions['multiNotification'])
 
@@ -1,11 +1,17 @@
 from decorator import decorator
+import asyncio
+import functools
 import random
+import threading
 import time
 import logging
 from functools import partial
+from typing import Any, Awaitable, Callable, NoReturn, Optional
 import requests
 import urllib3
 
+from util.exceptions import CircuitOpenException
+
 logger_ = logging.getLogger(__name__)
 logging_logger = logging.getLogger(__name__)
 
@@ -157,3 +163,209 @@ def retry_call(
         jitter,
         logger,
     )
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Network errors, timeouts, rate limits and server errors are worth another attempt, a rejected request is not
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          urllib3.exceptions.HTTPError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = error.response.status_code
+    # 418 is a ban, more requests only make it longer
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+
+class CircuitBreaker:
+    """
+    Fails the calls of an endpoint right away once threshold calls in a row failed, instead of sending more
+    requests to an endpoint that is down. After reset_seconds a single trial call goes through, its result
+    closes the circuit or opens it again.
+    """
+
+    def __init__(
+            self, name: str, threshold: int = 5, reset_seconds: float = 10,
+            clock: Callable[[], float] = time.monotonic
+    ) -> NoReturn:
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.opened = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.clock() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self) -> NoReturn:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> NoReturn:
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = self.clock()
+                self.opened += 1
+            self._trial = False
+
+
+class RetryPolicy:
+    """
+    Retries the calls of an endpoint, sync or async, on the errors retryable classifies as transient,
+    with a jittered exponential backoff. A call gives up after tries attempts, or when the next attempt would
+    start after its deadline, a timestamp of clock, by default timeout seconds after the call started.
+    Giving up raises the last error. The optional circuit breaker fails calls fast while the endpoint is down,
+    down classifies which retryable errors count against it, by default all of them.
+    Used as a decorator, or through run / run_async for a deadline per call. run pauses with sleep.
+    """
+
+    def __init__(
+            self, name: str, retryable: Callable[[BaseException], bool] = is_retryable, tries: int = 3,
+            delay: float = 0.1, backoff: float = 2, max_delay: float = 5, jitter: float = 0.5,
+            timeout: Optional[float] = None, breaker: Optional[CircuitBreaker] = None,
+            clock: Callable[[], float] = time.time, logger=logging_logger,
+            down: Optional[Callable[[BaseException], bool]] = None, sleep: Callable[[float], Any] = time.sleep
+    ) -> NoReturn:
+        self.name = name
+        self.retryable = retryable
+        self.down = retryable if down is None else down
+        self.tries = tries
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.timeout = timeout
+        self.breaker = breaker
+        self.clock = clock
+        self.sleep = sleep
+        self.logger = logger
+        # metrics
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.give_ups = 0
+        self.rejected = 0
+
+    def __call__(self, f: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(f):
+            @functools.wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                return await self.run_async(f, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            return self.run(f, *args, **kwargs)
+        return wrapper
+
+    def run(self, f: Callable[..., Any], *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        deadline = self._deadline(deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_attempt()
+            try:
+                result = f(*args, **kwargs)
+            except Exception as e:
+                pause = self._after_failure(e, attempt, deadline)
+                if pause is None:
+                    raise
+                self.sleep(pause)
+                continue
+            self._after_success()
+            return result
+
+    async def run_async(
+            self, f: Callable[..., Awaitable[Any]], *args, deadline: Optional[float] = None, **kwargs
+    ) -> Any:
+        deadline = self._deadline(deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            self._before_attempt()
+            try:
+                result = await f(*args, **kwargs)
+            except Exception as e:
+                pause = self._after_failure(e, attempt, deadline)
+                if pause is None:
+                    raise
+                await asyncio.sleep(pause)
+                continue
+            self._after_success()
+            return result
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Pause after the attempt-th attempt, jittered down by up to jitter of it so that clients do not retry in step
+        """
+        pause = min(self.max_delay, self.delay * self.backoff ** (attempt - 1))
+        return pause * (1 - self.jitter * random.random())
+
+    def report(self) -> str:
+        return "{}: {} calls, {} attempts, {} retries, {} given up, {} rejected{}".format(
+            self.name, self.calls, self.attempts, self.retries, self.give_ups, self.rejected,
+            "" if self.breaker is None else ", circuit {} (opened {}x)".format(self.breaker.state, self.breaker.opened)
+        )
+
+    def _deadline(self, deadline: Optional[float]) -> Optional[float]:
+        self.calls += 1
+        if self.timeout is not None:
+            timeout_at = self.clock() + self.timeout
+            deadline = timeout_at if deadline is None else min(deadline, timeout_at)
+        return deadline
+
+    def _before_attempt(self) -> NoReturn:
+        if self.breaker is not None and not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenException(f"{self.name}: circuit open after {self.breaker.failures} failures")
+        self.attempts += 1
+
+    def _after_success(self) -> NoReturn:
+        if self.breaker is not None:
+            self.breaker.success()
+
+    def _after_failure(self, error: Exception, attempt: int, deadline: Optional[float]) -> Optional[float]:
+        """
+        Pause before the next attempt, None to give up
+        """
+        retryable = self.retryable(error)
+        if self.breaker is not None:
+            # a rejected request is an answer, the endpoint is up
+            if retryable and self.down(error):
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+        if not retryable:
+            return None
+        pause = self.backoff_delay(attempt)
+        if (self.tries != -1 and attempt >= self.tries) or (deadline is not None and self.clock() + pause > deadline):
+            self.give_ups += 1
+            if self.logger is not None:
+                self.logger.warning("%s: giving up after %s attempts: %r", self.name, attempt, error)
+            return None
+        self.retries += 1
+        if self.logger is not None:
+            self.logger.warning("%s: %r, retrying in %.3f seconds", self.name, error, pause)
+        return pause
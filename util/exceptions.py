@@ -62,3 +62,21 @@ class BrokerDownException(BaseException):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
+
+
+class CircuitOpenException(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class BelowMinNotionalException(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class OrderStatusUnknownException(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
@@ -0,0 +1,116 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, NoReturn
+
+from pydantic import BaseModel
+
+from util.util import json_serial
+
+
+class Journal:
+    """
+    Append-only log of order, sell and bot state events, one json object per line.
+    Replaying it rebuilds the open orders, the sold trades and the stage of the current listing after a restart.
+    Every compact_every events it is compacted to a single snapshot event.
+    Lines are flushed to the OS on every append, fsync=True also survives a power loss.
+    """
+
+    def __init__(self, file: Path, compact_every: int = 1000, fsync: bool = False) -> NoReturn:
+        self.file = Path(file)
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self.orders: Dict[str, dict] = {}
+        self.sold: Dict[str, dict] = {}
+        self.state: Dict[str, Any] = {}
+        # events in the file, the snapshot included
+        self.entries = 0
+        self._f = None
+
+    def replay(self) -> "Journal":
+        """
+        Rebuilds the state from the file. A line cut short by a crash ends the replay
+        """
+        self.orders, self.sold, self.state = {}, {}, {}
+        self.entries = 0
+        torn = False
+        if self.file.exists():
+            with open(self.file, "r") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        torn = True
+                        break
+                    self._apply(event)
+                    self.entries += 1
+                    torn = not line.endswith("\n")
+        # appending after a torn line would corrupt the next event
+        if torn or self.entries >= self.compact_every:
+            self.compact()
+        return self
+
+    def record_order(self, key: str, order: BaseModel) -> NoReturn:
+        self.append({"type": "order", "key": key, "data": order.dict()})
+
+    def record_sold(self, key: str, sold: BaseModel) -> NoReturn:
+        self.append({"type": "sold", "key": key, "data": sold.dict()})
+
+    def record_remove(self, key: str) -> NoReturn:
+        self.append({"type": "remove", "key": key})
+
+    def record_state(self, **state) -> NoReturn:
+        self.append({"type": "state", "data": state})
+
+    def append(self, event: dict) -> NoReturn:
+        line = json.dumps(event, default=json_serial)
+        # applied as it will be read back
+        self._apply(json.loads(line))
+        f = self._open()
+        f.write(line + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self.entries += 1
+        if self.entries >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> NoReturn:
+        """
+        Replaces the file with a single snapshot of the current state
+        """
+        self.close()
+        tmp = Path(str(self.file) + ".tmp")
+        with open(tmp, "w") as f:
+            f.write(json.dumps(
+                {"type": "snapshot", "orders": self.orders, "sold": self.sold, "state": self.state},
+                default=json_serial,
+            ) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.file)
+        self.entries = 1
+
+    def close(self) -> NoReturn:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def _open(self):
+        if self._f is None:
+            self._f = open(self.file, "a")
+        return self._f
+
+    def _apply(self, event: dict) -> NoReturn:
+        kind = event["type"]
+        if kind == "order":
+            self.orders[event["key"]] = event["data"]
+        elif kind == "sold":
+            self.sold[event["key"]] = event["data"]
+        elif kind == "remove":
+            self.orders.pop(event["key"], None)
+        elif kind == "state":
+            self.state.update(event["data"])
+        elif kind == "snapshot":
+            self.orders, self.sold, self.state = event["orders"], event["sold"], event["state"]
@@ -0,0 +1,129 @@
+import calendar
+import heapq
+import json
+import os
+import time
+from pathlib import Path
+from threading import RLock
+from typing import List, NoReturn, Optional, Tuple
+
+LISTING_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def listing_timestamp(list_time: str) -> float:
+    # announcements are in UTC, mktime would read them as local time
+    return calendar.timegm(time.strptime(list_time, LISTING_TIME_FORMAT))
+
+
+class ListingCalendar:
+    """
+    Upcoming listings ordered by listing time and de-duplicated by symbol, persisted to a json file.
+    A heap gives the next listing, a dict answers whether a symbol is already known.
+    """
+
+    def __init__(self, file: Optional[Path] = None) -> NoReturn:
+        self.file = file
+        self._heap: List[Tuple[float, str]] = []
+        self._listings = {}
+        self._lock = RLock()
+        if file is not None and Path(file).exists():
+            self.load()
+
+    def add(self, coin: str, list_time: str) -> bool:
+        """
+        Returns False if the listing is already known with the same time
+        """
+        ts = listing_timestamp(list_time)
+        with self._lock:
+            if coin in self._listings and self._listings[coin][0] == ts:
+                return False
+            self._listings[coin] = (ts, list_time)
+            heapq.heappush(self._heap, (ts, coin))
+            self.save()
+            return True
+
+    def peek(self) -> Optional[Tuple[str, str, float]]:
+        """
+        Returns (coin, list_time, timestamp) of the next listing
+        """
+        with self._lock:
+            self._prune()
+            if not self._heap:
+                return None
+            ts, coin = self._heap[0]
+            return coin, self._listings[coin][1], ts
+
+    def pop(self, coin: Optional[str] = None) -> Optional[Tuple[str, str, float]]:
+        """
+        Removes a listing, the next one if no coin is given
+        """
+        with self._lock:
+            if coin is None:
+                listing = self.peek()
+                if listing is None:
+                    return None
+                coin = listing[0]
+            if coin not in self._listings:
+                return None
+            ts, list_time = self._listings.pop(coin)
+            self._prune()
+            self.save()
+            return coin, list_time, ts
+
+    def expire(self, before: float) -> List[Tuple[str, str, float]]:
+        """
+        Removes and returns the listings scheduled before a timestamp
+        """
+        expired = []
+        with self._lock:
+            listing = self.peek()
+            while listing is not None and listing[2] < before:
+                expired.append(self.pop(listing[0]))
+                listing = self.peek()
+        return expired
+
+    def upcoming(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            return sorted(
+                ((coin, list_time, ts) for coin, (ts, list_time) in self._listings.items()), key=lambda l: l[2]
+            )
+
+    def _prune(self) -> NoReturn:
+        # heap entries of removed or rescheduled listings are dropped lazily
+        while self._heap:
+            ts, coin = self._heap[0]
+            if coin in self._listings and self._listings[coin][0] == ts:
+                return
+            heapq.heappop(self._heap)
+
+    def load(self) -> NoReturn:
+        with open(self.file, "r") as f:
+            try:
+                data = json.load(f)
+            except json.decoder.JSONDecodeError:
+                data = []
+        # main.py used to reset the file to {}, and it held a single [coin, list_time] before the calendar
+        if isinstance(data, dict):
+            data = []
+        elif len(data) == 2 and all(isinstance(d, str) for d in data):
+            data = [data]
+        with self._lock:
+            self._listings = {}
+            for coin, list_time in data:
+                self._listings[coin] = (listing_timestamp(list_time), list_time)
+            self._heap = [(ts, coin) for coin, (ts, _) in self._listings.items()]
+            heapq.heapify(self._heap)
+
+    def save(self) -> NoReturn:
+        if self.file is None:
+            return
+        tmp = Path(str(self.file) + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump([[coin, list_time] for coin, list_time, _ in self.upcoming()], f, indent=4)
+        os.replace(tmp, self.file)
+
+    def __contains__(self, coin: str) -> bool:
+        return coin in self._listings
+
+    def __len__(self) -> int:
+        return len(self._listings)
@@ -0,0 +1,56 @@
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, NoReturn, Optional
+
+
+class LatencyStats:
+    """
+    Rolling window of latency samples (seconds) summarised as percentiles
+    """
+
+    def __init__(self, name: str, max_samples: int = 10000) -> NoReturn:
+        self.name = name
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+
+    def add(self, seconds: float) -> NoReturn:
+        self.samples.append(seconds)
+        self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(time.perf_counter() - start)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if not self.samples:
+            return {"count": 0, "mean": None, "p50": None, "p90": None, "p99": None, "max": None}
+        return {
+            "count": len(self.samples),
+            "mean": sum(self.samples) / len(self.samples),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": max(self.samples),
+        }
+
+    def __str__(self) -> str:
+        s = self.summary()
+        if s["count"] == 0:
+            return f"{self.name}: no samples"
+        return "{}: n={} mean={:.2f}ms p50={:.2f}ms p90={:.2f}ms p99={:.2f}ms max={:.2f}ms".format(
+            self.name, s["count"], s["mean"] * 1000, s["p50"] * 1000, s["p90"] * 1000, s["p99"] * 1000,
+            s["max"] * 1000,
+        )
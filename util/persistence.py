@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, NoReturn, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from util.types import Order, Sold
+from util.util import Util
+
+
+class TrackedDict(dict):
+    """
+    dict that calls on_change whenever it is modified. Models changed in place are not seen,
+    re-assign them or call JsonStore.mark_dirty.
+    """
+
+    def __init__(self, on_change: Callable[[], None], *args, **kwargs) -> NoReturn:
+        super().__init__(*args, **kwargs)
+        self._on_change = on_change
+
+    def __setitem__(self, key, value) -> NoReturn:
+        super().__setitem__(key, value)
+        self._on_change()
+
+    def __delitem__(self, key) -> NoReturn:
+        super().__delitem__(key)
+        self._on_change()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._on_change()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._on_change()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs) -> NoReturn:
+        super().update(*args, **kwargs)
+        self._on_change()
+
+    def clear(self) -> NoReturn:
+        super().clear()
+        self._on_change()
+
+
+class JsonStore:
+    """
+    Write-behind persistence of a dict of models to a json file.
+    Changes only mark the store dirty, a background thread writes it debounce_seconds after the first
+    change, so a burst of changes is a single write. Files are replaced atomically.
+    flush() writes synchronously, for fills and shutdown.
+    """
+
+    def __init__(self, file: Path, model: Type[Union[Order, Sold]], debounce_seconds: float = 1.0) -> NoReturn:
+        self.file = Path(file)
+        self.model = model
+        self.debounce_seconds = debounce_seconds
+        self.data: Dict[str, BaseModel] = TrackedDict(self.mark_dirty)
+        if self.file.exists():
+            dict.update(self.data, Util.load_json(self.file, model))
+        self.writes = 0
+
+        self._dirty = threading.Event()
+        self._closed = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty.is_set()
+
+    def mark_dirty(self) -> NoReturn:
+        self._dirty.set()
+        if self._thread is None and not self._closed.is_set():
+            self._thread = threading.Thread(target=self._run, name=f"store-{self.file.name}", daemon=True)
+            self._thread.start()
+
+    def replace(self, data: Dict[str, BaseModel]) -> NoReturn:
+        dict.clear(self.data)
+        dict.update(self.data, data)
+        self.mark_dirty()
+
+    def flush(self) -> bool:
+        """
+        Writes the file now if anything changed. Returns False if there was nothing to write
+        """
+        with self._write_lock:
+            if not self._dirty.is_set():
+                return False
+            # cleared before the snapshot, a change made during the write marks the store dirty again
+            self._dirty.clear()
+            snapshot = dict(self.data)
+            tmp = Path(str(self.file) + ".tmp")
+            Util.dump_json(tmp, snapshot)
+            os.replace(tmp, self.file)
+            self.writes += 1
+            return True
+
+    def close(self) -> NoReturn:
+        """
+        Stops the writer thread and flushes pending changes
+        """
+        pending = self._dirty.is_set()
+        self._closed.set()
+        if self._thread is not None:
+            # wakes the writer thread up
+            self._dirty.set()
+            self._thread.join()
+            self._thread = None
+            if not pending:
+                self._dirty.clear()
+        self.flush()
+
+    def _run(self) -> NoReturn:
+        while not self._closed.is_set():
+            self._dirty.wait()
+            if self._closed.wait(self.debounce_seconds):
+                return
+            try:
+                self.flush()
+            except Exception:
+                # keeps the store dirty, retried after the next change or on close
+                self._dirty.set()
+                time.sleep(self.debounce_seconds)
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from typing import Callable, NoReturn, Optional
+
+from util.metrics import LatencyStats
+
+
+class Scheduler:
+    """
+    Sleeps the event loop until the next instant a bot needs to run. The bulk of the wait is a
+    loop.call_at timer; a precise wake-up spins for the last spin_seconds for sub-millisecond accuracy.
+    wake() ends the sleep early, from any thread. Targets are timestamps of clock, the exchange clock of the bot.
+    """
+
+    def __init__(
+            self, spin_seconds: float = 0.002, max_sleep_seconds: float = 60, clock: Callable[[], float] = time.time
+    ) -> NoReturn:
+        self.spin_seconds = spin_seconds
+        self.clock = clock
+        self.max_sleep_seconds = max_sleep_seconds
+        # how late precise wake-ups are
+        self.jitter = LatencyStats("wake-up jitter")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def wake(self) -> NoReturn:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def sleep_until(self, target: float, precise: bool = False) -> bool:
+        """
+        Sleeps until the timestamp target of clock. Returns False if woken up early.
+        """
+        if self._wake is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+
+        delay = target - self.clock()
+        if delay > self.spin_seconds:
+            timer = self._loop.call_at(
+                self._loop.time() + min(delay - self.spin_seconds, self.max_sleep_seconds), self._wake.set
+            )
+            # a wake() since the last sleep, while the bot was running, ends this one right away
+            await self._wake.wait()
+            self._wake.clear()
+            timer.cancel()
+            if self.clock() < target - self.spin_seconds:
+                return False
+
+        if precise:
+            while self.clock() < target:
+                pass
+            self.jitter.add(self.clock() - target)
+        return True
@@ -2,9 +2,9 @@ from typing import Union, Optional
 from datetime import datetime
 from pydantic import BaseModel
 
-BROKERS = ["BINANCE", "FTX"]
+BROKERS = ["BINANCE", "FTX", "SIMULATED"]
 
-BrokerType = Union["FTX", "BINANCE"]
+BrokerType = Union["FTX", "BINANCE", "SIMULATED"]
 ActionType = Union["Buy", "Sell"]
 
 
@@ -31,6 +31,12 @@ class Order(BaseModel):
     trailing_stop_loss_max: float
     trailing_stop_loss: float
 
+    # exit state machine of a bought position, driven by Bot.do_the_selling
+    listing_time_ts: float = 0
+    exit_stage: int = 0
+    exit_deadline: float = 0
+    sell_order_id: Optional[str] = None
+
 
 class Sold(Order):
     profit: float